@@ -14,6 +14,9 @@ class RuleTable:
         if key in rule: return rule[key]
         return defaultValue
 
+    def configRuleNames(self):
+        return list(self._ruleTable.keys())
+
     def put(self, configRuleName :str, config: dict):
         self._ruleTable[configRuleName] = config
 
@@ -1,10 +1,35 @@
+import json
 import cfg.base as base
 
 ruleTimeoutSecs = base.stackMaxSecs + 60
 sqsBatchSize = base.sqsBatchSize
-dispatchTimeoutSecs = (ruleTimeoutSecs * sqsBatchSize) + 30
+dispatchMaxParallelism = sqsBatchSize
+ruleConcurrencyDefault = 1
+
+# Per-rule overrides of ruleConcurrencyDefault, keyed by rule code folder - e.g. 'EncryptCWL': 4
+def ruleConcurrencyCfg():
+    return {
+    }
+
+# Worst case is a batch of records that all target the rule function with the lowest concurrency
+ruleConcurrencyMin = min([ruleConcurrencyDefault] + list(ruleConcurrencyCfg().values()))
+dispatchParallelism = max(1, min(dispatchMaxParallelism, ruleConcurrencyMin))
+dispatchWaves = (sqsBatchSize + dispatchParallelism - 1) // dispatchParallelism
+dispatchTimeoutSecs = (ruleTimeoutSecs * dispatchWaves) + 30
 dispatchTimeoutCappedSecs = min(dispatchTimeoutSecs, base.lambdaMaxSecs)
+# Number of rule Lambdas the installer deploys or removes concurrently
+ruleDeployParallelism = 8
+# Number of independent installer provisioning steps run concurrently by `init`
+provisionParallelism = 4
 sqsVisibilityTimeoutSecs = dispatchTimeoutCappedSecs + 30
+# Return failed records to the queue individually, rather than retrying them within the dispatcher
+dispatchReportBatchItemFailures = True
+# Warm dispatcher invocations re-use the organization account directory for this long before listing accounts again
+dispatchAccountCacheTtlSecs = 15 * 60
+# Repeat compliance notifications for the same evaluation of a resource are not re-dispatched within this window
+dispatchDedupWindowSecs = 10 * 60
+# Warm dispatcher invocations rebuild their session and clients after this long, or sooner if credentials change
+dispatchRuntimeMaxAgeSecs = 60 * 60
 
 namespace = "NZISM"
 
@@ -18,6 +43,16 @@ def folderConfig():
         'RuleMain': 'lambda_function.py'        
     }
 
+# Bytecode adds precompiled .pyc files to Lambda packages, avoiding compilation on cold start
+# It only applies when the installer's Python version matches the Lambda runtime
+def corePackagingCfg():
+    return {
+        'Bytecode': False
+    }
+
+def coreLayerName():
+    return "{}-Core-Library".format(namespace)
+
 def coreFunctionName(codeFolder):
     return "{}-Core-{}".format(namespace, codeFolder)
 
@@ -43,7 +78,11 @@ def dispatchFunctionCfg():
         'MemorySize': 128,
         'Environment': {
             'Variables': {
-                'LOGLEVEL': 'INFO'
+                'LOGLEVEL': 'INFO',
+                environmentVariableNameRateLimits(): json.dumps(coreApiRateLimitCfg()),
+                environmentVariableNameTrace(): coreTraceExporter(),
+                environmentVariableNameProfile(): json.dumps(coreProfilingCfg()),
+                environmentVariableNameRecord(): coreTrafficRecordingPath()
             }
         }
     }
@@ -58,13 +97,17 @@ def coreQueueCfg():
         'SqsVisibilityTimeoutSecs': sqsVisibilityTimeoutSecs,
         'SqsPollCfg': {
             'BatchSize': sqsBatchSize,
-            'MaximumBatchingWindowInSeconds': 0
+            'MaximumBatchingWindowInSeconds': 0,
+            'FunctionResponseTypes': ['ReportBatchItemFailures'] if dispatchReportBatchItemFailures else []
         }
     }
 
 def coreCloudWatchNamespace(action):
     return "{}-{}".format(namespace, action)
 
+def coreCloudWatchOperationsNamespace():
+    return "{}-operations".format(namespace)
+
 def coreCloudWatchDimensionList(action):
     return [
         'ConfigRule/Account/Region',
@@ -73,6 +116,35 @@ def coreCloudWatchDimensionList(action):
         'AutoResourceTag.{}/Account'.format(namespace)
     ]
 
+# 'api' publishes with cloudwatch:PutMetricData; 'emf' writes embedded metric format records to the function log
+def coreCloudWatchMetricsBackend():
+    return 'api'
+
+# Store is 'tmp' (JSON snapshot file, survives warm restarts of the runtime) or 'none'
+# SnapshotPath is formatted with the caller account id so profiles never share a snapshot
+def coreAccountDirectoryCfg():
+    return {
+        'TtlSecs': dispatchAccountCacheTtlSecs,
+        'Store': 'tmp',
+        'SnapshotPath': '/tmp/{}-account-directory-{{}}.json'.format(namespace)
+    }
+
+# Duplicate NON_COMPLIANT events are coalesced within a batch, and suppressed across batches for TtlSecs
+# SharedStore is 'local' (process-wide stand-in for a table shared between dispatcher instances) or 'none'
+def dispatchDedupCfg():
+    return {
+        'Enabled': True,
+        'TtlSecs': dispatchDedupWindowSecs,
+        'MaxMemoryEntries': 10000,
+        'SharedStore': 'none'
+    }
+
+def coreCloudWatchMetricBufferCfg():
+    return {
+        'MaxPendingData': 1000,
+        'MaxPendingSecs': 30
+    }
+
 def coreRedriveAggregatorName():
     return namespace
 
@@ -86,8 +158,91 @@ def ruleFunctionCfg(codeFolder):
     return {
         'Runtime': 'python3.8',
         'Timeout': ruleTimeoutSecs,
-        'MemorySize': 128
+        'MemorySize': 128,
+        'Environment': {
+            'Variables': {
+                environmentVariableNameRateLimits(): json.dumps(coreApiRateLimitCfg()),
+                environmentVariableNameApiStats(): coreApiStatsFormat(),
+                environmentVariableNameApiStatsNamespace(): coreCloudWatchOperationsNamespace(),
+                environmentVariableNameTrace(): coreTraceExporter(),
+                environmentVariableNameProfile(): json.dumps(coreProfilingCfg()),
+                environmentVariableNameRecord(): coreTrafficRecordingPath()
+            }
+        }
+    }
+
+def ruleFunctionConcurrency(codeFolder):
+    return ruleConcurrencyCfg().get(codeFolder, ruleConcurrencyDefault)
+
+def dispatchConcurrencyCfg():
+    functionConcurrency = {}
+    ruleConcurrency = ruleConcurrencyCfg()
+    for codeFolder in ruleConcurrency:
+        functionConcurrency[ruleFunctionName(codeFolder)] = ruleConcurrency[codeFolder]
+    return {
+        'MaxParallelism': dispatchMaxParallelism,
+        'FunctionConcurrencyDefault': ruleConcurrencyDefault,
+        'FunctionConcurrency': functionConcurrency
     }
 
 def environmentVariableNameRemediationRole():
     return 'REMEDIATIONROLE'
+
+def environmentVariableNameRateLimits():
+    return 'RDQRATELIMITS'
+
+def environmentVariableNameApiStats():
+    return 'RDQAPISTATS'
+
+def environmentVariableNameApiStatsNamespace():
+    return 'RDQAPISTATSNAMESPACE'
+
+def environmentVariableNameTrace():
+    return 'RDQTRACE'
+
+def environmentVariableNameProfile():
+    return 'RDQPROFILE'
+
+def environmentVariableNameRecord():
+    return 'RDQRECORD'
+
+# Per-API call statistics written at the end of each invocation: 'log' (structured log), 'emf' (embedded metric format) or 'none'
+def coreApiStatsFormat():
+    return 'log'
+
+# Trace spans for dispatch and rule invocations: 'none', 'jsonl' (structured log lines) or 'otlp:<file path>' (OTLP/JSON lines)
+def coreTraceExporter():
+    return 'none'
+
+# cProfile and tracemalloc capture for a sampled fraction of invocations; a SampleRate of 0 disables profiling
+# Captures are written to Folder, and copied to SinkFolder (e.g. a mounted file system) if present
+# Dispatcher lane threads are profiled separately and merged into the invocation capture
+def coreProfilingCfg():
+    return {
+        'SampleRate': 0.0,
+        'TopN': 20,
+        'Memory': True,
+        'Folder': '/tmp/rdqprofile'
+    }
+
+# Redacted AWS API requests and responses appended at the end of each invocation to a gzipped JSON lines file, for offline replay; 'none' disables recording
+def coreTrafficRecordingPath():
+    return 'none'
+
+# Client-side request rates per AWS account and region, keyed by <endpoint prefix>:<operation> or <endpoint prefix>:*
+# Rates adapt downwards on throttling and recover towards the configured Rate
+def coreApiRateLimitCfg():
+    return {
+        'organizations:DescribeAccount': {'Rate': 2, 'Burst': 4},
+        'organizations:ListAccounts': {'Rate': 1, 'Burst': 2},
+        'cloudformation:DescribeStacks': {'Rate': 5, 'Burst': 10},
+        'kms:CreateKey': {'Rate': 5, 'Burst': 5},
+        'kms:PutKeyPolicy': {'Rate': 5, 'Burst': 5},
+        'logs:AssociateKmsKey': {'Rate': 5, 'Burst': 5},
+        'lambda:GetFunction': {'Rate': 20, 'Burst': 20},
+        'lambda:CreateFunction': {'Rate': 3, 'Burst': 5},
+        'lambda:UpdateFunctionConfiguration': {'Rate': 3, 'Burst': 5},
+        'lambda:UpdateFunctionCode': {'Rate': 3, 'Burst': 5},
+        'lambda:PutFunctionConcurrency': {'Rate': 3, 'Burst': 5},
+        'lambda:DeleteFunction': {'Rate': 3, 'Burst': 5}
+    }
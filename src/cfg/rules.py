@@ -45,6 +45,9 @@ def autoResourceTags(configRuleName, action, accountName):
     if cpTag: tags[cpName] = cpTag
     return tags
 
+def remediatedRuleNames():
+    return [configRuleName for configRuleName in ruleTable.configRuleNames() if ruleTable.lookup(configRuleName, 'Folder')]
+
 def codeFolder(configRuleName, action, accountName):
     return ruleTable.lookup(configRuleName, 'Folder')
 
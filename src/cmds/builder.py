@@ -1,4 +1,6 @@
+import time
 from typing import List
+from concurrent.futures import ThreadPoolExecutor
 from lib.base import Tags, ConfigError, DictBuild
 
 from lib.rdq import Profile
@@ -16,11 +18,13 @@ import lib.cfn as cfn
 import lib.cfn.iam as iam
 import lib.cfn.eventbridge as eb
 
-import cfg.core, cfg.roles, cfg.org
+import cfg.core, cfg.roles, cfg.org, cfg.rules
+import lib.lambdas.core.ruleselector as rulesel
 
 from cmds.discovery import LandingZoneDiscovery, LandingZoneDescriptor
 import cmds.cfgutil as cfgutil
 import cmds.codeLoader as codeLoader
+from cmds.stepgraph import StepGraph
 
 
 def get_lambda_concurrency():
@@ -49,6 +53,7 @@ class BaseState:
         self.dispatchLambdaRoleName = cfg.core.coreResourceName('ComplianceDispatcherLambdaRole')
         self.dispatchLambdaCodeName = 'ComplianceDispatcher'
         self.dispatchFunctionName = cfg.core.coreFunctionName(self.dispatchLambdaCodeName)
+        self.libraryLayerName = cfg.core.coreLayerName()
         self.localAuditRoleName = cfgutil.getStandaloneRolesCfgValue('Audit')
         self.localRemediationRoleName = cfgutil.getStandaloneRolesCfgValue('Remediation')
         self.complianceForwarderStackName = cfg.core.coreResourceName('ComplianceChangeForwarder')
@@ -148,6 +153,11 @@ def landingZoneState(clients: Clients, base: BaseState) -> LandingZoneState:
     return LandingZoneState(lzDescriptor.auditRoleArn, lzDescriptor.remediationRoleName)
 
 
+def complianceChangeEventPattern():
+    ruleNamePrefixes = [rulesel.getRuleNamePrefix(ruleName) for ruleName in sorted(cfg.rules.remediatedRuleNames())]
+    return eb.EventPattern_ConfigComplianceChange(['NON_COMPLIANT'], ruleNamePrefixes)
+
+
 class EventBusState:
     def __init__(self, eventBusArn, ruleArn):
         self.eventBusArn = eventBusArn
@@ -159,10 +169,7 @@ def eventBusState(clients :Clients, base :BaseState) -> EventBusState:
     eventBusArn = clients.eb.declareEventBusArn(base.eventBusName, base.tagsCore)
     print("EventBus ARN: {}".format(eventBusArn))
     ruleDesc= "Config Rule Compliance Change"
-    eventPattern = {
-        'source': ["aws.config"],
-        'detail-type': ["Config Rules Compliance Change"]
-    }
+    eventPattern = complianceChangeEventPattern()
     ruleArn = clients.eb.declareEventBusRuleArn(busName, ruleName, ruleDesc, eventPattern, base.tagsCore)
     return EventBusState(eventBusArn, ruleArn)
 
@@ -234,6 +241,7 @@ def dispatchLambdaRoleState(clients :Clients, base :BaseState, queue :EventQueue
     if optOrganization:
         orgDesc = optOrganization.descriptor
         opsActions.append(policy.allowDescribeAccount(orgDesc.masterAccountId, orgDesc.id))
+        opsActions.append(policy.allowListAccounts())
     opsPolicy = policy.permissions(opsActions)
     inlinePolicyMap = {"ConsumeQueue": sqsPolicy, "InvokeRules": ruleInvokePolicy, "Operations": opsPolicy}
     clients.iam.declareInlinePoliciesForRole(base.dispatchLambdaRoleName, inlinePolicyMap)
@@ -252,17 +260,36 @@ def dispatchLambdaRoleVerify(clients :Clients, base :BaseState) -> DispatchLambd
     msg = "Execution role `{}` for dispatch lambda has not yet been created via init command".format(roleName)
     raise ConfigError(msg)
 
+class LibraryLayerState:
+    def __init__(self, layerVersionArn):
+        self.layerVersionArn = layerVersionArn
+
+def libraryLayerState(clients: Clients, base: BaseState) -> LibraryLayerState:
+    layerName = base.libraryLayerName
+    layerDesc = 'Auto Remediation shared libraries'
+    runtimes = [cfg.core.dispatchFunctionCfg()['Runtime']]
+    codeZip = codeLoader.getLayerCode(layerName)
+    layerVersionArn = clients.lambdafun.declareLayerVersionArn(layerName, layerDesc, runtimes, codeZip)
+    print("Library Layer ARN: {}".format(layerVersionArn))
+    return LibraryLayerState(layerVersionArn)
+
+def libraryLayerRemove(clients: Clients, base: BaseState):
+    layerName = base.libraryLayerName
+    versionCount = clients.lambdafun.removeLayer(layerName)
+    print("Removed {} ({} versions)".format(layerName, versionCount))
+
 class DispatchLambdaState:
     def __init__(self, lambdaArn):
         self.lambdaArn = lambdaArn
 
-def dispatchLambdaState(clients: Clients, base: BaseState, role: DispatchLambdaRoleState, landingZone :LandingZoneState) -> DispatchLambdaState:
+def dispatchLambdaState(clients: Clients, base: BaseState, role: DispatchLambdaRoleState, landingZone :LandingZoneState, libraryLayer :LibraryLayerState) -> DispatchLambdaState:
     functionName = base.dispatchFunctionName
     roleArn = role.roleArn
     functionDesc = 'Compliance Dispatcher Lambda'
     functionCfgBuild = DictBuild(cfg.core.dispatchFunctionCfg())
     envKey = "Environment.Variables.{}".format(cfg.core.environmentVariableNameRemediationRole())
     functionCfgBuild.extend(envKey, landingZone.remediationRoleName)
+    functionCfgBuild.extend('Layers', [libraryLayer.layerVersionArn])
     functionCfg = functionCfgBuild.toDict()
     concurrency = get_lambda_concurrency()
     codeZip = codeLoader.getCoreCode(base.dispatchLambdaCodeName)
@@ -283,25 +310,66 @@ def dispatchLambdaQueueConsumerState(clients: Clients, base: BaseState, dispatch
 def dispatchLambdaQueueConsumerRemove(clients: Clients, base: BaseState):
     clients.lambdafun.removeEventSourceMappingsForFunction(base.dispatchFunctionName)
 
-def ruleLambdaState(clients: Clients, base: BaseState, landingZone :LandingZoneState):
+class FunctionResult:
+    def __init__(self, ruleFolder, functionName):
+        self.ruleFolder = ruleFolder
+        self.functionName = functionName
+        self.output = None
+        self.error = None
+        self.elapsedSecs = 0.0
+
+    @property
+    def failed(self): return not (self.error is None)
+
+def run_function_task(ruleFolder, task) -> FunctionResult:
+    result = FunctionResult(ruleFolder, cfg.core.ruleFunctionName(ruleFolder))
+    startedAt = time.time()
+    try:
+        result.output = task(ruleFolder, result.functionName)
+    except Exception as e:
+        result.error = e
+    result.elapsedSecs = time.time() - startedAt
+    return result
+
+def run_function_tasks(ruleFolders, task) -> List[FunctionResult]:
+    maxParallelism = max(1, min(cfg.core.ruleDeployParallelism, len(ruleFolders)))
+    with ThreadPoolExecutor(max_workers=maxParallelism) as executor:
+        futures = [executor.submit(run_function_task, ruleFolder, task) for ruleFolder in ruleFolders]
+    return [future.result() for future in futures]
+
+def report_function_results(results :List[FunctionResult], successFormat, failureContext):
+    failures = []
+    for result in sorted(results, key=(lambda r: r.functionName)):
+        if result.failed:
+            failures.append(result)
+            print("FAILED {} ({:.1f}s): {}".format(result.functionName, result.elapsedSecs, result.error))
+        else:
+            print(successFormat.format(result.output) + " ({:.1f}s)".format(result.elapsedSecs))
+    if not failures: return
+    print("{} of {} rule Lambdas could not be {}: {}".format(len(failures), len(results), failureContext, ", ".join([r.ruleFolder for r in failures])))
+    raise failures[0].error
+
+def ruleLambdaState(clients: Clients, base: BaseState, landingZone :LandingZoneState, libraryLayer :LibraryLayerState):
     tags = base.tagsCore
     roleArn = landingZone.auditRoleArn
-    concurrency = get_lambda_concurrency()
-    ruleFolders = codeLoader.getAvailableRules()
-    for ruleFolder in ruleFolders:
+    layers = [libraryLayer.layerVersionArn]
+    def declareRuleLambda(ruleFolder, functionName):
+        concurrency = {'ReservedConcurrentExecutions': cfg.core.ruleFunctionConcurrency(ruleFolder)}
         codeZip = codeLoader.getRuleCode(ruleFolder)
-        functionName = cfg.core.ruleFunctionName(ruleFolder)
         functionDesc = '{} Auto Remediation Lambda'.format(ruleFolder)
-        functionCfg = cfg.core.ruleFunctionCfg(ruleFolder)
-        lambdaArn = clients.lambdafun.declareFunctionArn(functionName, functionDesc, roleArn, functionCfg, concurrency, codeZip, tags)
-        print("Rule Lambda ARN: {}".format(lambdaArn))
+        functionCfg = dict(cfg.core.ruleFunctionCfg(ruleFolder), Layers=layers)
+        return clients.lambdafun.declareFunctionArn(functionName, functionDesc, roleArn, functionCfg, concurrency, codeZip, tags)
+    ruleFolders = codeLoader.getAvailableRules()
+    results = run_function_tasks(ruleFolders, declareRuleLambda)
+    report_function_results(results, "Rule Lambda ARN: {}", 'deployed')
 
 def ruleLambdaRemove(clients: Clients, base: BaseState):
-    ruleFolders = codeLoader.getAvailableRules()
-    for ruleFolder in ruleFolders:
-        functionName = cfg.core.ruleFunctionName(ruleFolder)
+    def removeRuleLambda(ruleFolder, functionName):
         clients.lambdafun.removeFunction(functionName)
-        print("Removed {}".format(functionName))
+        return functionName
+    ruleFolders = codeLoader.getAvailableRules()
+    results = run_function_tasks(ruleFolders, removeRuleLambda)
+    report_function_results(results, "Removed {}", 'removed')
 
 
 def complianceForwarderState(clients: Clients, base: BaseState, eventBus :EventBusState, optOrganization :OrganizationState):
@@ -319,7 +387,7 @@ def complianceForwarderState(clients: Clients, base: BaseState, eventBus :EventB
     _rEventRule = 'rEventRule'
     resourceMap[_rRole] = iam.IAM_Role(roleName, roleDesc, trustPolicy, None, [inlinePolicy])
     ruleTarget = eb.Target('CentralBus', arnTargetEventBus, cfn.Arn(_rRole))
-    eventPattern = eb.EventPattern_ConfigComplianceChange()
+    eventPattern = complianceChangeEventPattern()
     resourceMap[_rEventRule] = eb.rRule('default', ruleName, eventPattern, [ruleTarget])
     templateMap = cfn.Template(templateDesc, resourceMap)
     stackName = base.complianceForwarderStackName
@@ -370,28 +438,40 @@ def init(args):
     profile = Profile()
     clients = Clients(args, profile)
     base = BaseState(args, profile)
-    landingZone = landingZoneState(clients, base)
-    optOrganization = organizationState(clients, base)
-    eventBus = eventBusState(clients, base)
-    eventQueue = eventQueueState(clients, base, eventBus)
-    eventQueueTarget(clients, base, eventQueue)
-    eventBusPermission(clients, base, optOrganization)
-    dispatchLambdaRole = dispatchLambdaRoleState(clients, base, eventQueue, optOrganization)
-    dispatchLambda = dispatchLambdaState(clients, base, dispatchLambdaRole, landingZone)
-    dispatchLambdaQueueConsumerState(clients, base, dispatchLambda, eventQueue)
-    ruleLambdaState(clients, base, landingZone)
-    complianceForwarderState(clients, base, eventBus, optOrganization)
+    graph = StepGraph()
+    graph.add('landingZone', lambda: landingZoneState(clients, base))
+    graph.add('organization', lambda: organizationState(clients, base))
+    graph.add('eventBus', lambda: eventBusState(clients, base))
+    graph.add('eventQueue', lambda eventBus: eventQueueState(clients, base, eventBus), ['eventBus'])
+    graph.add('eventQueueTarget', lambda eventQueue: eventQueueTarget(clients, base, eventQueue), ['eventQueue'])
+    graph.add('eventBusPermission', lambda eventBus, optOrganization: eventBusPermission(clients, base, optOrganization), ['eventBus', 'organization'])
+    graph.add('dispatchLambdaRole', lambda eventQueue, optOrganization: dispatchLambdaRoleState(clients, base, eventQueue, optOrganization), ['eventQueue', 'organization'])
+    graph.add('libraryLayer', lambda: libraryLayerState(clients, base))
+    graph.add('dispatchLambda', lambda dispatchLambdaRole, landingZone, libraryLayer: dispatchLambdaState(clients, base, dispatchLambdaRole, landingZone, libraryLayer), ['dispatchLambdaRole', 'landingZone', 'libraryLayer'])
+    graph.add('dispatchLambdaQueueConsumer', lambda dispatchLambda, eventQueue: dispatchLambdaQueueConsumerState(clients, base, dispatchLambda, eventQueue), ['dispatchLambda', 'eventQueue'])
+    graph.add('ruleLambdas', lambda landingZone, libraryLayer: ruleLambdaState(clients, base, landingZone, libraryLayer), ['landingZone', 'libraryLayer'])
+    # Forwarders start sending member account events, so they are only declared once the bus, queue and consumer are ready
+    complianceForwarderDependsOn = ['eventBus', 'organization', 'eventQueueTarget', 'eventBusPermission', 'dispatchLambdaQueueConsumer']
+    graph.add('complianceForwarder', lambda eventBus, optOrganization, *ready: complianceForwarderState(clients, base, eventBus, optOrganization), complianceForwarderDependsOn)
+    try:
+        graph.run(cfg.core.provisionParallelism)
+    finally:
+        graph.report()
 
 def code(args):
     profile = Profile()
     clients = Clients(args, profile)
     base = BaseState(args, profile)
     landingZone = landingZoneState(clients, base)
+    if args.core or args.rules:
+        libraryLayer = libraryLayerState(clients, base)
     if args.core:
         dispatchLambdaRole = dispatchLambdaRoleVerify(clients, base)
-        dispatchLambdaState(clients, base, dispatchLambdaRole, landingZone)
+        dispatchLambdaState(clients, base, dispatchLambdaRole, landingZone, libraryLayer)
     if args.rules:
-        ruleLambdaState(clients, base, landingZone)
+        ruleLambdaState(clients, base, landingZone, libraryLayer)
+    buildCache = codeLoader.getBuildCache()
+    print("Code packages: {} reused from build cache, {} rebuilt".format(buildCache.hits, buildCache.misses))
 
 def remove(args):
     profile = Profile()
@@ -401,6 +481,7 @@ def remove(args):
     ruleLambdaRemove(clients, base)
     dispatchLambdaQueueConsumerRemove(clients, base)
     dispatchLambdaRemove(clients, base)
+    libraryLayerRemove(clients, base)
     dispatchLambdaRoleRemove(clients, base)
     eventQueueRemove(clients, base)
     eventBusRemove(clients, base)
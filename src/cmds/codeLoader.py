@@ -1,10 +1,17 @@
 import tempfile
 import os
+import sys
+import logging
+import py_compile
+import io
+import json
+import hashlib
+import threading
 
-from zipfile import ZipFile
-from zipfile import ZIP_STORED
+from zipfile import ZipFile, ZipInfo
+from zipfile import ZIP_DEFLATED
 
-from cfg.core import folderConfig
+from cfg.core import folderConfig, corePackagingCfg, dispatchFunctionCfg
 
 class CodePathError(Exception):
     def __init__(self, message):
@@ -22,21 +29,72 @@ def requiredProp(cfg, key):
     if key in cfg: return cfg[key]
     raise CodePathError("Missing required configuration property %s" % key)
 
-def get_all_file_pairs(base_path, home_path):
+_ZipDateTime = (1980, 1, 1, 0, 0, 0)
+_ZipCompressLevel = 9
+_ExcludedFolders = ['__pycache__', '.pytest_cache']
+_ExcludedSuffixes = ['.pyc', '.pyo']
+_PackagerVersion = 'deflate9-v1'
+# Shared packages published as the library layer; Lambda adds the layer's python folder to sys.path
+_LayerLibs = ['base', 'rdq', 'rule', 'cfn', 'lambdas']
+
+def is_excluded_file(filename):
+    for suffix in _ExcludedSuffixes:
+        if filename.endswith(suffix): return True
+    return False
+
+def get_all_file_pairs(base_path, home_path, dst_prefix='./'):
     file_pairs = []
     base_offset = len(base_path) + 1
     for (root, dirnames, files) in os.walk(home_path):
-        for filename in files:
+        dirnames[:] = sorted([d for d in dirnames if not (d in _ExcludedFolders)])
+        for filename in sorted(files):
+            if is_excluded_file(filename): continue
             srcpath = os.path.join(root, filename)
-            dstpath = './' + srcpath[base_offset:]
+            dstpath = dst_prefix + srcpath[base_offset:].replace(os.sep, '/')
             pair = {'src':srcpath, 'dst':dstpath}
             file_pairs.append(pair)
     return file_pairs    
 
-def make_zip_file(zip_file_path, file_pairs):
-    with ZipFile(zip_file_path, mode='w', compression=ZIP_STORED) as zip:
-        for pair in file_pairs:
-            zip.write(pair['src'], pair['dst'])
+def zip_info(pair):
+    info = ZipInfo(pair['dst'], date_time=_ZipDateTime)
+    info.create_system = 3
+    mode = 0o755 if os.access(pair['src'], os.X_OK) else 0o644
+    info.external_attr = (0o100000 | mode) << 16
+    info.compress_type = ZIP_DEFLATED
+    return info
+
+def bytecode_pair(pair):
+    (folder, filename) = pair['dst'].rsplit('/', 1)
+    moduleName = filename[0:-len('.py')]
+    dstpath = "{}/__pycache__/{}.{}.pyc".format(folder, moduleName, sys.implementation.cache_tag)
+    return {'src': pair['src'], 'dst': dstpath}
+
+def compile_bytecode(pair):
+    with tempfile.TemporaryDirectory() as folder:
+        cfile = os.path.join(folder, 'module.pyc')
+        # Unchecked hash-based pycs are used without validating source mtimes, which the zip does not preserve
+        py_compile.compile(pair['src'], cfile=cfile, dfile=pair['dst'][2:], doraise=True, invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH)
+        return bytes_file(cfile)
+
+def make_zip_bytes(file_pairs, bytecode=False):
+    entries = []
+    for pair in file_pairs:
+        entries.append((pair, bytes_file(pair['src'])))
+        if bytecode and pair['dst'].endswith('.py'):
+            entries.append((bytecode_pair(pair), compile_bytecode(pair)))
+    buffer = io.BytesIO()
+    with ZipFile(buffer, mode='w', compression=ZIP_DEFLATED, compresslevel=_ZipCompressLevel) as zip:
+        for (pair, content) in sorted(entries, key=(lambda entry: entry[0]['dst'])):
+            zip.writestr(zip_info(pair), content)
+    return buffer.getvalue()
+
+def is_bytecode_enabled():
+    if not corePackagingCfg().get('Bytecode', False): return False
+    runtime = dispatchFunctionCfg()['Runtime']
+    localRuntime = "python{}.{}".format(sys.version_info[0], sys.version_info[1])
+    if (sys.implementation.name == 'cpython') and (runtime == localRuntime): return True
+    logging.warning("Bytecode packaging skipped; Lambda runtime %s differs from the packaging interpreter %s", runtime, localRuntime)
+    return False
 
 def bytes_file(file_path):
     f = open(file_path, 'rb')
@@ -44,8 +102,71 @@ def bytes_file(file_path):
     f.close()
     return byte_array
 
+def get_input_digest(file_pairs, bytecode=False):
+    digest = hashlib.sha256(_PackagerVersion.encode('utf-8'))
+    if bytecode: digest.update(sys.implementation.cache_tag.encode('utf-8'))
+    for pair in file_pairs:
+        digest.update(pair['dst'].encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(hashlib.sha256(bytes_file(pair['src'])).digest())
+        digest.update(b'1' if os.access(pair['src'], os.X_OK) else b'0')
+    return digest.hexdigest()
+
+
+class BuildCache:
+    def __init__(self, folder):
+        self._folder = folder
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def paths(self, functionName):
+        return (os.path.join(self._folder, functionName + ".json"), os.path.join(self._folder, functionName + ".zip"))
+
+    def get(self, functionName, inputDigest):
+        (manifestPath, zipPath) = self.paths(functionName)
+        try:
+            with open(manifestPath, 'r') as f:
+                manifest = json.load(f)
+            if manifest.get('InputDigest') != inputDigest: return None
+            zipBytes = bytes_file(zipPath)
+        except (OSError, ValueError):
+            return None
+        if hashlib.sha256(zipBytes).hexdigest() != manifest.get('ZipDigest'): return None
+        return zipBytes
+
+    def put(self, functionName, inputDigest, zipBytes):
+        os.makedirs(self._folder, exist_ok=True)
+        (manifestPath, zipPath) = self.paths(functionName)
+        with open(zipPath + ".part", 'wb') as f:
+            f.write(zipBytes)
+        os.replace(zipPath + ".part", zipPath)
+        manifest = {'InputDigest': inputDigest, 'ZipDigest': hashlib.sha256(zipBytes).hexdigest()}
+        with open(manifestPath + ".part", 'w') as f:
+            json.dump(manifest, f)
+        os.replace(manifestPath + ".part", manifestPath)
+
+    def getZip(self, functionName, file_pairs, bytecode=False):
+        inputDigest = get_input_digest(file_pairs, bytecode)
+        zipBytes = self.get(functionName, inputDigest)
+        if zipBytes:
+            with self._lock: self.hits += 1
+            return zipBytes
+        with self._lock: self.misses += 1
+        zipBytes = make_zip_bytes(file_pairs, bytecode)
+        self.put(functionName, inputDigest, zipBytes)
+        return zipBytes
+
+_buildCache = BuildCache(os.path.join(tempfile.gettempdir(), 'rdqbuild'))
+
+def getBuildCache() -> BuildCache:
+    return _buildCache
+
+def setBuildCache(buildCache :BuildCache):
+    global _buildCache
+    _buildCache = buildCache
+
 def get_zip_code_bytes(functionName, mainBase, mainPath, auxBase, auxPaths):
-    zipFilePath = os.path.join(tempfile.gettempdir(), functionName+".zip")
     aggregateFilePairs = []
     main_pairs = get_all_file_pairs(mainBase, mainPath)
     if len(main_pairs) == 0:
@@ -55,9 +176,8 @@ def get_zip_code_bytes(functionName, mainBase, mainPath, auxBase, auxPaths):
     for auxPath in auxPaths:
         aux_pairs = get_all_file_pairs(auxBase, auxPath)
         aggregateFilePairs.extend(aux_pairs)
-    sortedFilePairs = sorted(aggregateFilePairs, key=(lambda pair: pair['src']))
-    make_zip_file(zipFilePath, sortedFilePairs)
-    return bytes_file(zipFilePath)
+    sortedFilePairs = sorted(aggregateFilePairs, key=(lambda pair: pair['dst']))
+    return _buildCache.getZip(functionName, sortedFilePairs, is_bytecode_enabled())
 
 def get_lambda_code_bytes(baseFunctionName, libs, includeCfg, typeFolder):
     folderCfg = folderConfig()
@@ -92,14 +212,25 @@ def getAvailableRules():
                     ruleNames.append(rtail)
     return ruleNames    
 
+def getLayerCode(layerName):
+    folderCfg = folderConfig()
+    codeHome = requiredProp(folderCfg, 'CodeHome')
+    libFolder = requiredProp(folderCfg, 'LibFolder')
+    layerFilePairs = []
+    for lib in _LayerLibs:
+        libPath = os.path.join(codeHome, libFolder, lib)
+        layerFilePairs.extend(get_all_file_pairs(codeHome, libPath, './python/'))
+    sortedFilePairs = sorted(layerFilePairs, key=(lambda pair: pair['dst']))
+    return _buildCache.getZip(layerName, sortedFilePairs, is_bytecode_enabled())
+
 def getCoreCode(baseFunctionName):
-    libs = ['base', 'rdq', 'lambdas']
+    libs = []
     includeCfg = True
     typeFolder = 'core'
     return get_lambda_code_bytes(baseFunctionName, libs, includeCfg, typeFolder)
 
 def getRuleCode(baseFunctionName):
-    libs = ['base', 'rdq', 'rule', 'cfn']
+    libs = []
     includeCfg = False
     folderCfg = folderConfig()
     typeFolder = requiredProp(folderCfg, 'RulesFolder')
@@ -3,6 +3,7 @@ from lib.rdq.svccfg import CfgClient
 from lib.rdq.svcorg import OrganizationClient
 import lib.lambdas.core.filter as filter
 import lib.lambdas.core.ruleselector as rulesel
+from lib.lambdas.core.directory import createAccountDirectory
 
 import cfg.core
 
@@ -47,14 +48,14 @@ def process(args):
     
     profile = Profile()
     cfgc = CfgClient(profile)
-    orgc = OrganizationClient(profile)
+    accountDirectory = None if isLocal else createAccountDirectory(OrganizationClient(profile))
     agenda = cfgc.selectNonCompliantAccountAgenda(aggregatorName)
     for accountId in agenda.accountIds():
         if isLocal:
             accountName = 'local'
             accountIsActive = True
         else:
-            accountDesc = orgc.getAccountDescriptor(accountId)
+            accountDesc = accountDirectory.getAccountDescriptor(accountId)
             accountName = accountDesc.accountName
             accountIsActive = accountDesc.isActive
         if not accountIsActive: continue
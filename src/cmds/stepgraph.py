@@ -0,0 +1,107 @@
+import time
+from typing import Callable, List
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from lib.base import ConfigError
+
+StatusOk = 'OK'
+StatusFailed = 'FAILED'
+StatusSkipped = 'SKIPPED'
+
+class Step:
+    def __init__(self, name, action :Callable, dependsOn :List[str]):
+        self.name = name
+        self.action = action
+        self.dependsOn = list(dependsOn)
+        self.status = None
+        self.error = None
+        self.startOffsetSecs = None
+        self.elapsedSecs = 0.0
+
+    def run(self, results :dict, startedAt):
+        self.startOffsetSecs = time.time() - startedAt
+        try:
+            return self.action(*[results[name] for name in self.dependsOn])
+        finally:
+            self.elapsedSecs = time.time() - startedAt - self.startOffsetSecs
+
+
+class StepGraph:
+    def __init__(self):
+        self._steps = {}
+        self.elapsedSecs = 0.0
+
+    def add(self, name, action :Callable, dependsOn :List[str]=[]):
+        if name in self._steps:
+            raise ConfigError("Provisioning step {} is declared more than once".format(name))
+        self._steps[name] = Step(name, action, dependsOn)
+
+    @property
+    def steps(self) -> List[Step]:
+        return list(self._steps.values())
+
+    def ordered(self) -> List[Step]:
+        ordered = []
+        visited = {}
+        def visit(step :Step, path :list):
+            state = visited.get(step.name)
+            if state == 'done': return
+            if state == 'visiting':
+                raise ConfigError("Provisioning steps have a dependency cycle: {}".format(" -> ".join(path + [step.name])))
+            visited[step.name] = 'visiting'
+            for name in step.dependsOn:
+                if not (name in self._steps):
+                    raise ConfigError("Provisioning step {} depends on undeclared step {}".format(step.name, name))
+                visit(self._steps[name], path + [step.name])
+            visited[step.name] = 'done'
+            ordered.append(step)
+        for step in self._steps.values():
+            visit(step, [])
+        return ordered
+
+    def criticalPathSecs(self):
+        finishSecs = {}
+        for step in self.ordered():
+            startSecs = max([finishSecs[name] for name in step.dependsOn], default=0.0)
+            finishSecs[step.name] = startSecs + step.elapsedSecs
+        return max(finishSecs.values(), default=0.0)
+
+    def run(self, maxParallelism=4) -> dict:
+        pending = self.ordered()
+        results = {}
+        running = {}
+        failures = []
+        startedAt = time.time()
+        with ThreadPoolExecutor(max_workers=max(1, maxParallelism)) as executor:
+            while pending or running:
+                if not failures:
+                    for step in [s for s in pending if all((name in results) for name in s.dependsOn)]:
+                        pending.remove(step)
+                        running[executor.submit(step.run, results, startedAt)] = step
+                if not running: break
+                (done, notDone) = wait(list(running.keys()), return_when=FIRST_COMPLETED)
+                for future in done:
+                    step = running.pop(future)
+                    try:
+                        results[step.name] = future.result()
+                        step.status = StatusOk
+                    except Exception as e:
+                        step.status = StatusFailed
+                        step.error = e
+                        failures.append(step)
+        for step in pending:
+            step.status = StatusSkipped
+        self.elapsedSecs = time.time() - startedAt
+        if failures: raise failures[0].error
+        return results
+
+    def report(self):
+        print("Provisioning step timing:")
+        for step in sorted(self.steps, key=(lambda s: (s.startOffsetSecs is None, s.startOffsetSecs))):
+            if step.startOffsetSecs is None:
+                print("> {:<36} {}".format(step.name, step.status))
+                continue
+            detail = " | {}".format(step.error) if step.error else ""
+            print("> {:<36} {} | Start +{:.1f}s | Elapsed {:.1f}s{}".format(step.name, step.status, step.startOffsetSecs, step.elapsedSecs, detail))
+        totalSecs = sum([step.elapsedSecs for step in self.steps])
+        print("Total {:.1f}s | Critical path {:.1f}s | Sum of steps {:.1f}s".format(self.elapsedSecs, self.criticalPathSecs(), totalSecs))
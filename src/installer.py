@@ -1,6 +1,8 @@
 import argparse
 
 import lib.base, lib.rdq
+import lib.rdq.ratelimit
+import cfg.core
 
 import cmds.precheck, cmds.builder, cmds.redrive
 
@@ -101,6 +103,7 @@ if args.verbose:
     lib.base.initLogging(defaultLevel='INFO', announceLogLevel=True)
 else:
     lib.base.initLogging(defaultLevel='WARNING', announceLogLevel=False)
+lib.rdq.ratelimit.getRateLimiter().configure(cfg.core.coreApiRateLimitCfg())
 try:
     main(args.subcmd)
 except lib.rdq.RdqCredentialsWarning as e:
@@ -1,17 +1,26 @@
 from typing import List
 import logging
-from lib.rdq import Profile
 
 from lib.base import initLogging
-from lib.lambdas.core.dispatcher import Dispatcher
+from lib.base.trace import initTracing
+from lib.base.profiling import getProfiler, initProfiling
+from lib.rdq.ratelimit import initRateLimits
+from lib.rdq.replay import initRecording
+from lib.lambdas.core.runtime import DispatcherRuntime
+
+initRateLimits()
+initRecording()
+initTracing()
+initProfiling()
+_runtime = DispatcherRuntime()
 
 def lambda_handler(event, context):
     initLogging()
     try:
-        profile = Profile()
-        dispatcher = Dispatcher(profile)
-        dispatcher.dispatch(event)
+        dispatcher = _runtime.getDispatcher()
+        return getProfiler().call('ComplianceDispatcher', dispatcher.dispatch, event)
     except Exception as e:
+        _runtime.reset()
         syn = str(type(e))
         msg = str(e)
         report = {'Synopsis': syn, 'Context': "Main handler", 'Cause': msg, 'Event': event}
@@ -0,0 +1,200 @@
+import os
+import io
+import json
+import time
+import uuid
+import random
+import logging
+import threading
+
+from lib.base import RK
+
+class FileProfileSink:
+    def __init__(self, folder):
+        self._folder = folder
+
+    def put(self, key, content :bytes):
+        os.makedirs(self._folder, exist_ok=True)
+        path = os.path.join(self._folder, key)
+        tmpPath = path + ".part"
+        with open(tmpPath, 'wb') as f:
+            f.write(content)
+        os.replace(tmpPath, path)
+        return path
+
+
+def _function_label(fn):
+    (fileName, lineNo, functionName) = fn
+    if fileName == '~': return functionName
+    return "{}:{}({})".format(os.path.basename(fileName), lineNo, functionName)
+
+def _top_functions(stats, topN):
+    stats.sort_stats('cumulative')
+    tops = []
+    for fn in stats.fcn_list[0:topN]:
+        (primitiveCalls, calls, totalSecs, cumulativeSecs, callers) = stats.stats[fn]
+        tops.append({
+            'Function': _function_label(fn),
+            'Calls': calls,
+            'TotalSecs': round(totalSecs, 6),
+            'CumulativeSecs': round(cumulativeSecs, 6)
+        })
+    return tops
+
+def _top_allocations(snapshot, topN):
+    tops = []
+    for stat in snapshot.statistics('lineno')[0:topN]:
+        frame = stat.traceback[0]
+        tops.append({
+            'Location': "{}:{}".format(os.path.basename(frame.filename), frame.lineno),
+            'SizeKiB': round(stat.size / 1024.0, 1),
+            'Count': stat.count
+        })
+    return tops
+
+
+class Profiler:
+    def __init__(self, sampleRate=0.0, topN=20, memory=True, folder='/tmp/rdqprofile', sink=None, randomSource=random.random):
+        self._sampleRate = sampleRate
+        self._topN = topN
+        self._memory = memory
+        self._folder = folder
+        self._sink = sink
+        self._random = randomSource
+        self._lock = threading.Lock()
+        self._active = False
+        self._workerProfiles = None
+
+    @property
+    def enabled(self): return self._sampleRate > 0
+
+    def configure(self, sampleRate=None, topN=None, memory=None, folder=None, sink=None):
+        if not (sampleRate is None): self._sampleRate = float(sampleRate)
+        if not (topN is None): self._topN = int(topN)
+        if not (memory is None): self._memory = bool(memory)
+        if folder: self._folder = folder
+        if sink: self._sink = sink
+
+    def setSink(self, sink):
+        self._sink = sink
+
+    def sampled(self):
+        if self._sampleRate <= 0: return False
+        if self._sampleRate >= 1: return True
+        return self._random() < self._sampleRate
+
+    def acquire(self):
+        with self._lock:
+            if self._active: return False
+            self._active = True
+            return True
+
+    def release(self):
+        with self._lock:
+            self._active = False
+
+    # cProfile only sees the thread that enables it, so pool tasks started with worker() are profiled separately and merged into the capture
+    def worker(self, fn, *args, **kwargs):
+        workerProfiles = self._workerProfiles
+        if workerProfiles is None: return fn(*args, **kwargs)
+        import cProfile
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            return fn(*args, **kwargs)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            profile.disable()
+            with self._lock:
+                workerProfiles.append(profile)
+
+    def call(self, name, fn, *args, **kwargs):
+        if not self.sampled(): return fn(*args, **kwargs)
+        if not self.acquire(): return fn(*args, **kwargs)
+        try:
+            return self.profile_call(name, fn, args, kwargs)
+        finally:
+            self.release()
+
+    def profile_call(self, name, fn, args, kwargs):
+        import cProfile
+        import tracemalloc
+        tracingMemory = self._memory and not tracemalloc.is_tracing()
+        if tracingMemory: tracemalloc.start()
+        profile = cProfile.Profile()
+        workerProfiles = []
+        self._workerProfiles = workerProfiles
+        startedAt = time.time()
+        profile.enable()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            profile.disable()
+            self._workerProfiles = None
+            elapsedSecs = time.time() - startedAt
+            snapshot = None
+            peakBytes = None
+            if tracingMemory:
+                snapshot = tracemalloc.take_snapshot()
+                peakBytes = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            self.report(name, profile, snapshot, peakBytes, elapsedSecs, workerProfiles)
+
+    def report(self, name, profile, snapshot, peakBytes, elapsedSecs, workerProfiles=None):
+        import pstats
+        try:
+            captureId = "{}-{}-{}".format(name, time.strftime('%Y%m%dT%H%M%S', time.gmtime()), uuid.uuid4().hex[0:8])
+            stats = pstats.Stats(profile, stream=io.StringIO())
+            workerProfiles = workerProfiles if workerProfiles else []
+            for workerProfile in workerProfiles:
+                stats.add(workerProfile)
+            summary = {
+                RK.Synopsis: 'InvocationProfile',
+                'Capture': captureId,
+                'ElapsedSecs': round(elapsedSecs, 3),
+                'WorkerProfiles': len(workerProfiles),
+                'TopFunctions': _top_functions(stats, self._topN)
+            }
+            if snapshot:
+                summary['PeakMemoryKiB'] = round(peakBytes / 1024.0, 1)
+                summary['TopAllocations'] = _top_allocations(snapshot, self._topN)
+            os.makedirs(self._folder, exist_ok=True)
+            statsPath = os.path.join(self._folder, captureId + ".pstats")
+            stats.dump_stats(statsPath)
+            summaryJson = json.dumps(summary, indent=2).encode('utf-8')
+            with open(os.path.join(self._folder, captureId + ".json"), 'wb') as f:
+                f.write(summaryJson)
+            if self._sink:
+                with open(statsPath, 'rb') as f:
+                    self._sink.put(captureId + ".pstats", f.read())
+                self._sink.put(captureId + ".json", summaryJson)
+            summary['Folder'] = self._folder
+            logging.info(summary)
+        except Exception as e:
+            report = {RK.Synopsis: 'InvocationProfileFailed', RK.Cause: str(e), 'Capture': name}
+            logging.warning(report)
+
+
+_profiler = Profiler()
+
+def getProfiler() -> Profiler:
+    return _profiler
+
+def initProfiling(profileVariable='RDQPROFILE'):
+    rawCfg = os.environ.get(profileVariable) if profileVariable else None
+    if not rawCfg: return
+    try:
+        profileCfg = json.loads(rawCfg)
+    except ValueError as e:
+        logging.warning("Profiling configuration in environment variable %s is malformed; invocations will not be profiled | Detail: %s", profileVariable, e)
+        return
+    sinkFolder = profileCfg.get('SinkFolder')
+    _profiler.configure(
+        sampleRate=profileCfg.get('SampleRate', 0.0),
+        topN=profileCfg.get('TopN'),
+        memory=profileCfg.get('Memory'),
+        folder=profileCfg.get('Folder'),
+        sink=FileProfileSink(sinkFolder) if sinkFolder else None
+    )
@@ -61,6 +61,12 @@ class DispatchEvent:
     @property
     def stackNamePattern(self) -> str: return self._props['stackNamePattern']
 
+    @property
+    def trace(self) -> dict: return self._props.get('trace', {})
+
+    @property
+    def traceId(self) -> str: return self.trace.get('traceId')
+
     @property
     def target(self) -> DispatchEventTarget: return self._target
 
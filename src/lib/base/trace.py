@@ -0,0 +1,182 @@
+import os
+import sys
+import json
+import time
+import uuid
+import logging
+import threading
+from contextlib import contextmanager
+
+StatusOk = 'OK'
+StatusError = 'ERROR'
+
+def newTraceId():
+    return uuid.uuid4().hex
+
+def newSpanId():
+    return uuid.uuid4().hex[0:16]
+
+class Span:
+    def __init__(self, name, traceId, parentSpanId=None, attributes=None):
+        self.name = name
+        self.traceId = traceId
+        self.spanId = newSpanId()
+        self.parentSpanId = parentSpanId
+        self.attributes = dict(attributes) if attributes else {}
+        self.status = StatusOk
+        self.startNs = time.time_ns()
+        self.endNs = None
+
+    def setAttribute(self, key, value):
+        self.attributes[key] = value
+
+    def setError(self, cause):
+        self.status = StatusError
+        self.attributes['error'] = cause
+
+    def end(self):
+        self.endNs = time.time_ns()
+
+    @property
+    def durationMs(self):
+        if self.endNs is None: return None
+        return (self.endNs - self.startNs) / 1000000.0
+
+    def toDict(self):
+        return {
+            'traceId': self.traceId,
+            'spanId': self.spanId,
+            'parentSpanId': self.parentSpanId,
+            'name': self.name,
+            'startTimeUnixNano': self.startNs,
+            'endTimeUnixNano': self.endNs,
+            'durationMs': self.durationMs,
+            'status': self.status,
+            'attributes': self.attributes
+        }
+
+
+class JsonLinesExporter:
+    def __init__(self, stream=None):
+        self._stream = stream
+        self._lock = threading.Lock()
+
+    def export(self, span :Span):
+        out = self._stream if self._stream else sys.stdout
+        line = json.dumps({'Synopsis': 'TraceSpan', 'Span': span.toDict()})
+        with self._lock:
+            out.write(line + "\n")
+            out.flush()
+
+def _otlp_value(value):
+    if type(value) is bool: return {'boolValue': value}
+    if type(value) is int: return {'intValue': str(value)}
+    if type(value) is float: return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+class OtlpFileExporter:
+    def __init__(self, path, serviceName='rdq'):
+        self._path = path
+        self._serviceName = serviceName
+        self._lock = threading.Lock()
+
+    def to_otlp(self, span :Span):
+        otlpSpan = {
+            'traceId': span.traceId,
+            'spanId': span.spanId,
+            'name': span.name,
+            'kind': 1,
+            'startTimeUnixNano': str(span.startNs),
+            'endTimeUnixNano': str(span.endNs),
+            'attributes': [{'key': k, 'value': _otlp_value(v)} for (k, v) in span.attributes.items()],
+            'status': {'code': 2 if span.status == StatusError else 1}
+        }
+        if span.parentSpanId: otlpSpan['parentSpanId'] = span.parentSpanId
+        return {
+            'resourceSpans': [{
+                'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': self._serviceName}}]},
+                'scopeSpans': [{'scope': {'name': 'lib.base.trace'}, 'spans': [otlpSpan]}]
+            }]
+        }
+
+    def export(self, span :Span):
+        line = json.dumps(self.to_otlp(span))
+        with self._lock:
+            with open(self._path, 'a') as f:
+                f.write(line + "\n")
+
+
+class Tracer:
+    def __init__(self, exporter=None):
+        self._exporter = exporter
+        self._local = threading.local()
+
+    @property
+    def enabled(self): return not (self._exporter is None)
+
+    def setExporter(self, exporter):
+        self._exporter = exporter
+
+    def get_stack(self) -> list:
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = []
+            self._local.stack = stack
+        return stack
+
+    def currentSpan(self) -> Span:
+        stack = self.get_stack()
+        return stack[-1] if stack else None
+
+    def startSpan(self, name, traceId=None, parentSpanId=None, attributes=None) -> Span:
+        if not self._exporter: return None
+        parent = self.currentSpan()
+        if parent and not traceId:
+            traceId = parent.traceId
+            parentSpanId = parent.spanId
+        span = Span(name, traceId if traceId else newTraceId(), parentSpanId, attributes)
+        self.get_stack().append(span)
+        return span
+
+    def endSpan(self, span :Span, errorCause=None):
+        if not span: return
+        if errorCause: span.setError(errorCause)
+        span.end()
+        stack = self.get_stack()
+        if span in stack:
+            stack.remove(span)
+        try:
+            self._exporter.export(span)
+        except Exception as e:
+            logging.warning("Trace span could not be exported | Span: %s | Detail: %s", span.name, e)
+
+    @contextmanager
+    def span(self, name, traceId=None, parentSpanId=None, **attributes):
+        span = self.startSpan(name, traceId, parentSpanId, attributes)
+        try:
+            yield span
+        except Exception as e:
+            self.endSpan(span, type(e).__name__)
+            raise
+        self.endSpan(span)
+
+
+_tracer = Tracer()
+
+def getTracer() -> Tracer:
+    return _tracer
+
+def initTracing(traceVariable='RDQTRACE', serviceName=None):
+    value = os.environ.get(traceVariable) if traceVariable else None
+    if not value or value.lower() == 'none':
+        _tracer.setExporter(None)
+        return
+    if value.lower() == 'jsonl':
+        _tracer.setExporter(JsonLinesExporter())
+        return
+    if value.lower().startswith('otlp:'):
+        service = serviceName if serviceName else os.environ.get('AWS_LAMBDA_FUNCTION_NAME', 'rdq')
+        _tracer.setExporter(OtlpFileExporter(value[5:], service))
+        return
+    logging.warning("Unsupported trace exporter `%s` in environment variable %s; tracing is disabled", value, traceVariable)
+    _tracer.setExporter(None)
@@ -5,11 +5,19 @@ iamPrincipal = {
     'Service': "events.amazonaws.com"
 }
 
-def EventPattern_ConfigComplianceChange():
-    return {
+def EventPattern_ConfigComplianceChange(complianceTypes=None, ruleNamePrefixes=None):
+    pattern = {
         'source': ["aws.config"],
         'detail-type': ["Config Rules Compliance Change"]
         }
+    detail = {}
+    if ruleNamePrefixes:
+        detail['configRuleName'] = [{'prefix': prefix} for prefix in ruleNamePrefixes]
+    if complianceTypes:
+        detail['newEvaluationResult'] = {'complianceType': list(complianceTypes)}
+    if detail:
+        pattern['detail'] = detail
+    return pattern
 
 def Target(id, arn, roleArn):
     return {
@@ -0,0 +1,149 @@
+import json
+import time
+import threading
+from collections import OrderedDict
+from typing import List
+
+import cfg.core as cfgCore
+from lib.base import ConfigError
+from lib.lambdas.core.directory import LocalKeyValueTable
+
+StoreLocal = 'local'
+StoreNone = 'none'
+
+ReasonBatch = 'Coalesced'
+ReasonWindow = 'Suppressed'
+
+_MaxMemoryEntries = 10000
+
+def _resource_key(dispatch :dict):
+    return "|".join([dispatch['configRuleNameBase'], dispatch['awsAccountId'], dispatch['awsRegion'], dispatch['resourceId']])
+
+def _evaluation_key(dispatch :dict):
+    return "{}|{}".format(_resource_key(dispatch), dispatch.get('resultRecordedTime') or '')
+
+
+class MemoryTtlCache:
+    def __init__(self, ttlSecs, maxEntries=_MaxMemoryEntries, clock=time.time):
+        self._ttlSecs = ttlSecs
+        self._maxEntries = maxEntries
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        now = self._clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if not entry: return None
+            (value, expiresAt) = entry
+            if expiresAt > now: return value
+            del self._entries[key]
+            return None
+
+    # Every entry has the same TTL, so insertion order is also expiry order
+    def evict(self, now):
+        while self._entries:
+            (key, (value, expiresAt)) = next(iter(self._entries.items()))
+            if (expiresAt > now) and (len(self._entries) < self._maxEntries): return
+            self._entries.popitem(last=False)
+
+    def put(self, key, value):
+        now = self._clock()
+        with self._lock:
+            self._entries.pop(key, None)
+            self.evict(now)
+            self._entries[key] = (value, now + self._ttlSecs)
+
+    def size(self):
+        with self._lock:
+            return len(self._entries)
+
+class KeyValueTtlCache:
+    def __init__(self, table, ttlSecs, clock=time.time, prefix='Dedup'):
+        self._table = table
+        self._ttlSecs = ttlSecs
+        self._clock = clock
+        self._prefix = prefix
+
+    def get(self, key):
+        item = self._table.get_item("{}#{}".format(self._prefix, key))
+        if item is None: return None
+        entry = json.loads(item)
+        if entry['ExpiresAt'] <= self._clock(): return None
+        return entry['Value']
+
+    def put(self, key, value):
+        entry = {'Value': value, 'ExpiresAt': self._clock() + self._ttlSecs}
+        self._table.put_item("{}#{}".format(self._prefix, key), json.dumps(entry))
+
+
+class DuplicateEvent:
+    def __init__(self, dispatch :dict, reason, originalMessageId):
+        self.dispatch = dispatch
+        self.reason = reason
+        self.originalMessageId = originalMessageId
+
+    def toDict(self):
+        return {
+            'MessageId': self.dispatch.get('messageId'),
+            'OriginalMessageId': self.originalMessageId,
+            'Reason': self.reason,
+            'ConfigRuleName': self.dispatch['configRuleNameBase'],
+            'AccountId': self.dispatch['awsAccountId'],
+            'ResourceId': self.dispatch['resourceId']
+        }
+
+class EventDeduplicator:
+    def __init__(self, memoryCache :MemoryTtlCache, sharedCache :KeyValueTtlCache=None):
+        self._memoryCache = memoryCache
+        self._sharedCache = sharedCache
+
+    def get_seen(self, key):
+        messageId = self._memoryCache.get(key)
+        if messageId: return messageId
+        if not self._sharedCache: return None
+        messageId = self._sharedCache.get(key)
+        if messageId: self._memoryCache.put(key, messageId)
+        return messageId
+
+    def put_seen(self, key, messageId):
+        self._memoryCache.put(key, messageId)
+        if self._sharedCache: self._sharedCache.put(key, messageId)
+
+    def filter(self, dispatchList :List[dict]):
+        uniqueList = []
+        duplicates :List[DuplicateEvent] = []
+        batchMessageIds = {}
+        for dispatch in dispatchList:
+            messageId = dispatch.get('messageId')
+            resourceKey = _resource_key(dispatch)
+            batchMessageId = batchMessageIds.get(resourceKey)
+            if batchMessageId:
+                duplicates.append(DuplicateEvent(dispatch, ReasonBatch, batchMessageId))
+                continue
+            evaluationKey = _evaluation_key(dispatch)
+            seenMessageId = self.get_seen(evaluationKey)
+            if seenMessageId and (seenMessageId != messageId):
+                duplicates.append(DuplicateEvent(dispatch, ReasonWindow, seenMessageId))
+                continue
+            batchMessageIds[resourceKey] = messageId
+            self.put_seen(evaluationKey, messageId)
+            uniqueList.append(dispatch)
+        return (uniqueList, duplicates)
+
+
+_localSharedTable = LocalKeyValueTable()
+
+def createEventDeduplicator(ttlSecs=None) -> EventDeduplicator:
+    dedupCfg = cfgCore.dispatchDedupCfg()
+    if not dedupCfg.get('Enabled', True): return None
+    optTtlSecs = dedupCfg['TtlSecs'] if ttlSecs is None else ttlSecs
+    memoryCache = MemoryTtlCache(optTtlSecs, dedupCfg.get('MaxMemoryEntries', _MaxMemoryEntries))
+    storeType = dedupCfg['SharedStore']
+    if storeType == StoreLocal:
+        return EventDeduplicator(memoryCache, KeyValueTtlCache(_localSharedTable, optTtlSecs))
+    if storeType == StoreNone:
+        return EventDeduplicator(memoryCache)
+    msg = "Unsupported dedup shared store `{}` in cfg.core.dispatchDedupCfg".format(storeType)
+    raise ConfigError(msg)
@@ -0,0 +1,144 @@
+import logging
+import json
+import os
+import time
+from typing import List
+
+import cfg.core as cfgCore
+from lib.base import RK, ConfigError
+from lib.rdq.svcorg import OrganizationClient, AccountDescriptor
+
+StoreTmp = 'tmp'
+StoreNone = 'none'
+
+_SnapshotFields = ['Id', 'Arn', 'Name', 'Email', 'Status']
+
+def _snapshot_props(accountDesc :AccountDescriptor):
+    props = accountDesc.toDict()
+    return {field: props[field] for field in _SnapshotFields if field in props}
+
+class FileSnapshotStore:
+    def __init__(self, path):
+        self._path = path
+
+    def load(self):
+        if not os.path.exists(self._path): return None
+        with open(self._path, 'r') as f:
+            return json.load(f)
+
+    def save(self, snapshot :dict):
+        tmpPath = self._path + ".part"
+        try:
+            with open(tmpPath, 'w') as f:
+                json.dump(snapshot, f)
+            os.replace(tmpPath, self._path)
+        finally:
+            if os.path.exists(tmpPath): os.remove(tmpPath)
+
+class LocalKeyValueTable:
+    def __init__(self):
+        self._items = {}
+
+    def get_item(self, key):
+        return self._items.get(key)
+
+    def put_item(self, key, value):
+        self._items[key] = value
+
+class KeyValueSnapshotStore:
+    def __init__(self, table, key='AccountDirectory'):
+        self._table = table
+        self._key = key
+
+    def load(self):
+        value = self._table.get_item(self._key)
+        if value is None: return None
+        return json.loads(value)
+
+    def save(self, snapshot :dict):
+        self._table.put_item(self._key, json.dumps(snapshot))
+
+
+class AccountDirectory:
+    def __init__(self, orgClient :OrganizationClient, ttlSecs=None, store=None):
+        self._orgClient = orgClient
+        self._ttlSecs = cfgCore.dispatchAccountCacheTtlSecs if ttlSecs is None else ttlSecs
+        self._store = store
+        self._accountMap = {}
+        self._loadedAt = None
+
+    def is_fresh(self, loadedAt):
+        if loadedAt is None: return False
+        return (time.time() - loadedAt) < self._ttlSecs
+
+    def install(self, accountPropsList :List[dict], loadedAt):
+        accountMap = {}
+        for props in accountPropsList:
+            accountDesc = AccountDescriptor(props)
+            accountMap[accountDesc.accountId] = accountDesc
+        self._accountMap = accountMap
+        self._loadedAt = loadedAt
+
+    def load_snapshot(self):
+        if not self._store: return False
+        try:
+            snapshot = self._store.load()
+        except (OSError, ValueError) as e:
+            report = {RK.Synopsis: "AccountDirectorySnapshotUnreadable", RK.Cause: str(e), RK.Mitigation: "Will list accounts"}
+            logging.warning(report)
+            return False
+        if not snapshot: return False
+        loadedAt = snapshot.get('LoadedAt')
+        if not self.is_fresh(loadedAt): return False
+        self.install(snapshot.get('Accounts', []), loadedAt)
+        return True
+
+    def save_snapshot(self):
+        if not self._store: return
+        accountPropsList = [_snapshot_props(accountDesc) for accountDesc in self._accountMap.values()]
+        snapshot = {'LoadedAt': self._loadedAt, 'Accounts': accountPropsList}
+        try:
+            self._store.save(snapshot)
+        except (OSError, TypeError, ValueError) as e:
+            report = {RK.Synopsis: "AccountDirectorySnapshotNotSaved", RK.Cause: str(e), RK.Handling: 'Ignored'}
+            logging.warning(report)
+
+    def refresh(self):
+        accountDescs = self._orgClient.listAccountDescriptors()
+        self.install([_snapshot_props(accountDesc) for accountDesc in accountDescs], time.time())
+        self.save_snapshot()
+        report = {RK.Synopsis: "AccountDirectoryLoaded", 'AccountCount': len(self._accountMap)}
+        logging.info(report)
+
+    def ensure_loaded(self):
+        if self.is_fresh(self._loadedAt): return
+        if self.load_snapshot(): return
+        self.refresh()
+
+    def invalidate(self):
+        self._accountMap = {}
+        self._loadedAt = None
+
+    def accountCount(self):
+        return len(self._accountMap)
+
+    def getAccountDescriptor(self, accountId) -> AccountDescriptor:
+        self.ensure_loaded()
+        exAccountDesc = self._accountMap.get(accountId)
+        if exAccountDesc: return exAccountDesc
+        newAccountDesc = self._orgClient.getAccountDescriptor(accountId)
+        self._accountMap[accountId] = newAccountDesc
+        return newAccountDesc
+
+
+def createAccountDirectory(orgClient :OrganizationClient, ttlSecs=None) -> AccountDirectory:
+    directoryCfg = cfgCore.coreAccountDirectoryCfg()
+    storeType = directoryCfg['Store']
+    optTtlSecs = directoryCfg['TtlSecs'] if ttlSecs is None else ttlSecs
+    if storeType == StoreTmp:
+        snapshotPath = directoryCfg['SnapshotPath'].format(orgClient.accountId)
+        return AccountDirectory(orgClient, optTtlSecs, FileSnapshotStore(snapshotPath))
+    if storeType == StoreNone:
+        return AccountDirectory(orgClient, optTtlSecs)
+    msg = "Unsupported account directory store `{}` in cfg.core.coreAccountDirectoryCfg".format(storeType)
+    raise ConfigError(msg)
@@ -1,19 +1,25 @@
 import os, logging, json, time
 from typing import List
+from concurrent.futures import ThreadPoolExecutor
 
 import cfg.core as cfgCore
 import cfg.roles as cfgRoles
 
 from lib.base import ConfigError, RK
+from lib.base.trace import getTracer, newTraceId
+from lib.base.profiling import getProfiler
 import lib.base.ruleresponse as rr
 
-from lib.rdq import Profile
+from lib.rdq import Profile, RdqError
+from lib.rdq.base import getRetryPolicy
 from lib.rdq.svclambda import LambdaClient
-from lib.rdq.svccwm import CwmClient
+from lib.rdq.replay import flushRecording
 
 from lib.lambdas.core.parser import Parser, RuleInvocation
 import lib.lambdas.core.ruleselector as ruleselector
 import lib.lambdas.core.cwdims as cwdims
+import lib.lambdas.core.metrics as metrics
+from lib.lambdas.core.dedup import createEventDeduplicator
 
 
 def _get_remediation_role():
@@ -73,15 +79,49 @@ class RuleOutcome:
         self.retry = retry
         self.success = success
 
+class _InvocationLane:
+    def __init__(self, functionName :str):
+        self.functionName = functionName
+        self.positions = []
+        self.invocations :List[RuleInvocation] = []
+
+    def add(self, position :int, ri :RuleInvocation):
+        self.positions.append(position)
+        self.invocations.append(ri)
+
+def _create_lanes(ruleInvocations :List[RuleInvocation], concurrencyCfg :dict) -> List[_InvocationLane]:
+    defaultLimit = concurrencyCfg.get('FunctionConcurrencyDefault', 1)
+    functionLimits = concurrencyCfg.get('FunctionConcurrency', {})
+    lanesByFunction = {}
+    countByFunction = {}
+    lanes = []
+    for position, ri in enumerate(ruleInvocations):
+        functionName = ri.functionName
+        limit = max(1, functionLimits.get(functionName, defaultLimit))
+        functionLanes = lanesByFunction.setdefault(functionName, [])
+        count = countByFunction.get(functionName, 0)
+        countByFunction[functionName] = count + 1
+        laneIndex = count % limit
+        if laneIndex == len(functionLanes):
+            newLane = _InvocationLane(functionName)
+            functionLanes.append(newLane)
+            lanes.append(newLane)
+        functionLanes[laneIndex].add(position, ri)
+    return lanes
+
 class Dispatcher:
-    def __init__(self, profile :Profile, retrySleepSecs=2):
+    def __init__(self, profile :Profile, retrySleepSecs=2, maxParallelism=None, reportBatchItemFailures=None, accountDirectory=None):
         self._profile = profile
-        self._cwmclient = CwmClient(profile)
+        self._metrics = metrics.createMetricsBackend(profile)
         self._lambdaclient = LambdaClient(profile)
         remediationRoleName = _get_remediation_role()
         isStandaloneMode = _is_standalone_mode(remediationRoleName)
-        self._parser = Parser(profile, remediationRoleName, isStandaloneMode)
+        self._parser = Parser(profile, remediationRoleName, isStandaloneMode, accountDirectory)
+        self._deduplicator = createEventDeduplicator()
         self._retrySleepSecs = retrySleepSecs
+        self._concurrencyCfg = cfgCore.dispatchConcurrencyCfg()
+        self._maxParallelism = maxParallelism if maxParallelism else self._concurrencyCfg.get('MaxParallelism', 1)
+        self._reportBatchItemFailures = cfgCore.dispatchReportBatchItemFailures if reportBatchItemFailures is None else reportBatchItemFailures
 
     def get_base_config_rule_name(self, id, qval):
         optBaseName = ruleselector.getRuleBaseName(qval)
@@ -111,6 +151,7 @@ class Dispatcher:
         if not newEvaluationResult: return None
         complianceType = _get_attribute(newEvaluationResult, messageId, "complianceType")
         if not complianceType: return None
+        resultRecordedTime = newEvaluationResult.get("resultRecordedTime")
         configRuleNameBase = self.get_base_config_rule_name(messageId, configRuleNameQualified)
         if not configRuleNameBase: return None
         return {
@@ -121,7 +162,8 @@ class Dispatcher:
             'awsAccountId': awsAccountId,
             'awsRegion': awsRegion,
             'resourceType': resourceType,
-            'resourceId': resourceId
+            'resourceId': resourceId,
+            'resultRecordedTime': resultRecordedTime
         }
 
     def create_dispatch(self, record):
@@ -130,11 +172,19 @@ class Dispatcher:
             logging.warning(report)
             return None
         messageId = record["messageId"]
+        traceId = newTraceId()
+        with getTracer().span('dispatch.parse', traceId, messageId=messageId):
+            return self.parse_record(messageId, traceId, record)
+
+    def parse_record(self, messageId, traceId, record):
         bodyjson = _get_attribute(record, messageId, 'body')
         if not bodyjson: return None
         body = json.loads(bodyjson)
         dispatch = self.extract_dispatch(messageId, body)
         if not dispatch: return None
+        attributes = record.get('attributes', {})
+        dispatch['receiveCount'] = int(attributes.get('ApproximateReceiveCount', 1))
+        dispatch['traceId'] = traceId
 
         report = {RK.Synopsis: 'ReceivedComplianceEvent', 'ParsedEvent': dispatch}
         logging.info(report)
@@ -159,8 +209,58 @@ class Dispatcher:
         cwNamespace = cfgCore.coreCloudWatchNamespace(action)
         cwMetric = "{}.{}".format(ar.major, ar.minor)
         dimensionMaps = cwdims.getDimensionMaps(ri.event)
-        for dimensionMap in dimensionMaps:
-            self._cwmclient.putCount(cwNamespace, cwMetric, dimensionMap)
+        try:
+            for dimensionMap in dimensionMaps:
+                self._metrics.addCount(cwNamespace, cwMetric, dimensionMap)
+        except RdqError as e:
+            self.report_metrics_failure(e)
+
+    def publish_duplicate_metrics(self, duplicates):
+        cwNamespace = cfgCore.coreCloudWatchOperationsNamespace()
+        dimensionMap = {'Function': cfgCore.coreFunctionName('ComplianceDispatcher')}
+        countByReason = {}
+        for duplicate in duplicates:
+            countByReason[duplicate.reason] = countByReason.get(duplicate.reason, 0) + 1
+        try:
+            for reason in countByReason:
+                self._metrics.addCount(cwNamespace, "Events.{}".format(reason), dimensionMap, float(countByReason[reason]))
+        except RdqError as e:
+            self.report_metrics_failure(e)
+
+    def deduplicate(self, dispatchList):
+        if not self._deduplicator: return dispatchList
+        (uniqueList, duplicates) = self._deduplicator.filter(dispatchList)
+        if duplicates:
+            report = {RK.Synopsis: 'DuplicateComplianceEvents', RK.Handling: 'NotInvoked', 'Duplicates': [d.toDict() for d in duplicates]}
+            logging.info(report)
+            self.publish_duplicate_metrics(duplicates)
+        return uniqueList
+
+    def publish_api_retry_metrics(self):
+        counters = getRetryPolicy().getCounters()
+        cwNamespace = cfgCore.coreCloudWatchOperationsNamespace()
+        dimensionMap = {'Function': cfgCore.coreFunctionName('ComplianceDispatcher')}
+        try:
+            for counterName in counters:
+                value = counters[counterName]
+                if value == 0: continue
+                self._metrics.addCount(cwNamespace, "Api.{}".format(counterName), dimensionMap, float(value))
+        except RdqError as e:
+            self.report_metrics_failure(e)
+
+    def dump_api_stats(self):
+        dimensionMap = {'Function': cfgCore.coreFunctionName('ComplianceDispatcher')}
+        self._profile.apiStats.dump(cfgCore.coreApiStatsFormat(), cfgCore.coreCloudWatchOperationsNamespace(), dimensionMap)
+
+    def flush_cloudwatch_metrics(self):
+        try:
+            self._metrics.flushCounts()
+        except RdqError as e:
+            self.report_metrics_failure(e)
+
+    def report_metrics_failure(self, e :RdqError):
+        report = {RK.Synopsis: "MetricsNotPublished", RK.Cause: e.message, RK.Handling: 'Discarded'}
+        logging.error(report)
 
     def publish_preview(self, ri :RuleInvocation, ar :rr.ActionResponse):
         if not ri.event.preview: return
@@ -223,20 +323,99 @@ class Dispatcher:
         return RuleOutcome(False, False)
 
 
-    def dispatch_rule_invocations(self, ruleInvocations :List[RuleInvocation]):
+    def invoke_rule(self, ri :RuleInvocation) -> RuleOutcome:
+        eventDict = ri.event.toDict()
+        trace = ri.event.trace
+        with getTracer().span('dispatch.invoke', trace.get('traceId'), function=ri.functionName, attempt=ri.attempt, messageId=ri.messageId) as span:
+            if span:
+                eventDict['trace'] = dict(trace, parentSpanId=span.spanId)
+            ruleOutcome = self.invoke_rule_event(ri, eventDict)
+            if span:
+                span.setAttribute('retry', ruleOutcome.retry)
+                span.setAttribute('success', ruleOutcome.success)
+            return ruleOutcome
+
+    def invoke_rule_event(self, ri :RuleInvocation, eventDict :dict) -> RuleOutcome:
+        try:
+            functionResponse = self._lambdaclient.invokeFunctionJson(ri.functionName, eventDict)
+        except RdqError as e:
+            if not self._reportBatchItemFailures: raise
+            report = {
+                RK.Synopsis: "LambdaFunctionInvokeFailed",
+                RK.Cause: e.message,
+                RK.Handling: 'BatchItemFailure',
+                'Function': ri.functionName,
+                'Attempt': ri.attempt,
+                'MessageId': ri.messageId,
+                'Event': eventDict
+            }
+            logging.error(report)
+            return RuleOutcome(True)
+        return self.analyze_response(ri, functionResponse)
+
+    def invoke_lane(self, lane :_InvocationLane) -> List[RuleOutcome]:
+        outcomes = []
+        for ri in lane.invocations:
+            outcomes.append(self.invoke_rule(ri))
+        return outcomes
+
+    def dispatch_rule_invocations_serial(self, ruleInvocations :List[RuleInvocation]):
         retryList = []
         for ri in ruleInvocations:
-            eventDict = ri.event.toDict()
-            functionResponse = self._lambdaclient.invokeFunctionJson(ri.functionName, eventDict)
-            ruleOutcome = self.analyze_response(ri, functionResponse)
+            ruleOutcome = self.invoke_rule(ri)
             if ruleOutcome.retry:
                 retryList.append(ri.newInvocation())
         return retryList
 
+    def dispatch_rule_invocations_parallel(self, ruleInvocations :List[RuleInvocation]):
+        lanes = _create_lanes(ruleInvocations, self._concurrencyCfg)
+        maxWorkers = min(self._maxParallelism, len(lanes))
+        outcomes = [None] * len(ruleInvocations)
+        with ThreadPoolExecutor(max_workers=maxWorkers) as executor:
+            futures = [executor.submit(getProfiler().worker, self.invoke_lane, lane) for lane in lanes]
+        for lane, future in zip(lanes, futures):
+            laneOutcomes = future.result()
+            for position, ruleOutcome in zip(lane.positions, laneOutcomes):
+                outcomes[position] = ruleOutcome
+        retryList = []
+        for ri, ruleOutcome in zip(ruleInvocations, outcomes):
+            if ruleOutcome.retry:
+                retryList.append(ri.newInvocation())
+        return retryList
+
+    def dispatch_rule_invocations(self, ruleInvocations :List[RuleInvocation]):
+        if self._maxParallelism <= 1 or len(ruleInvocations) <= 1:
+            return self.dispatch_rule_invocations_serial(ruleInvocations)
+        return self.dispatch_rule_invocations_parallel(ruleInvocations)
+
+    def batch_response(self, retryList :List[RuleInvocation]):
+        failures = []
+        for ri in retryList:
+            if not ri.messageId: continue
+            failures.append({'itemIdentifier': ri.messageId})
+        if failures:
+            report = {RK.Synopsis: "BatchItemFailures", 'MessageIds': [f['itemIdentifier'] for f in failures]}
+            logging.warning(report)
+        return {'batchItemFailures': failures}
+
     def dispatch(self, event :dict):
-        dispatchList = self.create_dispatch_list(event)
-        if len(dispatchList) == 0: return
+        getRetryPolicy().beginInvocation()
+        try:
+            return self.dispatch_batch(event)
+        finally:
+            self.publish_api_retry_metrics()
+            self.flush_cloudwatch_metrics()
+            self.dump_api_stats()
+            flushRecording()
+
+    def dispatch_batch(self, event :dict):
+        dispatchList = self.deduplicate(self.create_dispatch_list(event))
+        if len(dispatchList) == 0:
+            return self.batch_response([]) if self._reportBatchItemFailures else None
         ruleInvocations = self._parser.createInvokeList(dispatchList)
+        if self._reportBatchItemFailures:
+            retryList = self.dispatch_rule_invocations(ruleInvocations)
+            return self.batch_response(retryList)
         while True:
             if len(ruleInvocations) == 0: return
             retryList = self.dispatch_rule_invocations(ruleInvocations)
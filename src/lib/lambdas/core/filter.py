@@ -1,6 +1,11 @@
 import re
+import threading
 import cfg.rules as cfgRule
 
+_RegexMetaChars = set(".^$*+?{}[]\\|()")
+_PrefixSuffix = ".*"
+_TrieTerminal = ''
+
 def _canonIncluded(included) -> list:
     if included is None: return [".+"]
     if type(included) is str: return [included]
@@ -11,24 +16,106 @@ def _canonExcluded(excluded) -> list:
     if type(excluded) is str: return [excluded]
     return list(excluded)
 
-
-def acceptResourceId(configRuleName, action, accountName, resourceId) -> bool:
-    included = cfgRule.includedResourceIds(configRuleName, action, accountName)
-    excluded = cfgRule.excludedResourceIds(configRuleName, action, accountName)
-    inList = _canonIncluded(included)
-    exList = _canonExcluded(excluded)
-    matchIn = False
-    for inPattern in inList:
-        if re.fullmatch(inPattern, resourceId):
-            matchIn = True
-            break
-    if not matchIn: return False
-    matchEx = False
-    for exPattern in exList:
-        if re.fullmatch(exPattern, resourceId):
-            matchEx = True
-            break
-    if matchEx: return False
+def _is_literal(pattern):
+    for ch in pattern:
+        if ch in _RegexMetaChars: return False
     return True
 
+def _is_unsafe_in_alternation(pattern):
+    if "(?P" in pattern: return True
+    if re.match(r"\(\?[aiLmsux]+\)", pattern): return True
+    return re.search(r"\\[1-9]", pattern) is not None
+
+
+class PatternSet:
+    def __init__(self, patterns :list):
+        self._patterns = list(patterns)
+        self._matchAnyNonEmpty = False
+        self._literals = set()
+        self._prefixTrie = {}
+        self._prefixCount = 0
+        regexList = []
+        for pattern in self._patterns:
+            if pattern == ".+":
+                self._matchAnyNonEmpty = True
+            elif _is_literal(pattern):
+                self._literals.add(pattern)
+            elif pattern.endswith(_PrefixSuffix) and _is_literal(pattern[:-len(_PrefixSuffix)]):
+                self.put_prefix(pattern[:-len(_PrefixSuffix)])
+            else:
+                regexList.append(pattern)
+        self._combined = None
+        self._separate = []
+        combinable = [p for p in regexList if not _is_unsafe_in_alternation(p)]
+        if combinable:
+            try:
+                self._combined = re.compile("|".join("(?:{})".format(p) for p in combinable))
+            except re.error:
+                combinable = []
+        for pattern in regexList:
+            if not (pattern in combinable):
+                self._separate.append(re.compile(pattern))
+
+    @property
+    def patterns(self): return self._patterns
+
+    def put_prefix(self, prefix):
+        node = self._prefixTrie
+        for ch in prefix:
+            node = node.setdefault(ch, {})
+        node[_TrieTerminal] = True
+        self._prefixCount += 1
+
+    def match_prefix(self, value):
+        if self._prefixCount == 0: return False
+        node = self._prefixTrie
+        if _TrieTerminal in node: return True
+        for ch in value:
+            node = node.get(ch)
+            if node is None: return False
+            if _TrieTerminal in node: return True
+        return False
+
+    def matches(self, value) -> bool:
+        if self._matchAnyNonEmpty and len(value) > 0: return True
+        if value in self._literals: return True
+        if self.match_prefix(value): return True
+        if self._combined and self._combined.fullmatch(value): return True
+        for regex in self._separate:
+            if regex.fullmatch(value): return True
+        return False
 
+
+class ResourceIdFilter:
+    def __init__(self, included, excluded):
+        self._included = PatternSet(_canonIncluded(included))
+        self._excluded = PatternSet(_canonExcluded(excluded))
+
+    def accept(self, resourceId) -> bool:
+        if not self._included.matches(resourceId): return False
+        if self._excluded.matches(resourceId): return False
+        return True
+
+
+_filterLock = threading.Lock()
+_filterMap = {}
+
+def getResourceIdFilter(configRuleName, action, accountName) -> ResourceIdFilter:
+    key = (configRuleName, action, accountName)
+    exFilter = _filterMap.get(key)
+    if exFilter: return exFilter
+    with _filterLock:
+        exFilter = _filterMap.get(key)
+        if exFilter: return exFilter
+        included = cfgRule.includedResourceIds(configRuleName, action, accountName)
+        excluded = cfgRule.excludedResourceIds(configRuleName, action, accountName)
+        newFilter = ResourceIdFilter(included, excluded)
+        _filterMap[key] = newFilter
+        return newFilter
+
+def clearResourceIdFilters():
+    with _filterLock:
+        _filterMap.clear()
+
+def acceptResourceId(configRuleName, action, accountName, resourceId) -> bool:
+    return getResourceIdFilter(configRuleName, action, accountName).accept(resourceId)
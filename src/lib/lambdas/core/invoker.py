@@ -5,15 +5,15 @@ import lib.base.ruleresponse as rr
 from lib.base.request import DispatchEvent
 
 from lib.rdq import Profile
-from lib.rdq.svccwm import CwmClient
 import lib.lambdas.core.cwdims as cwdims
+import lib.lambdas.core.metrics as metrics
 
 
 
 class Invoker:
     def __init__(self, profile :Profile):
         self._profile = profile
-        self._cwmclient = CwmClient(profile)
+        self._metrics = metrics.createMetricsBackend(profile)
 
     def publish_cloudwatch_metrics(self, functionName, event :DispatchEvent, ar :rr.ActionResponse):
         action = ar.action
@@ -21,7 +21,8 @@ class Invoker:
         cwMetric = "{}.{}".format(ar.major, ar.minor)
         dimensionMaps = cwdims.getDimensionMaps(event)
         for dimensionMap in dimensionMaps:
-            self._cwmclient.putCount(cwNamespace, cwMetric, dimensionMap)
+            self._metrics.addCount(cwNamespace, cwMetric, dimensionMap)
+        self._metrics.flushCounts()
 
     def publish_preview(self, functionName, event :DispatchEvent, ar :rr.ActionResponse):
         if not event.preview: return
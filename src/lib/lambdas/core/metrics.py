@@ -0,0 +1,103 @@
+import sys
+import json
+import time
+import threading
+
+import cfg.core as cfgCore
+from lib.base import ConfigError
+from lib.rdq import Profile
+from lib.rdq.svccwm import CwmClient
+
+BackendApi = 'api'
+BackendEmf = 'emf'
+
+_MaxEmfValues = 100
+
+def _dimension_key(dimensionMap: dict):
+    return tuple(sorted(dimensionMap.items()))
+
+class EmfWriter:
+    def __init__(self, stream=None, maxPendingData=1000, maxPendingSecs=30):
+        self._stream = stream
+        self._maxPendingData = maxPendingData
+        self._maxPendingSecs = maxPendingSecs
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._pendingSince = None
+
+    def is_flush_due(self, valueCount):
+        if valueCount >= _MaxEmfValues: return True
+        if len(self._pending) >= self._maxPendingData: return True
+        if self._pendingSince is None: return False
+        return (time.time() - self._pendingSince) >= self._maxPendingSecs
+
+    def take_pending(self):
+        with self._lock:
+            pending = self._pending
+            self._pending = {}
+            self._pendingSince = None
+        return pending
+
+    def create_document(self, namespace, dimensionKey, metricValues :dict, timestampMs):
+        dimensionNames = [name for (name, value) in dimensionKey]
+        metricDefs = [{'Name': metricName, 'Unit': 'Count'} for metricName in metricValues]
+        doc = {
+            '_aws': {
+                'Timestamp': timestampMs,
+                'CloudWatchMetrics': [{
+                    'Namespace': namespace,
+                    'Dimensions': [dimensionNames],
+                    'Metrics': metricDefs
+                }]
+            }
+        }
+        for (name, value) in dimensionKey:
+            doc[name] = value
+        for metricName in metricValues:
+            values = metricValues[metricName]
+            doc[metricName] = values[0] if len(values) == 1 else values
+        return doc
+
+    def addCount(self, namespace, metricName, dimensionMap :dict, value=1.0):
+        key = (namespace, _dimension_key(dimensionMap))
+        with self._lock:
+            metricValues = self._pending.get(key)
+            if metricValues is None:
+                metricValues = {}
+                self._pending[key] = metricValues
+                if self._pendingSince is None:
+                    self._pendingSince = time.time()
+            values = metricValues.setdefault(metricName, [])
+            values.append(value)
+            flushDue = self.is_flush_due(len(values))
+        if flushDue:
+            self.flushCounts()
+
+    def pendingCount(self):
+        with self._lock:
+            return len(self._pending)
+
+    def flushCounts(self):
+        pending = self.take_pending()
+        if len(pending) == 0: return 0
+        stream = self._stream if self._stream else sys.stdout
+        timestampMs = int(time.time() * 1000)
+        lines = []
+        for (namespace, dimensionKey) in pending:
+            doc = self.create_document(namespace, dimensionKey, pending[(namespace, dimensionKey)], timestampMs)
+            lines.append(json.dumps(doc))
+        stream.write("\n".join(lines) + "\n")
+        stream.flush()
+        return len(pending)
+
+def createMetricsBackend(profile :Profile):
+    backend = cfgCore.coreCloudWatchMetricsBackend()
+    bufferCfg = cfgCore.coreCloudWatchMetricBufferCfg()
+    maxPendingData = bufferCfg['MaxPendingData']
+    maxPendingSecs = bufferCfg['MaxPendingSecs']
+    if backend == BackendApi:
+        return CwmClient(profile, maxPendingData=maxPendingData, maxPendingSecs=maxPendingSecs)
+    if backend == BackendEmf:
+        return EmfWriter(maxPendingData=maxPendingData, maxPendingSecs=maxPendingSecs)
+    msg = "Unsupported CloudWatch metrics backend `{}` in cfg.core.coreCloudWatchMetricsBackend".format(backend)
+    raise ConfigError(msg)
@@ -3,14 +3,14 @@ import json
 from typing import List
 
 from lib.base import RK
+from lib.base.trace import getTracer
 import cfg.core as cfgCore
-import cfg.rules as cfgRules
 
 from lib.rdq import Profile
 from lib.rdq.svcorg import OrganizationClient, AccountDescriptor
 from lib.base.request import DispatchEvent, DispatchEventTarget
-import lib.lambdas.core.ruleselector as ruleselector
-import lib.lambdas.core.filter as filter
+from lib.lambdas.core.ruleconfig import ResolvedRuleConfig, getResolvedRuleConfig
+from lib.lambdas.core.directory import AccountDirectory, createAccountDirectory
 
 class TargetDescriptor:
     def __init__(self, props):
@@ -32,10 +32,11 @@ class TargetDescriptor:
         
 
 class RuleInvocation:
-    def __init__(self, functionName :str, event :DispatchEvent, attempt=1):
+    def __init__(self, functionName :str, event :DispatchEvent, attempt=1, messageId=None):
         self._functionName = functionName
         self._event = event
         self._attempt = attempt
+        self._messageId = messageId
 
     @property
     def functionName(self) -> str: return self._functionName
@@ -46,13 +47,17 @@ class RuleInvocation:
     @property
     def event(self) -> DispatchEvent: return self._event
 
+    @property
+    def messageId(self) -> str: return self._messageId
+
     def newInvocation(self):
-        return RuleInvocation(self._functionName, self._event, self._attempt + 1)
+        return RuleInvocation(self._functionName, self._event, self._attempt + 1, self._messageId)
 
     def toDict(self):
         d = dict()
         d['functionName'] = self._functionName
         d['attempt'] = self._attempt
+        d['messageId'] = self._messageId
         d['event'] = self._event.toDict()
         return d
 
@@ -60,12 +65,16 @@ class RuleInvocation:
         return json.dumps(self.toDict())
 
 class Parser:
-    def __init__(self, profile:Profile, remediationRoleName: str, isStandaloneMode: bool):
+    def __init__(self, profile:Profile, remediationRoleName: str, isStandaloneMode: bool, accountDirectory :AccountDirectory=None):
         self._profile = profile
-        self._orgclient = OrganizationClient(profile)
         self._remediationRoleName = remediationRoleName
         self._isStandaloneMode = isStandaloneMode
-        self._accountDescriptorMap = {}
+        self._accountDirectory = accountDirectory
+
+    def get_account_directory(self) -> AccountDirectory:
+        if not self._accountDirectory:
+            self._accountDirectory = createAccountDirectory(OrganizationClient(self._profile))
+        return self._accountDirectory
 
     def get_target(self, accountId) -> TargetDescriptor:
         isExternalAccount = self._profile.accountId != accountId
@@ -83,65 +92,20 @@ class Parser:
             }
             return TargetDescriptor(propsLocal)
 
-        exTargetDesc = self._accountDescriptorMap.get(accountId)
-        if exTargetDesc: return exTargetDesc
-
-        accountDesc: AccountDescriptor = self._orgclient.getAccountDescriptor(accountId)
+        accountDesc: AccountDescriptor = self.get_account_directory().getAccountDescriptor(accountId)
         props = {
             'RoleName': self._remediationRoleName,
             'AccountName': accountDesc.accountName,
             'AccountEmail': accountDesc.accountEmail,
             'StatusActive': accountDesc.isActive
         }
-        newTargetDesc = TargetDescriptor(props)
-        self._accountDescriptorMap[accountId] = newTargetDesc
-        return newTargetDesc
-
-    def get_preview(self, configRuleName, action, accountName):
-        preview = cfgRules.isPreview(configRuleName, action, accountName)
-        if not (preview is None): return preview
-        return True
-
-    def get_deployment_method(self, configRuleName, action, accountName):
-        dm = cfgRules.deploymentMethod(configRuleName, action, accountName)
-        if not (dm is None): return dm
-        return {}
-
-    def get_stack_name_pattern(self, configRuleName, action, accountName):
-        pattern = cfgRules.stackNamePattern(configRuleName, action, accountName)
-        if not (pattern is None): return pattern
-        conformancePackName = cfgRules.conformancePackName()
-        pattern = conformancePackName + "-AutoDeploy-{}"
-        return pattern
-
-    def get_manual_tag_name(self, configRuleName, action, accountName):
-        tagName = cfgRules.manualTagName(configRuleName, action, accountName)
-        if not (tagName is None): return tagName
-        tagName = "DoNotAutoRemediate"
-        report = {
-            RK.Synopsis: "PartialConfig",
-            'Rule': configRuleName,
-            RK.Cause: "No manual remediation tag defined by rule",
-            RK.Mitigation: "Will use {}".format(tagName)
-        }
-        logging.warning(report)
-        return tagName
-
-    def get_auto_resource_tags(self, configRuleName, action, accountName):
-        tags = cfgRules.autoResourceTags(configRuleName, action, accountName)
-        if not (tags is None): return tags
-        tags = {'AutoDeployed': 'True'}
-        report = {
-            RK.Synopsis: "PartialConfig",
-            'Rule': configRuleName,
-            RK.Cause: "No tags defined for auto-deployed resources by rule",
-            RK.Mitigation: "Will use tags {}".format(tags)
-        }
-        logging.warning(report)
-        return tags
-
+        return TargetDescriptor(props)
 
     def create_invoke(self, dispatch):
+        with getTracer().span('dispatch.resolve', dispatch.get('traceId'), messageId=dispatch.get('messageId')):
+            return self.resolve_invoke(dispatch)
+
+    def resolve_invoke(self, dispatch):
         action = dispatch['action']
         targetAccountId = dispatch['awsAccountId']
         resourceId = dispatch['resourceId']
@@ -153,17 +117,18 @@ class Parser:
             return None
         targetAccountName = optTargetDescriptor.accountName
         configRuleName = dispatch['configRuleNameBase']
-        ruleCodeFolder = ruleselector.getRuleCodeFolder(configRuleName, action, targetAccountName)
+        ruleConfig: ResolvedRuleConfig = getResolvedRuleConfig(configRuleName, action, targetAccountName)
+        ruleCodeFolder = ruleConfig.codeFolder
         if not ruleCodeFolder:
             report = {RK.Synopsis: "NoRuleImplementation", 'Dispatch': dispatch, 'Target': optTargetDescriptor.toDict()}
             logging.info(report)
             return None
-        if not ruleselector.isActionEnabled(action, configRuleName, targetAccountName):
+        if not ruleConfig.actionEnabled:
             report = {RK.Synopsis: "ActionDisabled", 'Dispatch': dispatch, 'Target': optTargetDescriptor.toDict()}
             logging.info(report)
             return None
         functionName = cfgCore.ruleFunctionName(ruleCodeFolder)
-        acceptResource = filter.acceptResourceId(configRuleName, action, targetAccountName, resourceId)
+        acceptResource = ruleConfig.resourceIdFilter.accept(resourceId)
         if not acceptResource:
             report = {RK.Synopsis: "ResourceExempt", 'Dispatch': dispatch, 'Target': optTargetDescriptor.toDict()}
             logging.info(report)
@@ -181,12 +146,13 @@ class Parser:
         de = {}
         de['configRuleName'] = configRuleName
         de['action'] = action
-        de['conformancePackName'] = cfgRules.conformancePackName()
-        de['preview'] = self.get_preview(configRuleName, action, targetAccountName)
-        de['deploymentMethod'] = self.get_deployment_method(configRuleName, action, targetAccountName)
-        de['manualTagName'] = self.get_manual_tag_name(configRuleName, action, targetAccountName)
-        de['autoResourceTags'] = self.get_auto_resource_tags(configRuleName, action, targetAccountName)
-        de['stackNamePattern'] = self.get_stack_name_pattern(configRuleName, action, targetAccountName)
+        de['conformancePackName'] = ruleConfig.conformancePackName
+        de['preview'] = ruleConfig.preview
+        de['deploymentMethod'] = ruleConfig.deploymentMethod
+        de['manualTagName'] = ruleConfig.manualTagName
+        de['autoResourceTags'] = ruleConfig.autoResourceTags
+        de['stackNamePattern'] = ruleConfig.stackNamePattern
+        de['trace'] = {'traceId': dispatch.get('traceId'), 'messageId': dispatch.get('messageId')}
         event = DispatchEvent(de, target)
         return {'functionName': functionName, 'event': event}
 
@@ -195,6 +161,7 @@ class Parser:
         for dispatch in dispatchList:
             optInvoke = self.create_invoke(dispatch)
             if not optInvoke: continue
-            invoke = RuleInvocation(optInvoke['functionName'], optInvoke['event'])
+            attempt = dispatch.get('receiveCount', 1)
+            invoke = RuleInvocation(optInvoke['functionName'], optInvoke['event'], attempt, dispatch.get('messageId'))
             invokeList.append(invoke)
         return invokeList
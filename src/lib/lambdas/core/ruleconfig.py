@@ -0,0 +1,136 @@
+import logging
+import copy
+import threading
+
+from lib.base import RK
+import cfg.rules as cfgRules
+import lib.lambdas.core.ruleselector as ruleselector
+import lib.lambdas.core.filter as filter
+
+class ResolvedRuleConfig:
+    __slots__ = ('_configRuleName', '_action', '_accountName', '_codeFolder', '_actionEnabled', '_conformancePackName',
+        '_preview', '_deploymentMethod', '_manualTagName', '_autoResourceTags', '_stackNamePattern',
+        '_resourceIdFilter')
+
+    def __init__(self, configRuleName, action, accountName):
+        self._configRuleName = configRuleName
+        self._action = action
+        self._accountName = accountName
+        self._codeFolder = ruleselector.getRuleCodeFolder(configRuleName, action, accountName)
+        self._conformancePackName = cfgRules.conformancePackName()
+        if not self._codeFolder:
+            self.resolve_unimplemented()
+            return
+        self._actionEnabled = bool(ruleselector.isActionEnabled(action, configRuleName, accountName))
+        self._preview = _resolve_preview(configRuleName, action, accountName)
+        self._deploymentMethod = _resolve_deployment_method(configRuleName, action, accountName)
+        self._manualTagName = _resolve_manual_tag_name(configRuleName, action, accountName)
+        self._autoResourceTags = _resolve_auto_resource_tags(configRuleName, action, accountName)
+        self._stackNamePattern = _resolve_stack_name_pattern(configRuleName, action, accountName, self._conformancePackName)
+        self._resourceIdFilter = filter.getResourceIdFilter(configRuleName, action, accountName)
+
+    def resolve_unimplemented(self):
+        self._actionEnabled = False
+        self._preview = True
+        self._deploymentMethod = {}
+        self._manualTagName = None
+        self._autoResourceTags = {}
+        self._stackNamePattern = None
+        self._resourceIdFilter = None
+
+    @property
+    def configRuleName(self): return self._configRuleName
+
+    @property
+    def action(self): return self._action
+
+    @property
+    def accountName(self): return self._accountName
+
+    @property
+    def codeFolder(self): return self._codeFolder
+
+    @property
+    def actionEnabled(self) -> bool: return self._actionEnabled
+
+    @property
+    def conformancePackName(self): return self._conformancePackName
+
+    @property
+    def preview(self) -> bool: return self._preview
+
+    @property
+    def deploymentMethod(self) -> dict: return copy.deepcopy(self._deploymentMethod)
+
+    @property
+    def manualTagName(self): return self._manualTagName
+
+    @property
+    def autoResourceTags(self) -> dict: return dict(self._autoResourceTags)
+
+    @property
+    def stackNamePattern(self): return self._stackNamePattern
+
+    @property
+    def resourceIdFilter(self) -> filter.ResourceIdFilter: return self._resourceIdFilter
+
+
+def _resolve_preview(configRuleName, action, accountName):
+    preview = cfgRules.isPreview(configRuleName, action, accountName)
+    if not (preview is None): return preview
+    return True
+
+def _resolve_deployment_method(configRuleName, action, accountName):
+    dm = cfgRules.deploymentMethod(configRuleName, action, accountName)
+    if not (dm is None): return copy.deepcopy(dm)
+    return {}
+
+def _resolve_stack_name_pattern(configRuleName, action, accountName, conformancePackName):
+    pattern = cfgRules.stackNamePattern(configRuleName, action, accountName)
+    if not (pattern is None): return pattern
+    return conformancePackName + "-AutoDeploy-{}"
+
+def _resolve_manual_tag_name(configRuleName, action, accountName):
+    tagName = cfgRules.manualTagName(configRuleName, action, accountName)
+    if not (tagName is None): return tagName
+    tagName = "DoNotAutoRemediate"
+    report = {
+        RK.Synopsis: "PartialConfig",
+        'Rule': configRuleName,
+        RK.Cause: "No manual remediation tag defined by rule",
+        RK.Mitigation: "Will use {}".format(tagName)
+    }
+    logging.warning(report)
+    return tagName
+
+def _resolve_auto_resource_tags(configRuleName, action, accountName):
+    tags = cfgRules.autoResourceTags(configRuleName, action, accountName)
+    if not (tags is None): return dict(tags)
+    tags = {'AutoDeployed': 'True'}
+    report = {
+        RK.Synopsis: "PartialConfig",
+        'Rule': configRuleName,
+        RK.Cause: "No tags defined for auto-deployed resources by rule",
+        RK.Mitigation: "Will use tags {}".format(tags)
+    }
+    logging.warning(report)
+    return tags
+
+
+_resolvedLock = threading.Lock()
+_resolvedMap = {}
+
+def getResolvedRuleConfig(configRuleName, action, accountName) -> ResolvedRuleConfig:
+    key = (configRuleName, action, accountName)
+    exResolved = _resolvedMap.get(key)
+    if exResolved: return exResolved
+    with _resolvedLock:
+        exResolved = _resolvedMap.get(key)
+        if exResolved: return exResolved
+        newResolved = ResolvedRuleConfig(configRuleName, action, accountName)
+        _resolvedMap[key] = newResolved
+        return newResolved
+
+def clearResolvedRuleConfigs():
+    with _resolvedLock:
+        _resolvedMap.clear()
@@ -3,11 +3,16 @@ import cfg.rules as cfgRules
 ActionRemediate = 'remediate'
 ActionBaseline = 'baseline'
 
+_ConformancePackInfix = "-conformance-pack-"
+
 def getRuleBaseName(qualifiedName):
-    spos = qualifiedName.find("-conformance-pack-")
+    spos = qualifiedName.find(_ConformancePackInfix)
     if spos <= 0: return None
     return qualifiedName[0:spos]
 
+def getRuleNamePrefix(ruleBaseName):
+    return ruleBaseName + _ConformancePackInfix
+
 def getRuleCodeFolder(ruleBaseName, action, targetAccountName):
     return cfgRules.codeFolder(ruleBaseName, action, targetAccountName)
 
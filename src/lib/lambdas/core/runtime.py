@@ -0,0 +1,39 @@
+import logging
+import time
+
+import cfg.core as cfgCore
+from lib.base import RK
+from lib.rdq import Profile
+from lib.lambdas.core.dispatcher import Dispatcher
+
+class DispatcherRuntime:
+    def __init__(self, maxAgeSecs=None, profileFactory=Profile, accountDirectoryFactory=None):
+        self._maxAgeSecs = cfgCore.dispatchRuntimeMaxAgeSecs if maxAgeSecs is None else maxAgeSecs
+        self._profileFactory = profileFactory
+        self._accountDirectoryFactory = accountDirectoryFactory
+        self._profile = None
+        self._dispatcher = None
+        self._createdAt = 0
+
+    def is_stale(self):
+        if not self._dispatcher: return True
+        ageSecs = time.time() - self._createdAt
+        if ageSecs >= self._maxAgeSecs: return True
+        return self._profile.credentialsExpiring()
+
+    def reset(self):
+        self._profile = None
+        self._dispatcher = None
+        self._createdAt = 0
+
+    def getDispatcher(self) -> Dispatcher:
+        if not self.is_stale(): return self._dispatcher
+        isWarm = not (self._dispatcher is None)
+        profile = self._profileFactory()
+        accountDirectory = self._accountDirectoryFactory(profile) if self._accountDirectoryFactory else None
+        self._dispatcher = Dispatcher(profile, accountDirectory=accountDirectory)
+        self._profile = profile
+        self._createdAt = time.time()
+        report = {RK.Synopsis: 'DispatcherRuntimeCreated', 'Refresh': isWarm, 'AccountId': profile.accountId}
+        logging.info(report)
+        return self._dispatcher
@@ -1,8 +1,13 @@
 import logging
+import threading
+import time
+from collections import OrderedDict
 import botocore
-import boto3
 
 import lib.base as base
+from lib.rdq.base import getRetryPolicy
+from lib.rdq.ratelimit import getRateLimiter
+from lib.rdq.instrument import ApiStatsRegistry, getApiStatsRegistry
 
 def _role_arn(accountId, roleName):
     return "arn:aws:iam::{}:role/{}".format(accountId, roleName)
@@ -31,24 +36,161 @@ class RdqTimeout(Exception):
 
 class RdqCredentialsWarning(RdqError): pass
 
+def _credential_metadata(credentials):
+    expiration = credentials['Expiration']
+    return {
+        'access_key': credentials['AccessKeyId'],
+        'secret_key': credentials['SecretAccessKey'],
+        'token': credentials['SessionToken'],
+        'expiry_time': expiration.isoformat() if hasattr(expiration, 'isoformat') else expiration
+    }
+
+def _needs_retry(**kwargs):
+    return getRetryPolicy().needs_retry(**kwargs)
+
+def createClientConfig(maxPoolConnections=20, tcpKeepalive=True, connectTimeoutSecs=10, readTimeoutSecs=60):
+    # Retries are decided by the rdq retry policy, so botocore makes a single attempt per call
+    args = {
+        'max_pool_connections': maxPoolConnections,
+        'connect_timeout': connectTimeoutSecs,
+        'read_timeout': readTimeoutSecs,
+        'retries': {'mode': 'standard', 'total_max_attempts': 1}
+    }
+    import botocore.config
+    try:
+        return botocore.config.Config(tcp_keepalive=tcpKeepalive, **args)
+    except TypeError:
+        return botocore.config.Config(**args)
+
+# boto3 and the heavier botocore modules are imported on first use, keeping them out of Lambda module import time
+_defaultClientConfig = None
+
+def getDefaultClientConfig():
+    global _defaultClientConfig
+    if _defaultClientConfig is None:
+        _defaultClientConfig = createClientConfig()
+    return _defaultClientConfig
+
+def setDefaultClientConfig(clientConfig):
+    global _defaultClientConfig
+    _defaultClientConfig = clientConfig
+
+_emulator = None
+
+def getEmulator():
+    return _emulator
+
+def setEmulator(emulator):
+    global _emulator
+    _emulator = emulator
+    clearAssumedRoleCache()
+
+_trafficRecorder = None
+
+def getTrafficRecorder():
+    return _trafficRecorder
+
+def setTrafficRecorder(recorder):
+    global _trafficRecorder
+    _trafficRecorder = recorder
+
+_SourceProfileMaxAgeSecs = 60 * 60
+_AssumedRoleMaxProfiles = 256
+
+_assumedRoleLock = threading.Lock()
+_assumedRoleProfiles = OrderedDict()
+_sourceProfiles = {}
+_profileKeyLocks = {}
+
+def clearAssumedRoleCache():
+    with _assumedRoleLock:
+        _assumedRoleProfiles.clear()
+        _sourceProfiles.clear()
+        _profileKeyLocks.clear()
+
+def _cached_assumed_profile(key):
+    with _assumedRoleLock:
+        exProfile = _assumedRoleProfiles.get(key)
+        if exProfile: _assumedRoleProfiles.move_to_end(key)
+        return exProfile
+
+def _cache_assumed_profile(key, profile):
+    with _assumedRoleLock:
+        _assumedRoleProfiles[key] = profile
+        while len(_assumedRoleProfiles) > _AssumedRoleMaxProfiles:
+            _assumedRoleProfiles.popitem(last=False)
+
+# Profiles for different keys are created concurrently; only callers waiting on the same key are serialised
+def _profile_key_lock(key):
+    with _assumedRoleLock:
+        return _profileKeyLocks.setdefault(key, threading.Lock())
+
+def _release_profile_key_lock(key):
+    with _assumedRoleLock:
+        _profileKeyLocks.pop(key, None)
+
+def _is_fresh_source(entry, maxAgeSecs):
+    if not entry: return False
+    (profile, createdAt) = entry
+    if (time.time() - createdAt) >= maxAgeSecs: return False
+    return not profile.credentialsExpiring()
+
+def getSourceProfile(regionName=None, maxAgeSecs=_SourceProfileMaxAgeSecs):
+    exEntry = _sourceProfiles.get(regionName)
+    if _is_fresh_source(exEntry, maxAgeSecs): return exEntry[0]
+    key = ('Source', regionName)
+    try:
+        with _profile_key_lock(key):
+            exEntry = _sourceProfiles.get(regionName)
+            if _is_fresh_source(exEntry, maxAgeSecs): return exEntry[0]
+            sourceFactory = lambda: getSourceProfile(regionName, maxAgeSecs)
+            newProfile = Profile(regionName=regionName, sourceFactory=sourceFactory)
+            with _assumedRoleLock:
+                _sourceProfiles[regionName] = (newProfile, time.time())
+            return newProfile
+    finally:
+        _release_profile_key_lock(key)
+
+
+# Credential provider for assumed role sessions; CredentialResolver only requires load()
+class _AssumedRoleCredentialProvider:
+    METHOD = 'rdq-assume-role'
+    CANONICAL_NAME = 'RdqAssumeRole'
+
+    def __init__(self, credentials):
+        self._credentials = credentials
+
+    def load(self):
+        return self._credentials
+
 
 class Profile:
-    def __init__(self, srcSession=None, roleName=None, sessionName=None, regionName=None):
+    def __init__(self, srcSession=None, roleName=None, sessionName=None, regionName=None, identity=None, clientConfig=None, apiStats=None, emulator=None, recorder=None, sourceFactory=None):
+        import boto3
+        import botocore.exceptions
+        self._sourceFactory = sourceFactory
+        self._emulator = emulator if emulator else getEmulator()
+        self._recorder = recorder if recorder else getTrafficRecorder()
         session = srcSession
         if not session:
-            if regionName:
+            if self._emulator:
+                session = self._emulator.createSession(regionName=regionName)
+            elif regionName:
                 session = boto3.Session(region_name=regionName)
             else:
                 session = boto3.Session()
-        self._sts_client = session.client('sts')
-        self._tag_client = session.client('resourcegroupstaggingapi')
+        self._session = session
+        self._clientConfig = clientConfig if clientConfig else getDefaultClientConfig()
+        self._clientLock = threading.Lock()
+        self._clients = {}
+        self._apiStats = apiStats if apiStats else getApiStatsRegistry()
+        self._accountId = None
         op = "sts:get_caller_identity"
         try:
-            r = self._sts_client.get_caller_identity()
+            r = identity if identity else self.getClient('sts').get_caller_identity()
             self._userId = r['UserId']
             self._accountId = r['Account']
             self._arn = r['Arn']
-            self._session = session
             self._regionName = session.region_name
             self._roleName = roleName if roleName else session.profile_name
             self._sessionName = sessionName if sessionName else "Initial"
@@ -77,7 +219,31 @@ class Profile:
         return self._sessionName
 
     def getClient(self, serviceName):
-        return self._session.client(serviceName)
+        exClient = self._clients.get(serviceName)
+        if exClient: return exClient
+        with self._clientLock:
+            exClient = self._clients.get(serviceName)
+            if exClient: return exClient
+            newClient = self._session.client(serviceName, config=self._clientConfig)
+            newClient.meta.events.register('needs-retry', _needs_retry)
+            getRateLimiter().attach(newClient, self)
+            self._apiStats.attach(newClient)
+            if self._emulator: self._emulator.attach(newClient, self)
+            if self._recorder: self._recorder.attach(newClient, self)
+            self._clients[serviceName] = newClient
+            return newClient
+
+    @property
+    def apiStats(self) -> ApiStatsRegistry:
+        return self._apiStats
+
+    def credentialsExpiring(self, marginSecs=300):
+        import botocore.credentials
+        credentials = self._session.get_credentials()
+        if not credentials: return True
+        if isinstance(credentials, botocore.credentials.RefreshableCredentials):
+            return credentials.refresh_needed(marginSecs)
+        return False
 
     def getAccountPrincipalArn(self):
         return "arn:aws:iam::{}:root".format(self._accountId)
@@ -91,24 +257,15 @@ class Profile:
     def getRoleArn(self, roleName):
         return _role_arn(self._accountId, roleName)
 
-    def assumeRole(self, accountId, roleName, regionName, sessionName, durationSecs=3600):
+    def assume_role(self, accountId, roleName, regionName, sessionName, durationSecs):
         roleArn = _role_arn(accountId, roleName)
         op = "sts:assume_role"
         try:
-            response = self._sts_client.assume_role(
+            return self.getClient('sts').assume_role(
                 RoleArn=roleArn,
                 RoleSessionName=sessionName,
                 DurationSeconds=durationSecs
             )
-            r = response['Credentials']
-            newSession = boto3.Session(
-                aws_access_key_id=r['AccessKeyId'],
-                aws_secret_access_key=r['SecretAccessKey'],
-                aws_session_token=r['SessionToken'],
-                region_name = regionName
-            )
-            newProfile = Profile(newSession, roleName, sessionName)
-            return newProfile
         except botocore.exceptions.ClientError as e:
             erc = e.response['Error']['Code'] 
             ectx = {
@@ -124,6 +281,45 @@ class Profile:
             erm = "Role {} Account {} could not assume role {}".format(self._roleName, self._accountId, roleArn)
             raise RdqError(erm)
 
+    def create_assumed_profile(self, accountId, roleName, regionName, sessionName, durationSecs):
+        import boto3
+        import botocore.credentials
+        import botocore.session
+        response = self.assume_role(accountId, roleName, regionName, sessionName, durationSecs)
+        # Refresh through the current source profile, so a rotated source profile is not kept alive by its assumed roles
+        sourceFactory = self._sourceFactory
+        if not sourceFactory:
+            sourceProfile = self
+            sourceFactory = lambda: sourceProfile
+        initialMetadata = [_credential_metadata(response['Credentials'])]
+        def fetch():
+            if initialMetadata: return initialMetadata.pop()
+            refreshResponse = sourceFactory().assume_role(accountId, roleName, regionName, sessionName, durationSecs)
+            return _credential_metadata(refreshResponse['Credentials'])
+        credentials = botocore.credentials.DeferredRefreshableCredentials(refresh_using=fetch, method='sts-assume-role')
+        credentials.get_frozen_credentials()
+        provider = _AssumedRoleCredentialProvider(credentials)
+        botocoreSession = botocore.session.get_session()
+        botocoreSession.register_component('credential_provider', botocore.credentials.CredentialResolver([provider]))
+        newSession = boto3.Session(botocore_session=botocoreSession, region_name=regionName)
+        assumedRoleUser = response['AssumedRoleUser']
+        identity = {'UserId': assumedRoleUser['AssumedRoleId'], 'Account': accountId, 'Arn': assumedRoleUser['Arn']}
+        return Profile(newSession, roleName, sessionName, identity=identity, clientConfig=self._clientConfig, apiStats=self._apiStats, emulator=self._emulator, recorder=self._recorder)
+
+    def assumeRole(self, accountId, roleName, regionName, sessionName, durationSecs=3600):
+        key = (accountId, roleName, regionName, sessionName, durationSecs)
+        exProfile = _cached_assumed_profile(key)
+        if exProfile: return exProfile
+        try:
+            with _profile_key_lock(key):
+                exProfile = _cached_assumed_profile(key)
+                if exProfile: return exProfile
+                newProfile = self.create_assumed_profile(accountId, roleName, regionName, sessionName, durationSecs)
+                _cache_assumed_profile(key, newProfile)
+                return newProfile
+        finally:
+            _release_profile_key_lock(key)
+
     def _tag_resources(self, arnList, tags):
         op = 'resourcegroupstaggingapi:tag_resources'
         ectx = {
@@ -134,7 +330,7 @@ class Profile:
             'FromRegionName': self._regionName
         }
         try:
-            response = self._tag_client.tag_resources(
+            response = self.getClient('resourcegroupstaggingapi').tag_resources(
                 ResourceARNList=arnList,
                 Tags=tags.toDict()
             )
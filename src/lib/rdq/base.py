@@ -2,6 +2,125 @@ import logging
 import time
 import uuid
 import json
+import random
+import threading
+import botocore
+
+_ThrottleErrorCodes = set([
+    'Throttling',
+    'ThrottlingException',
+    'ThrottledException',
+    'RequestThrottledException',
+    'TooManyRequestsException',
+    'RequestLimitExceeded',
+    'ProvisionedThroughputExceededException',
+    'TransactionInProgressException',
+    'BandwidthLimitExceeded',
+    'SlowDown',
+    'EC2ThrottledException',
+    'PriorRequestNotComplete'
+])
+
+_TransientErrorCodes = set([
+    'InternalError',
+    'InternalFailure',
+    'InternalServerError',
+    'InternalServiceError',
+    'ServiceUnavailable',
+    'ServiceUnavailableException',
+    'RequestTimeout',
+    'RequestTimeoutException',
+    'IDPCommunicationError'
+])
+
+_TransientStatusCodes = set([500, 502, 503, 504])
+
+def _transient_exceptions():
+    import botocore.exceptions
+    return (botocore.exceptions.ConnectionError, botocore.exceptions.HTTPClientError)
+
+def isThrottleError(serviceName, errorCode):
+    return errorCode in _ThrottleErrorCodes
+
+def responseError(response):
+    if not response: return (None, None)
+    (httpResponse, parsed) = response
+    errorCode = parsed.get('Error', {}).get('Code') if parsed else None
+    statusCode = httpResponse.status_code if httpResponse is not None else None
+    return (errorCode, statusCode)
+
+class RetryPolicy:
+    def __init__(self, baseSecs=0.2, capSecs=20, maxAttempts=8, retryBudget=100):
+        self._baseSecs = baseSecs
+        self._capSecs = capSecs
+        self._maxAttempts = maxAttempts
+        self._retryBudget = retryBudget
+        self._lock = threading.Lock()
+        self._budgetRemaining = None
+        self._counters = self.new_counters()
+
+    def new_counters(self):
+        return {'Retries': 0, 'Throttles': 0, 'Transients': 0, 'BudgetExhausted': 0}
+
+    # The retry budget only applies once a Lambda invocation begins; installer and builder runs retry without limit
+    def beginInvocation(self):
+        with self._lock:
+            self._budgetRemaining = self._retryBudget
+            self._counters = self.new_counters()
+
+    def getCounters(self) -> dict:
+        with self._lock:
+            return dict(self._counters)
+
+    def is_throttle(self, serviceName, errorCode):
+        return isThrottleError(serviceName, errorCode)
+
+    def is_transient(self, errorCode, statusCode, caughtException):
+        if caughtException is not None: return isinstance(caughtException, _transient_exceptions())
+        if errorCode in _TransientErrorCodes: return True
+        return statusCode in _TransientStatusCodes
+
+    def next_wait(self, prevWaitSecs):
+        lowSecs = self._baseSecs
+        highSecs = max(lowSecs, (prevWaitSecs if prevWaitSecs else lowSecs) * 3)
+        return min(self._capSecs, random.uniform(lowSecs, highSecs))
+
+    def consume_budget(self, isThrottle):
+        with self._lock:
+            if self._budgetRemaining is not None:
+                if self._budgetRemaining <= 0:
+                    self._counters['BudgetExhausted'] += 1
+                    return False
+                self._budgetRemaining -= 1
+            self._counters['Retries'] += 1
+            if isThrottle:
+                self._counters['Throttles'] += 1
+            else:
+                self._counters['Transients'] += 1
+            return True
+
+    def needs_retry(self, response=None, attempts=None, caught_exception=None, operation=None, request_dict=None, **kwargs):
+        (errorCode, statusCode) = responseError(response)
+        serviceName = operation.service_model.endpoint_prefix if operation else None
+        isThrottle = (caught_exception is None) and self.is_throttle(serviceName, errorCode)
+        if not (isThrottle or self.is_transient(errorCode, statusCode, caught_exception)): return None
+        if attempts and (attempts >= self._maxAttempts): return None
+        if not self.consume_budget(isThrottle): return None
+        context = request_dict.get('context', {}) if request_dict else {}
+        waitSecs = self.next_wait(context.get('rdqRetryWaitSecs'))
+        context['rdqRetryWaitSecs'] = waitSecs
+        opName = operation.name if operation else None
+        logging.info("Will retry AWS API call after backoff interval | Service: %s | Operation: %s | Error: %s | Attempt: %s | WaitSecs: %.2f", serviceName, opName, errorCode or type(caught_exception).__name__, attempts, waitSecs)
+        return waitSecs
+
+_retryPolicy = RetryPolicy()
+
+def getRetryPolicy() -> RetryPolicy:
+    return _retryPolicy
+
+def setRetryPolicy(retryPolicy :RetryPolicy):
+    global _retryPolicy
+    _retryPolicy = retryPolicy
 
 
 def _fmt_argval(val):
@@ -107,7 +226,7 @@ class ServiceUtils:
         attempt = tracker['attempt']
         logging.info("Will retry rdq operation after backoff interval | Tracker: %s", tracker)
         time.sleep(waitSecs)
-        newWait = waitSecs * 2
+        newWait = random.uniform(1, waitSecs * 3)
         if limitSecs > 0:
             newWait = min(newWait, limitSecs)
         newTracker = dict(tracker)
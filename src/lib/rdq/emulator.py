@@ -0,0 +1,804 @@
+import io
+import json
+import time
+import uuid
+import base64
+import random
+import hashlib
+import logging
+import datetime
+import threading
+import importlib.util
+
+AnyOperation = '*'
+
+class EmulatorError(Exception):
+    def __init__(self, code, message, statusCode=400):
+        self.code = code
+        self.message = message
+        self.statusCode = statusCode
+
+    def __str__(self):
+        return "{}: {}".format(self.code, self.message)
+
+def _not_found(message):
+    return EmulatorError('ResourceNotFoundException', message, 404)
+
+def _now():
+    return datetime.datetime.now(datetime.timezone.utc)
+
+def _required(params, key):
+    if key in params: return params[key]
+    raise EmulatorError('ValidationException', "Missing required parameter {}".format(key))
+
+
+class EmulatedCall:
+    def __init__(self, emulator, serviceName, operationName, params, accountId, regionName, accessKey):
+        self.emulator = emulator
+        self.serviceName = serviceName
+        self.operationName = operationName
+        self.params = params
+        self.accountId = accountId
+        self.regionName = regionName
+        self.accessKey = accessKey
+
+    def arn(self, service, resource, regional=True):
+        region = self.regionName if regional else ''
+        return "arn:aws:{}:{}:{}:{}".format(service, region, self.accountId, resource)
+
+
+class ServiceBackend:
+    def __init__(self, emulator):
+        self._emulator = emulator
+        self._lock = threading.RLock()
+        self._state = {}
+
+    def scope(self, call :EmulatedCall) -> dict:
+        key = (call.accountId, call.regionName)
+        with self._lock:
+            scope = self._state.get(key)
+            if scope is None:
+                scope = self.create_scope()
+                self._state[key] = scope
+            return scope
+
+    def scopeFor(self, accountId, regionName) -> dict:
+        return self.scope(EmulatedCall(self._emulator, None, None, {}, accountId, regionName, None))
+
+    def create_scope(self) -> dict:
+        return {}
+
+    def handle(self, call :EmulatedCall) -> dict:
+        method = getattr(self, call.operationName, None)
+        if not method:
+            raise EmulatorError('UnsupportedOperation', "Operation {}:{} is not emulated".format(call.serviceName, call.operationName))
+        with self._lock:
+            return method(call, call.params)
+
+
+class StsBackend(ServiceBackend):
+    def GetCallerIdentity(self, call, params):
+        identity = self._emulator.identityForKey(call.accessKey)
+        return {'UserId': identity['UserId'], 'Account': identity['Account'], 'Arn': identity['Arn']}
+
+    def AssumeRole(self, call, params):
+        roleArn = _required(params, 'RoleArn')
+        sessionName = _required(params, 'RoleSessionName')
+        parts = roleArn.split(':')
+        accountId = parts[4]
+        roleName = parts[5].split('/')[-1]
+        if not self._emulator.hasAccount(accountId):
+            raise EmulatorError('AccessDenied', "Role {} cannot be assumed".format(roleArn), 403)
+        roleId = "AROA{}".format(hashlib.sha1(roleArn.encode('utf-8')).hexdigest()[0:16].upper())
+        assumedArn = "arn:aws:sts::{}:assumed-role/{}/{}".format(accountId, roleName, sessionName)
+        identity = {'UserId': "{}:{}".format(roleId, sessionName), 'Account': accountId, 'Arn': assumedArn}
+        accessKey = self._emulator.issueKey(identity)
+        durationSecs = params.get('DurationSeconds', 3600)
+        return {
+            'Credentials': {
+                'AccessKeyId': accessKey,
+                'SecretAccessKey': 'emulated',
+                'SessionToken': 'emulated',
+                'Expiration': _now() + datetime.timedelta(seconds=durationSecs)
+            },
+            'AssumedRoleUser': {'AssumedRoleId': identity['UserId'], 'Arn': assumedArn}
+        }
+
+
+class OrganizationsBackend(ServiceBackend):
+    def account_dict(self, accountId):
+        account = self._emulator.getAccount(accountId)
+        if not account: raise EmulatorError('AccountNotFoundException', "Account {} not found".format(accountId))
+        return {
+            'Id': accountId,
+            'Arn': "arn:aws:organizations::{}:account/o-emulated/{}".format(self._emulator.managementAccountId, accountId),
+            'Name': account['Name'],
+            'Email': account['Email'],
+            'Status': account['Status'],
+            'JoinedMethod': 'CREATED',
+            'JoinedTimestamp': account['JoinedTimestamp']
+        }
+
+    def DescribeOrganization(self, call, params):
+        managementAccountId = self._emulator.managementAccountId
+        return {'Organization': {
+            'Id': 'o-emulated',
+            'Arn': "arn:aws:organizations::{}:organization/o-emulated".format(managementAccountId),
+            'MasterAccountId': managementAccountId,
+            'MasterAccountArn': "arn:aws:organizations::{}:account/o-emulated/{}".format(managementAccountId, managementAccountId),
+            'MasterAccountEmail': self._emulator.getAccount(managementAccountId)['Email']
+        }}
+
+    def DescribeAccount(self, call, params):
+        return {'Account': self.account_dict(_required(params, 'AccountId'))}
+
+    def ListAccounts(self, call, params):
+        return {'Accounts': [self.account_dict(accountId) for accountId in self._emulator.accountIds()]}
+
+    def ListRoots(self, call, params):
+        return {'Roots': [{'Id': 'r-emul', 'Arn': "arn:aws:organizations::{}:root/o-emulated/r-emul".format(self._emulator.managementAccountId), 'Name': 'Root'}]}
+
+    def ListOrganizationalUnitsForParent(self, call, params):
+        return {'OrganizationalUnits': []}
+
+
+class LambdaContext:
+    def __init__(self, functionName, accountId, regionName):
+        self.function_name = functionName
+        self.aws_request_id = str(uuid.uuid4())
+        self.invoked_function_arn = "arn:aws:lambda:{}:{}:function:{}".format(regionName, accountId, functionName)
+        self.memory_limit_in_mb = 128
+
+    def get_remaining_time_in_millis(self):
+        return 900000
+
+
+class LambdaBackend(ServiceBackend):
+    def create_scope(self):
+        return {'Functions': {}, 'Handlers': {}}
+
+    def function(self, call, functionName):
+        name = functionName.split(':')[-1]
+        function = self.scope(call)['Functions'].get(name)
+        if not function: raise _not_found("Function not found: {}".format(functionName))
+        return function
+
+    def registerHandler(self, accountId, regionName, functionName, handler):
+        with self._lock:
+            scope = self.scopeFor(accountId, regionName)
+            scope['Handlers'][functionName] = handler
+            if not (functionName in scope['Functions']):
+                call = EmulatedCall(self._emulator, 'lambda', 'CreateFunction', {}, accountId, regionName, None)
+                scope['Functions'][functionName] = self.new_function(call, {'FunctionName': functionName, 'Runtime': 'python3.8', 'Handler': 'lambda_function.lambda_handler'}, b'')
+
+    def new_function(self, call, params, codeZip):
+        functionName = params['FunctionName']
+        config = {
+            'FunctionName': functionName,
+            'FunctionArn': call.arn('lambda', "function:{}".format(functionName)),
+            'State': 'Active',
+            'LastUpdateStatus': 'Successful',
+            'CodeSha256': base64.b64encode(hashlib.sha256(codeZip).digest()).decode(),
+            'CodeSize': len(codeZip),
+            'Layers': [{'Arn': arn, 'CodeSize': 0} for arn in params.get('Layers', [])]
+        }
+        for key in ['Runtime', 'Role', 'Handler', 'Description', 'Timeout', 'MemorySize']:
+            if key in params: config[key] = params[key]
+        if 'Environment' in params: config['Environment'] = {'Variables': dict(params['Environment'].get('Variables', {}))}
+        return {'Configuration': config, 'Tags': dict(params.get('Tags', {})), 'Concurrency': None}
+
+    def CreateFunction(self, call, params):
+        functions = self.scope(call)['Functions']
+        functionName = _required(params, 'FunctionName')
+        if functionName in functions: raise EmulatorError('ResourceConflictException', "Function already exist: {}".format(functionName), 409)
+        function = self.new_function(call, params, params.get('Code', {}).get('ZipFile', b''))
+        functions[functionName] = function
+        return dict(function['Configuration'])
+
+    def GetFunction(self, call, params):
+        function = self.function(call, _required(params, 'FunctionName'))
+        return {'Configuration': dict(function['Configuration']), 'Tags': dict(function['Tags'])}
+
+    def UpdateFunctionConfiguration(self, call, params):
+        function = self.function(call, _required(params, 'FunctionName'))
+        config = function['Configuration']
+        for key in ['Runtime', 'Role', 'Handler', 'Description', 'Timeout', 'MemorySize']:
+            if key in params: config[key] = params[key]
+        if 'Environment' in params: config['Environment'] = {'Variables': dict(params['Environment'].get('Variables', {}))}
+        if 'Layers' in params: config['Layers'] = [{'Arn': arn, 'CodeSize': 0} for arn in params['Layers']]
+        return dict(config)
+
+    def UpdateFunctionCode(self, call, params):
+        function = self.function(call, _required(params, 'FunctionName'))
+        codeZip = params.get('ZipFile', b'')
+        config = function['Configuration']
+        config['CodeSha256'] = base64.b64encode(hashlib.sha256(codeZip).digest()).decode()
+        config['CodeSize'] = len(codeZip)
+        return dict(config)
+
+    def DeleteFunction(self, call, params):
+        functionName = _required(params, 'FunctionName')
+        self.function(call, functionName)
+        del self.scope(call)['Functions'][functionName.split(':')[-1]]
+        return {}
+
+    def GetFunctionConcurrency(self, call, params):
+        concurrency = self.function(call, _required(params, 'FunctionName'))['Concurrency']
+        return {} if concurrency is None else {'ReservedConcurrentExecutions': concurrency}
+
+    def PutFunctionConcurrency(self, call, params):
+        function = self.function(call, _required(params, 'FunctionName'))
+        function['Concurrency'] = _required(params, 'ReservedConcurrentExecutions')
+        return {'ReservedConcurrentExecutions': function['Concurrency']}
+
+    def handle(self, call :EmulatedCall) -> dict:
+        if call.operationName == 'Invoke': return self.Invoke(call, call.params)
+        return super().handle(call)
+
+    def Invoke(self, call, params):
+        import botocore.response
+        functionName = _required(params, 'FunctionName').split(':')[-1]
+        with self._lock:
+            self.function(call, functionName)
+            handler = self.scope(call)['Handlers'].get(functionName)
+        if not handler: raise EmulatorError('ServiceException', "Function {} has no local handler".format(functionName), 500)
+        payload = params.get('Payload', b'{}')
+        event = json.loads(payload.decode('utf-8') if isinstance(payload, bytes) else payload)
+        response = {'StatusCode': 202 if params.get('InvocationType') == 'Event' else 200, 'ExecutedVersion': '$LATEST'}
+        try:
+            result = handler(event, LambdaContext(functionName, call.accountId, call.regionName))
+            outBytes = json.dumps(result).encode('utf-8')
+        except Exception as e:
+            logging.exception("Emulated Lambda handler failed | FunctionName: %s", functionName)
+            response['FunctionError'] = 'Unhandled'
+            outBytes = json.dumps({'errorMessage': str(e), 'errorType': type(e).__name__}).encode('utf-8')
+        response['Payload'] = botocore.response.StreamingBody(io.BytesIO(outBytes), len(outBytes))
+        return response
+
+
+class SqsBackend(ServiceBackend):
+    def create_scope(self):
+        return {'Queues': {}}
+
+    def queue_url(self, call, queueName):
+        return "https://sqs.{}.amazonaws.com/{}/{}".format(call.regionName, call.accountId, queueName)
+
+    def queue(self, call, queueUrl):
+        queue = self.scope(call)['Queues'].get(queueUrl.split('/')[-1])
+        if not queue: raise EmulatorError('AWS.SimpleQueueService.NonExistentQueue', "The specified queue does not exist", 400)
+        return queue
+
+    def CreateQueue(self, call, params):
+        queueName = _required(params, 'QueueName')
+        queues = self.scope(call)['Queues']
+        if not (queueName in queues):
+            attributes = dict(params.get('Attributes', {}))
+            attributes['QueueArn'] = call.arn('sqs', queueName)
+            queues[queueName] = {'Attributes': attributes, 'Tags': dict(params.get('tags', {})), 'Messages': []}
+        return {'QueueUrl': self.queue_url(call, queueName)}
+
+    def GetQueueUrl(self, call, params):
+        queueName = _required(params, 'QueueName')
+        self.queue(call, queueName)
+        return {'QueueUrl': self.queue_url(call, queueName)}
+
+    def GetQueueAttributes(self, call, params):
+        queue = self.queue(call, _required(params, 'QueueUrl'))
+        attributes = dict(queue['Attributes'])
+        attributes['ApproximateNumberOfMessages'] = str(len(queue['Messages']))
+        names = params.get('AttributeNames', ['All'])
+        if 'All' in names: return {'Attributes': attributes}
+        return {'Attributes': {k: v for (k, v) in attributes.items() if k in names}}
+
+    def SetQueueAttributes(self, call, params):
+        self.queue(call, _required(params, 'QueueUrl'))['Attributes'].update(params.get('Attributes', {}))
+        return {}
+
+    def DeleteQueue(self, call, params):
+        queueUrl = _required(params, 'QueueUrl')
+        self.queue(call, queueUrl)
+        del self.scope(call)['Queues'][queueUrl.split('/')[-1]]
+        return {}
+
+    def TagQueue(self, call, params):
+        self.queue(call, _required(params, 'QueueUrl'))['Tags'].update(params.get('Tags', {}))
+        return {}
+
+    def ListQueueTags(self, call, params):
+        return {'Tags': dict(self.queue(call, _required(params, 'QueueUrl'))['Tags'])}
+
+    def SendMessage(self, call, params):
+        messageId = str(uuid.uuid4())
+        body = _required(params, 'MessageBody')
+        self.queue(call, _required(params, 'QueueUrl'))['Messages'].append({'MessageId': messageId, 'ReceiptHandle': messageId, 'Body': body})
+        return {'MessageId': messageId, 'MD5OfMessageBody': hashlib.md5(body.encode('utf-8')).hexdigest()}
+
+    def ReceiveMessage(self, call, params):
+        queue = self.queue(call, _required(params, 'QueueUrl'))
+        maxMessages = params.get('MaxNumberOfMessages', 1)
+        return {'Messages': [dict(m) for m in queue['Messages'][0:maxMessages]]}
+
+    def DeleteMessage(self, call, params):
+        queue = self.queue(call, _required(params, 'QueueUrl'))
+        receiptHandle = _required(params, 'ReceiptHandle')
+        queue['Messages'] = [m for m in queue['Messages'] if m['ReceiptHandle'] != receiptHandle]
+        return {}
+
+
+class CloudWatchBackend(ServiceBackend):
+    def create_scope(self):
+        return {'MetricData': []}
+
+    def PutMetricData(self, call, params):
+        namespace = _required(params, 'Namespace')
+        for datum in _required(params, 'MetricData'):
+            self.scope(call)['MetricData'].append(dict(datum, Namespace=namespace))
+        return {}
+
+    def metricData(self, accountId, regionName):
+        with self._lock:
+            return list(self.scopeFor(accountId, regionName)['MetricData'])
+
+
+class ConfigBackend(ServiceBackend):
+    def create_scope(self):
+        return {'Evaluations': {}}
+
+    def putEvaluation(self, accountId, regionName, configRuleName, resourceType, resourceId, complianceType='NON_COMPLIANT'):
+        with self._lock:
+            evaluations = self.scopeFor(accountId, regionName)['Evaluations']
+            evaluations.setdefault(configRuleName, {})[(resourceType, resourceId)] = complianceType
+
+    def DescribeComplianceByConfigRule(self, call, params):
+        complianceTypes = params.get('ComplianceTypes')
+        results = []
+        for (configRuleName, evaluations) in sorted(self.scope(call)['Evaluations'].items()):
+            types = set(evaluations.values())
+            complianceType = 'NON_COMPLIANT' if 'NON_COMPLIANT' in types else 'COMPLIANT'
+            if complianceTypes and not (complianceType in complianceTypes): continue
+            results.append({'ConfigRuleName': configRuleName, 'Compliance': {'ComplianceType': complianceType}})
+        return {'ComplianceByConfigRules': results}
+
+    def GetComplianceDetailsByConfigRule(self, call, params):
+        configRuleName = _required(params, 'ConfigRuleName')
+        complianceTypes = params.get('ComplianceTypes')
+        results = []
+        for ((resourceType, resourceId), complianceType) in sorted(self.scope(call)['Evaluations'].get(configRuleName, {}).items()):
+            if complianceTypes and not (complianceType in complianceTypes): continue
+            qualifier = {'ConfigRuleName': configRuleName, 'ResourceType': resourceType, 'ResourceId': resourceId}
+            results.append({'EvaluationResultIdentifier': {'EvaluationResultQualifier': qualifier}, 'ComplianceType': complianceType})
+        return {'EvaluationResults': results}
+
+
+class KmsBackend(ServiceBackend):
+    def create_scope(self):
+        return {'Keys': {}, 'Aliases': {}}
+
+    def key(self, call, keyId):
+        scope = self.scope(call)
+        if keyId.startswith('alias/'):
+            targetKeyId = scope['Aliases'].get(keyId)
+            if not targetKeyId: raise EmulatorError('NotFoundException', "Alias {} is not found.".format(keyId))
+            keyId = targetKeyId
+        key = scope['Keys'].get(keyId.split('/')[-1])
+        if not key: raise EmulatorError('NotFoundException', "Key {} does not exist".format(keyId))
+        return key
+
+    def createKey(self, call, description, policy, tags):
+        keyId = str(uuid.uuid4())
+        metadata = {
+            'KeyId': keyId,
+            'Arn': call.arn('kms', "key/{}".format(keyId)),
+            'AWSAccountId': call.accountId,
+            'Description': description,
+            'KeyState': 'Enabled',
+            'Enabled': True,
+            'KeyManager': 'CUSTOMER',
+            'KeySpec': 'SYMMETRIC_DEFAULT',
+            'CreationDate': _now()
+        }
+        self.scope(call)['Keys'][keyId] = {'KeyMetadata': metadata, 'Policy': policy, 'Rotation': False, 'Tags': list(tags)}
+        return metadata
+
+    def createAlias(self, call, aliasName, targetKeyId):
+        aliases = self.scope(call)['Aliases']
+        if aliasName in aliases: raise EmulatorError('AlreadyExistsException', "Alias {} already exists".format(aliasName))
+        aliases[aliasName] = self.key(call, targetKeyId)['KeyMetadata']['KeyId']
+
+    def CreateKey(self, call, params):
+        return {'KeyMetadata': dict(self.createKey(call, params.get('Description', ''), params.get('Policy', '{}'), params.get('Tags', [])))}
+
+    def DescribeKey(self, call, params):
+        return {'KeyMetadata': dict(self.key(call, _required(params, 'KeyId'))['KeyMetadata'])}
+
+    def CreateAlias(self, call, params):
+        self.createAlias(call, _required(params, 'AliasName'), _required(params, 'TargetKeyId'))
+        return {}
+
+    def DeleteAlias(self, call, params):
+        aliasName = _required(params, 'AliasName')
+        if self.scope(call)['Aliases'].pop(aliasName, None) is None: raise EmulatorError('NotFoundException', "Alias {} is not found.".format(aliasName))
+        return {}
+
+    def GetKeyPolicy(self, call, params):
+        return {'Policy': self.key(call, _required(params, 'KeyId'))['Policy']}
+
+    def PutKeyPolicy(self, call, params):
+        self.key(call, _required(params, 'KeyId'))['Policy'] = _required(params, 'Policy')
+        return {}
+
+    def GetKeyRotationStatus(self, call, params):
+        return {'KeyRotationEnabled': self.key(call, _required(params, 'KeyId'))['Rotation']}
+
+    def EnableKeyRotation(self, call, params):
+        self.key(call, _required(params, 'KeyId'))['Rotation'] = True
+        return {}
+
+    def ListResourceTags(self, call, params):
+        return {'Tags': list(self.key(call, _required(params, 'KeyId'))['Tags']), 'Truncated': False}
+
+    def TagResource(self, call, params):
+        key = self.key(call, _required(params, 'KeyId'))
+        tags = {t['TagKey']: t['TagValue'] for t in key['Tags']}
+        tags.update({t['TagKey']: t['TagValue'] for t in _required(params, 'Tags')})
+        key['Tags'] = [{'TagKey': k, 'TagValue': v} for (k, v) in tags.items()]
+        return {}
+
+    def UpdateKeyDescription(self, call, params):
+        self.key(call, _required(params, 'KeyId'))['KeyMetadata']['Description'] = _required(params, 'Description')
+        return {}
+
+    def ScheduleKeyDeletion(self, call, params):
+        metadata = self.key(call, _required(params, 'KeyId'))['KeyMetadata']
+        metadata['KeyState'] = 'PendingDeletion'
+        metadata['Enabled'] = False
+        return {'KeyId': metadata['Arn'], 'KeyState': 'PendingDeletion'}
+
+
+class LogsBackend(ServiceBackend):
+    def create_scope(self):
+        return {'LogGroups': {}}
+
+    def createLogGroup(self, accountId, regionName, logGroupName, tags=None):
+        with self._lock:
+            call = EmulatedCall(self._emulator, 'logs', 'CreateLogGroup', {}, accountId, regionName, None)
+            self.scope(call)['LogGroups'][logGroupName] = {
+                'logGroupName': logGroupName,
+                'arn': call.arn('logs', "log-group:{}:*".format(logGroupName)),
+                'creationTime': int(time.time() * 1000),
+                'storedBytes': 0,
+                'Tags': dict(tags) if tags else {}
+            }
+
+    def log_group(self, call, logGroupName):
+        logGroup = self.scope(call)['LogGroups'].get(logGroupName)
+        if not logGroup: raise _not_found("The specified log group does not exist.")
+        return logGroup
+
+    def DescribeLogGroups(self, call, params):
+        prefix = params.get('logGroupNamePrefix', '')
+        logGroups = []
+        for (name, logGroup) in sorted(self.scope(call)['LogGroups'].items()):
+            if name.startswith(prefix):
+                logGroups.append({k: v for (k, v) in logGroup.items() if k != 'Tags'})
+        return {'logGroups': logGroups}
+
+    def AssociateKmsKey(self, call, params):
+        self.log_group(call, _required(params, 'logGroupName'))['kmsKeyId'] = _required(params, 'kmsKeyId')
+        return {}
+
+    def DisassociateKmsKey(self, call, params):
+        self.log_group(call, _required(params, 'logGroupName')).pop('kmsKeyId', None)
+        return {}
+
+    def ListTagsLogGroup(self, call, params):
+        return {'tags': dict(self.log_group(call, _required(params, 'logGroupName'))['Tags'])}
+
+    def TagLogGroup(self, call, params):
+        self.log_group(call, _required(params, 'logGroupName'))['Tags'].update(_required(params, 'tags'))
+        return {}
+
+
+class CloudFormationBackend(ServiceBackend):
+    def create_scope(self):
+        return {'Stacks': {}}
+
+    def stack(self, call, stackName):
+        stack = self.scope(call)['Stacks'].get(stackName)
+        if not stack: raise EmulatorError('ValidationError', "Stack with id {} does not exist".format(stackName))
+        return stack
+
+    def provision(self, call, template):
+        kms = self._emulator.service('kms')
+        physicalIds = {}
+        resources = template.get('Resources', {})
+        for (logicalId, resource) in resources.items():
+            if resource.get('Type') == 'AWS::KMS::Key':
+                props = resource.get('Properties', {})
+                tags = [{'TagKey': t['Key'], 'TagValue': t['Value']} for t in props.get('Tags', [])]
+                with kms._lock:
+                    metadata = kms.createKey(call, props.get('Description', ''), json.dumps(props.get('KeyPolicy', {})), tags)
+                physicalIds[logicalId] = metadata['KeyId']
+        for (logicalId, resource) in resources.items():
+            if resource.get('Type') == 'AWS::KMS::Alias':
+                props = resource.get('Properties', {})
+                target = props.get('TargetKeyId')
+                targetKeyId = physicalIds.get(target['Ref']) if isinstance(target, dict) else target
+                with kms._lock:
+                    kms.createAlias(call, props['AliasName'], targetKeyId)
+                physicalIds[logicalId] = props['AliasName']
+
+    def stack_dict(self, stack):
+        return {k: v for (k, v) in stack.items() if k != 'TemplateBody'}
+
+    def CreateStack(self, call, params):
+        stackName = _required(params, 'StackName')
+        stacks = self.scope(call)['Stacks']
+        if stackName in stacks: raise EmulatorError('AlreadyExistsException', "Stack [{}] already exists".format(stackName))
+        templateBody = _required(params, 'TemplateBody')
+        stackId = call.arn('cloudformation', "stack/{}/{}".format(stackName, uuid.uuid4()))
+        self.provision(call, json.loads(templateBody))
+        stacks[stackName] = {
+            'StackId': stackId,
+            'StackName': stackName,
+            'StackStatus': 'CREATE_COMPLETE',
+            'CreationTime': _now(),
+            'Capabilities': list(params.get('Capabilities', [])),
+            'Tags': list(params.get('Tags', [])),
+            'TemplateBody': templateBody
+        }
+        return {'StackId': stackId}
+
+    def UpdateStack(self, call, params):
+        stack = self.stack(call, _required(params, 'StackName'))
+        stack['TemplateBody'] = params.get('TemplateBody', stack['TemplateBody'])
+        stack['StackStatus'] = 'UPDATE_COMPLETE'
+        return {'StackId': stack['StackId']}
+
+    def DeleteStack(self, call, params):
+        self.scope(call)['Stacks'].pop(_required(params, 'StackName'), None)
+        return {}
+
+    def DescribeStacks(self, call, params):
+        stackName = params.get('StackName')
+        if stackName: return {'Stacks': [self.stack_dict(self.stack(call, stackName))]}
+        return {'Stacks': [self.stack_dict(s) for s in self.scope(call)['Stacks'].values()]}
+
+    def GetTemplate(self, call, params):
+        return {'TemplateBody': self.stack(call, _required(params, 'StackName'))['TemplateBody']}
+
+
+class S3ControlBackend(ServiceBackend):
+    def create_scope(self):
+        return {'PublicAccessBlock': {'BlockPublicAcls': False, 'IgnorePublicAcls': False, 'BlockPublicPolicy': False, 'RestrictPublicBuckets': False}}
+
+    def GetPublicAccessBlock(self, call, params):
+        return {'PublicAccessBlockConfiguration': dict(self.scope(call)['PublicAccessBlock'])}
+
+    def PutPublicAccessBlock(self, call, params):
+        self.scope(call)['PublicAccessBlock'] = dict(_required(params, 'PublicAccessBlockConfiguration'))
+        return {}
+
+
+class TaggingBackend(ServiceBackend):
+    def create_scope(self):
+        return {'Tags': {}}
+
+    def TagResources(self, call, params):
+        tags = self.scope(call)['Tags']
+        for arn in _required(params, 'ResourceARNList'):
+            tags.setdefault(arn, {}).update(_required(params, 'Tags'))
+        return {'FailedResourcesMap': {}}
+
+
+_BackendClasses = {
+    'sts': StsBackend,
+    'organizations': OrganizationsBackend,
+    'lambda': LambdaBackend,
+    'sqs': SqsBackend,
+    'monitoring': CloudWatchBackend,
+    'config': ConfigBackend,
+    'kms': KmsBackend,
+    'logs': LogsBackend,
+    'cloudformation': CloudFormationBackend,
+    's3-control': S3ControlBackend,
+    'tagging': TaggingBackend
+}
+
+_ServiceAliases = {
+    'cloudwatch': 'monitoring',
+    's3control': 's3-control',
+    'resourcegroupstaggingapi': 'tagging'
+}
+
+def _service_key(serviceName):
+    return _ServiceAliases.get(serviceName, serviceName)
+
+class _FaultRule:
+    def __init__(self, latencySecs=0.0, jitterSecs=0.0, throttleFraction=0.0, throttleCount=None):
+        self.latencySecs = latencySecs
+        self.jitterSecs = jitterSecs
+        self.throttleFraction = throttleFraction
+        self.throttleCount = throttleCount
+
+
+class AwsEmulator:
+    def __init__(self, managementAccountId='111111111111', regionName='ap-southeast-2', seed=0, sleep=time.sleep):
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+        self._sleep = sleep
+        self._accounts = {}
+        self._keys = {}
+        self._faults = {}
+        self._counters = {}
+        self._backends = {}
+        self.managementAccountId = managementAccountId
+        self.regionName = regionName
+        self.addAccount(managementAccountId, 'management')
+
+    def addAccount(self, accountId, accountName=None, email=None, status='ACTIVE'):
+        with self._lock:
+            name = accountName if accountName else "account-{}".format(accountId)
+            self._accounts[accountId] = {'Name': name, 'Email': email if email else "{}@emulated.local".format(name), 'Status': status, 'JoinedTimestamp': _now()}
+
+    def hasAccount(self, accountId):
+        return accountId in self._accounts
+
+    def getAccount(self, accountId):
+        return self._accounts.get(accountId)
+
+    def accountIds(self):
+        with self._lock:
+            return sorted(self._accounts.keys())
+
+    def issueKey(self, identity):
+        accessKey = "ASIAEMU{}".format(uuid.uuid4().hex[0:13].upper())
+        with self._lock:
+            self._keys[accessKey] = identity
+        return accessKey
+
+    def identityForKey(self, accessKey):
+        identity = self._keys.get(accessKey)
+        if not identity: raise EmulatorError('InvalidClientTokenId', "The security token included in the request is invalid.", 403)
+        return identity
+
+    def service(self, serviceName) -> ServiceBackend:
+        serviceKey = _service_key(serviceName)
+        with self._lock:
+            backend = self._backends.get(serviceKey)
+            if backend is None:
+                backendClass = _BackendClasses.get(serviceKey)
+                if not backendClass: return None
+                backend = backendClass(self)
+                self._backends[serviceKey] = backend
+            return backend
+
+    def registerFunction(self, functionName, handler, accountId=None, regionName=None):
+        self.service('lambda').registerHandler(accountId if accountId else self.managementAccountId, regionName if regionName else self.regionName, functionName, handler)
+
+    def registerFunctionModule(self, functionName, modulePath, accountId=None, regionName=None):
+        spec = importlib.util.spec_from_file_location("emulated_{}".format(functionName.replace('-', '_')), modulePath)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        self.registerFunction(functionName, module.lambda_handler, accountId, regionName)
+        return module
+
+    def injectFaults(self, serviceName, operationName=AnyOperation, latencySecs=0.0, jitterSecs=0.0, throttleFraction=0.0, throttleCount=None):
+        with self._lock:
+            self._faults[(_service_key(serviceName), operationName)] = _FaultRule(latencySecs, jitterSecs, throttleFraction, throttleCount)
+
+    def clearFaults(self):
+        with self._lock:
+            self._faults.clear()
+
+    def getCounters(self) -> dict:
+        with self._lock:
+            return {k: dict(v) for (k, v) in self._counters.items()}
+
+    def count(self, serviceName, operationName, counterName):
+        key = "{}:{}".format(serviceName, operationName)
+        counters = self._counters.setdefault(key, {'Calls': 0, 'Throttles': 0, 'Errors': 0})
+        counters[counterName] += 1
+
+    def next_fault(self, serviceKey, operationName):
+        with self._lock:
+            rule = self._faults.get((serviceKey, operationName))
+            if not rule: rule = self._faults.get((serviceKey, AnyOperation))
+            if not rule: return (0.0, False)
+            latencySecs = rule.latencySecs + (self._random.uniform(0, rule.jitterSecs) if rule.jitterSecs else 0.0)
+            throttle = False
+            if rule.throttleCount is not None:
+                if rule.throttleCount > 0:
+                    rule.throttleCount -= 1
+                    throttle = True
+            elif rule.throttleFraction > 0:
+                throttle = self._random.random() < rule.throttleFraction
+            return (latencySecs, throttle)
+
+    def createSession(self, accountId=None, regionName=None, roleName='EmulatedAdmin'):
+        import boto3
+        targetAccountId = accountId if accountId else self.managementAccountId
+        if not self.hasAccount(targetAccountId): self.addAccount(targetAccountId)
+        identity = {'UserId': 'AIDAEMULATED', 'Account': targetAccountId, 'Arn': "arn:aws:iam::{}:role/{}".format(targetAccountId, roleName)}
+        accessKey = self.issueKey(identity)
+        return boto3.Session(region_name=regionName if regionName else self.regionName, aws_access_key_id=accessKey, aws_secret_access_key='emulated')
+
+    def createProfile(self, accountId=None, regionName=None, roleName='EmulatedAdmin'):
+        from lib.rdq import Profile
+        return Profile(self.createSession(accountId, regionName, roleName), roleName=roleName, emulator=self)
+
+    def respond(self, serviceName, operationName, parsed :dict, statusCode):
+        import botocore.awsrequest
+        parsed.setdefault('ResponseMetadata', {})
+        parsed['ResponseMetadata'].update({'RequestId': str(uuid.uuid4()), 'HTTPStatusCode': statusCode, 'HTTPHeaders': {}})
+        body = b'' if statusCode < 300 else json.dumps(parsed.get('Error', {})).encode('utf-8')
+        url = "https://{}.emulated.local/{}".format(serviceName, operationName)
+        return (botocore.awsrequest.AWSResponse(url, statusCode, {}, _RawBody(body)), parsed)
+
+    def dispatch(self, call :EmulatedCall):
+        backend = self.service(call.serviceName)
+        if not backend:
+            error = EmulatorError('UnsupportedOperation', "Service {} is not emulated".format(call.serviceName))
+        else:
+            try:
+                return self.respond(call.serviceName, call.operationName, backend.handle(call), 200)
+            except EmulatorError as e:
+                error = e
+        with self._lock:
+            self.count(call.serviceName, call.operationName, 'Errors')
+        return self.respond(call.serviceName, call.operationName, {'Error': {'Code': error.code, 'Message': error.message}}, error.statusCode)
+
+    def handle_call(self, client, profile, model, context, request_signer):
+        from botocore.hooks import first_non_none_response
+        serviceName = model.service_model.endpoint_prefix
+        serviceKey = _service_key(serviceName)
+        serviceId = model.service_model.service_id.hyphenize()
+        operationName = model.name
+        params = context.get('rdqEmulatorParams', {})
+        credentials = request_signer._credentials.get_frozen_credentials() if request_signer and request_signer._credentials else None
+        accessKey = credentials.access_key if credentials else None
+        accountId = profile.accountId if profile.accountId else self._keys.get(accessKey, {}).get('Account', self.managementAccountId)
+        call = EmulatedCall(self, serviceKey, operationName, params, accountId, client.meta.region_name, accessKey)
+        attempts = 0
+        while True:
+            attempts += 1
+            client.meta.events.emit("before-send.{}.{}".format(serviceId, operationName), request=None)
+            (latencySecs, throttle) = self.next_fault(serviceKey, operationName)
+            if latencySecs > 0: self._sleep(latencySecs)
+            with self._lock:
+                self.count(serviceKey, operationName, 'Calls')
+                if throttle: self.count(serviceKey, operationName, 'Throttles')
+            if throttle:
+                response = self.respond(serviceName, operationName, {'Error': {'Code': 'ThrottlingException', 'Message': 'Rate exceeded'}}, 400)
+            else:
+                response = self.dispatch(call)
+            responses = client.meta.events.emit(
+                "needs-retry.{}.{}".format(serviceId, operationName),
+                response=response,
+                endpoint=None,
+                operation=model,
+                attempts=attempts,
+                caught_exception=None,
+                request_dict={'context': context}
+            )
+            waitSecs = first_non_none_response(responses)
+            if waitSecs is None: break
+            self._sleep(waitSecs)
+        response[1]['ResponseMetadata']['RetryAttempts'] = attempts - 1
+        return response
+
+    def attach(self, client, profile):
+        def before_parameter_build(params=None, context=None, **kwargs):
+            if context is not None: context['rdqEmulatorParams'] = dict(params) if params else {}
+        def before_call(model=None, context=None, request_signer=None, **kwargs):
+            return self.handle_call(client, profile, model, context, request_signer)
+        client.meta.events.register('before-parameter-build', before_parameter_build)
+        client.meta.events.register_last('before-call', before_call)
+
+
+class _RawBody:
+    def __init__(self, body :bytes):
+        self._body = body
+
+    def stream(self, **kwargs):
+        yield self._body
@@ -0,0 +1,226 @@
+import os
+import sys
+import json
+import time
+import logging
+import threading
+
+from lib.base.trace import getTracer
+
+_LatencyBucketsMs = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000]
+
+FormatLog = 'log'
+FormatEmf = 'emf'
+FormatNone = 'none'
+
+def _body_size(body):
+    if body is None: return 0
+    if isinstance(body, (bytes, bytearray, str)): return len(body)
+    if isinstance(body, dict): return len(json.dumps(body))
+    return 0
+
+def _bucket_index(latencyMs):
+    for i in range(len(_LatencyBucketsMs)):
+        if latencyMs <= _LatencyBucketsMs[i]: return i
+    return len(_LatencyBucketsMs)
+
+class ApiStats:
+    def __init__(self, serviceName, operationName):
+        self.serviceName = serviceName
+        self.operationName = operationName
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.totalMs = 0.0
+        self.maxMs = 0.0
+        self.requestBytes = 0
+        self.responseBytes = 0
+        self.errorCodes = {}
+        self.histogram = [0] * (len(_LatencyBucketsMs) + 1)
+
+    def record(self, latencyMs, retries, requestBytes, responseBytes, errorCode):
+        self.calls += 1
+        self.retries += retries
+        self.totalMs += latencyMs
+        self.maxMs = max(self.maxMs, latencyMs)
+        self.requestBytes += requestBytes
+        self.responseBytes += responseBytes
+        self.histogram[_bucket_index(latencyMs)] += 1
+        if errorCode:
+            self.errors += 1
+            self.errorCodes[errorCode] = self.errorCodes.get(errorCode, 0) + 1
+
+    def histogramDict(self):
+        buckets = {}
+        for i in range(len(self.histogram)):
+            count = self.histogram[i]
+            if count == 0: continue
+            label = "le{}".format(_LatencyBucketsMs[i]) if i < len(_LatencyBucketsMs) else "gt{}".format(_LatencyBucketsMs[-1])
+            buckets[label] = count
+        return buckets
+
+    def toDict(self):
+        return {
+            'Calls': self.calls,
+            'Errors': self.errors,
+            'Retries': self.retries,
+            'AvgMs': round(self.totalMs / self.calls, 1) if self.calls else 0,
+            'MaxMs': round(self.maxMs, 1),
+            'RequestBytes': self.requestBytes,
+            'ResponseBytes': self.responseBytes,
+            'ErrorCodes': dict(self.errorCodes),
+            'LatencyMs': self.histogramDict()
+        }
+
+
+# Streaming bodies (e.g. lambda Invoke Payload) must be left unread for the caller, so their size comes from the header
+def _response_bytes(http_response, model):
+    if http_response is None: return 0
+    if model.has_streaming_output:
+        contentLength = http_response.headers.get('Content-Length')
+        return int(contentLength) if contentLength and contentLength.isdigit() else 0
+    content = http_response.content
+    return len(content) if content else 0
+
+
+class ApiStatsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def record(self, serviceName, operationName, latencyMs, retries, requestBytes, responseBytes, errorCode=None):
+        key = "{}:{}".format(serviceName, operationName)
+        with self._lock:
+            stats = self._stats.get(key)
+            if not stats:
+                stats = ApiStats(serviceName, operationName)
+                self._stats[key] = stats
+            stats.record(latencyMs, retries, requestBytes, responseBytes, errorCode)
+
+    def isEmpty(self):
+        with self._lock:
+            return len(self._stats) == 0
+
+    def reset(self):
+        with self._lock:
+            self._stats = {}
+
+    def toDict(self) -> dict:
+        with self._lock:
+            return {key: self._stats[key].toDict() for key in sorted(self._stats)}
+
+    def toEmfDocuments(self, namespace, dimensionMap :dict):
+        with self._lock:
+            statsList = list(self._stats.values())
+        timestampMs = int(time.time() * 1000)
+        dimensionNames = list(dimensionMap.keys()) + ['Service', 'Operation']
+        docs = []
+        for stats in statsList:
+            values = []
+            counts = []
+            for i in range(len(stats.histogram)):
+                if stats.histogram[i] == 0: continue
+                values.append(_LatencyBucketsMs[min(i, len(_LatencyBucketsMs) - 1)])
+                counts.append(stats.histogram[i])
+            doc = {
+                '_aws': {
+                    'Timestamp': timestampMs,
+                    'CloudWatchMetrics': [{
+                        'Namespace': namespace,
+                        'Dimensions': [dimensionNames],
+                        'Metrics': [
+                            {'Name': 'ApiLatency', 'Unit': 'Milliseconds'},
+                            {'Name': 'ApiCalls', 'Unit': 'Count'},
+                            {'Name': 'ApiErrors', 'Unit': 'Count'},
+                            {'Name': 'ApiRetries', 'Unit': 'Count'}
+                        ]
+                    }]
+                },
+                'Service': stats.serviceName,
+                'Operation': stats.operationName,
+                'ApiLatency': {'Values': values, 'Counts': counts},
+                'ApiCalls': stats.calls,
+                'ApiErrors': stats.errors,
+                'ApiRetries': stats.retries
+            }
+            doc.update(dimensionMap)
+            docs.append(doc)
+        return docs
+
+    def dump(self, format=FormatLog, namespace=None, dimensionMap=None, stream=None, reset=True):
+        if format == FormatNone or self.isEmpty():
+            if reset: self.reset()
+            return
+        if format == FormatEmf and namespace:
+            out = stream if stream else sys.stdout
+            docs = self.toEmfDocuments(namespace, dimensionMap if dimensionMap else {})
+            out.write("\n".join(json.dumps(doc) for doc in docs) + "\n")
+            out.flush()
+        else:
+            report = {'Synopsis': "ApiStats", 'Operations': self.toDict()}
+            if dimensionMap: report['Context'] = dimensionMap
+            logging.info(report)
+        if reset: self.reset()
+
+    def before_call(self, serviceName, params=None, context=None, **kwargs):
+        if context is None: return None
+        context['rdqApiStartedAt'] = time.perf_counter()
+        context['rdqApiRequestBytes'] = _body_size(params.get('body') if params else None)
+        context['rdqSpan'] = getTracer().startSpan("{}.{}".format(serviceName, context.get('rdqApiOperation', 'Unknown')))
+        return None
+
+    def after_call(self, serviceName, http_response=None, parsed=None, model=None, context=None, **kwargs):
+        if (context is None) or (model is None): return None
+        startedAt = context.get('rdqApiStartedAt')
+        if startedAt is None: return None
+        latencyMs = (time.perf_counter() - startedAt) * 1000.0
+        metadata = parsed.get('ResponseMetadata', {}) if parsed else {}
+        errorCode = parsed.get('Error', {}).get('Code') if parsed else None
+        responseBytes = _response_bytes(http_response, model)
+        self.record(serviceName, model.name, latencyMs, metadata.get('RetryAttempts', 0), context.get('rdqApiRequestBytes', 0), responseBytes, errorCode)
+        span = context.pop('rdqSpan', None)
+        if span: span.setAttribute('retries', metadata.get('RetryAttempts', 0))
+        getTracer().endSpan(span, errorCode)
+        return None
+
+    def after_call_error(self, serviceName, exception=None, context=None, **kwargs):
+        if context is None: return None
+        startedAt = context.get('rdqApiStartedAt')
+        if startedAt is None: return None
+        latencyMs = (time.perf_counter() - startedAt) * 1000.0
+        operationName = context.get('rdqApiOperation', 'Unknown')
+        self.record(serviceName, operationName, latencyMs, 0, context.get('rdqApiRequestBytes', 0), 0, type(exception).__name__)
+        getTracer().endSpan(context.pop('rdqSpan', None), type(exception).__name__)
+        return None
+
+    def attach(self, client):
+        serviceName = client.meta.service_model.endpoint_prefix
+        def before_call(model=None, context=None, **kwargs):
+            if (context is not None) and model: context['rdqApiOperation'] = model.name
+            return self.before_call(serviceName, context=context, **kwargs)
+        def after_call(**kwargs):
+            return self.after_call(serviceName, **kwargs)
+        def after_call_error(**kwargs):
+            return self.after_call_error(serviceName, **kwargs)
+        client.meta.events.register('before-call', before_call)
+        client.meta.events.register('after-call', after_call)
+        client.meta.events.register('after-call-error', after_call_error)
+
+
+_apiStatsRegistry = ApiStatsRegistry()
+
+def getApiStatsRegistry() -> ApiStatsRegistry:
+    return _apiStatsRegistry
+
+def apiStatsFormat(apiStatsVariable='RDQAPISTATS', defaultFormat=FormatLog):
+    if not apiStatsVariable: return defaultFormat
+    value = os.environ.get(apiStatsVariable)
+    if not value: return defaultFormat
+    return value.lower()
+
+def apiStatsNamespace(namespaceVariable='RDQAPISTATSNAMESPACE'):
+    if not namespaceVariable: return None
+    return os.environ.get(namespaceVariable)
+
+def dumpApiStats(dimensionMap=None):
+    _apiStatsRegistry.dump(apiStatsFormat(), apiStatsNamespace(), dimensionMap)
@@ -155,6 +155,16 @@ def allowDescribeAccount(masterAccountId, organizationId, sid="DescribeAccount")
         'Resource': "arn:aws:organizations::{}:account/{}/*".format(masterAccountId, organizationId)
     }
 
+def allowListAccounts(sid="ListAccounts"):
+    return {
+        'Sid': sid,
+        'Effect': "Allow",
+        'Action': [
+            "organizations:ListAccounts"
+        ],
+        'Resource': "*"
+    }
+
 def allowCMKForServiceProducer(profile, storageServiceNamespace, producerServicePrincipal):
     sid = "Producer service " + producerServicePrincipal + " for " + storageServiceNamespace
     conditionKey = "kms:EncryptionContext:aws:{}:arn".format(storageServiceNamespace)
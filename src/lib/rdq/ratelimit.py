@@ -0,0 +1,151 @@
+import os
+import json
+import time
+import logging
+import threading
+
+from lib.rdq.base import isThrottleError, responseError
+
+class TokenBucket:
+    def __init__(self, rate, burst, minRate=None, increasePerSec=None, decreaseFactor=0.5, cooldownSecs=1.0):
+        self._maxRate = float(rate)
+        self._rate = float(rate)
+        self._burst = float(max(1, burst))
+        self._minRate = float(minRate) if minRate else self._maxRate / 10
+        self._increasePerSec = float(increasePerSec) if increasePerSec else self._maxRate / 20
+        self._decreaseFactor = decreaseFactor
+        self._cooldownSecs = cooldownSecs
+        self._tokens = self._burst
+        self._lock = threading.Lock()
+        now = time.time()
+        self._refilledAt = now
+        self._adjustedAt = now
+        self._decreasedAt = 0
+
+    @property
+    def rate(self): return self._rate
+
+    def refill(self, now):
+        elapsedSecs = now - self._refilledAt
+        self._tokens = min(self._burst, self._tokens + (elapsedSecs * self._rate))
+        self._refilledAt = now
+
+    def acquire(self):
+        waitedSecs = 0.0
+        while True:
+            with self._lock:
+                now = time.time()
+                self.refill(now)
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return waitedSecs
+                waitSecs = (1.0 - self._tokens) / self._rate
+            time.sleep(waitSecs)
+            waitedSecs += waitSecs
+
+    def onThrottle(self):
+        with self._lock:
+            now = time.time()
+            self.refill(now)
+            self._adjustedAt = now
+            if (now - self._decreasedAt) < self._cooldownSecs: return
+            self._rate = max(self._minRate, self._rate * self._decreaseFactor)
+            self._tokens = min(self._tokens, 0.0)
+            self._decreasedAt = now
+
+    def onSuccess(self):
+        with self._lock:
+            now = time.time()
+            if self._rate < self._maxRate:
+                self.refill(now)
+                self._rate = min(self._maxRate, self._rate + (self._increasePerSec * (now - self._adjustedAt)))
+            self._adjustedAt = now
+
+
+class RateLimiter:
+    def __init__(self, rules=None):
+        self._lock = threading.Lock()
+        self._rules = {}
+        self._buckets = {}
+        self._counters = {'Waits': 0, 'WaitSecs': 0.0, 'Throttles': 0}
+        if rules:
+            self.configure(rules)
+
+    def configure(self, rules :dict):
+        with self._lock:
+            self._rules = dict(rules)
+            self._buckets = {}
+
+    def get_rule(self, serviceName, operationName):
+        rule = self._rules.get("{}:{}".format(serviceName, operationName))
+        if rule: return rule
+        return self._rules.get("{}:*".format(serviceName))
+
+    def get_bucket(self, serviceName, operationName, accountId, regionName) -> TokenBucket:
+        key = (serviceName, operationName, accountId, regionName)
+        exBucket = self._buckets.get(key)
+        if exBucket: return exBucket
+        with self._lock:
+            exBucket = self._buckets.get(key)
+            if exBucket: return exBucket
+            rule = self.get_rule(serviceName, operationName)
+            if not rule: return None
+            rate = rule['Rate']
+            newBucket = TokenBucket(rate, rule.get('Burst', rate), rule.get('MinRate'), rule.get('IncreasePerSec'))
+            self._buckets[key] = newBucket
+            return newBucket
+
+    def getCounters(self) -> dict:
+        with self._lock:
+            return dict(self._counters)
+
+    def before_send(self, serviceName, regionName, profile, event_name=None, **kwargs):
+        operationName = event_name.split('.')[-1] if event_name else None
+        bucket = self.get_bucket(serviceName, operationName, profile.accountId, regionName)
+        if not bucket: return None
+        waitedSecs = bucket.acquire()
+        if waitedSecs > 0:
+            with self._lock:
+                self._counters['Waits'] += 1
+                self._counters['WaitSecs'] += waitedSecs
+        return None
+
+    def after_response(self, serviceName, regionName, profile, response=None, operation=None, **kwargs):
+        if not operation: return None
+        bucket = self.get_bucket(serviceName, operation.name, profile.accountId, regionName)
+        if not bucket: return None
+        (errorCode, statusCode) = responseError(response)
+        if isThrottleError(serviceName, errorCode):
+            bucket.onThrottle()
+            with self._lock:
+                self._counters['Throttles'] += 1
+            logging.info("Reduced client request rate after throttling | Service: %s | Operation: %s | Rate: %.2f", serviceName, operation.name, bucket.rate)
+        elif response and (errorCode is None):
+            bucket.onSuccess()
+        return None
+
+    def attach(self, client, profile):
+        serviceName = client.meta.service_model.endpoint_prefix
+        regionName = client.meta.region_name
+        def before_send(**kwargs):
+            return self.before_send(serviceName, regionName, profile, **kwargs)
+        def after_response(**kwargs):
+            return self.after_response(serviceName, regionName, profile, **kwargs)
+        client.meta.events.register('before-send', before_send)
+        client.meta.events.register('needs-retry', after_response)
+
+
+_rateLimiter = RateLimiter()
+
+def getRateLimiter() -> RateLimiter:
+    return _rateLimiter
+
+def initRateLimits(rateLimitVariable='RDQRATELIMITS'):
+    rawRules = os.environ.get(rateLimitVariable) if rateLimitVariable else None
+    if not rawRules: return
+    try:
+        rules = json.loads(rawRules)
+    except ValueError as e:
+        logging.warning("Rate limits in environment variable %s are malformed; requests will not be rate limited | Detail: %s", rateLimitVariable, e)
+        return
+    _rateLimiter.configure(rules)
@@ -0,0 +1,193 @@
+import os
+import io
+import gzip
+import json
+import time
+import base64
+import logging
+import datetime
+import threading
+
+from lib.base import RK
+from lib.rdq import getTrafficRecorder, setTrafficRecorder
+from lib.rdq.emulator import AwsEmulator, EmulatedCall, _service_key
+
+Redacted = '**REDACTED**'
+
+_RedactedKeys = set(['AccessKeyId', 'SecretAccessKey', 'SessionToken', 'Password', 'NewPassword', 'OldPassword', 'SecretString', 'SecretBinary', 'PrivateKey', 'Plaintext'])
+
+def encodeValue(value, redactKeys=_RedactedKeys):
+    if isinstance(value, dict):
+        return {k: (Redacted if k in redactKeys else encodeValue(v, redactKeys)) for (k, v) in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [encodeValue(v, redactKeys) for v in value]
+    if isinstance(value, datetime.datetime):
+        return {'$datetime': value.isoformat()}
+    if isinstance(value, (bytes, bytearray)):
+        return {'$bytes': base64.b64encode(value).decode('ascii')}
+    if (value is None) or isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)
+
+def decodeValue(value):
+    if isinstance(value, dict):
+        if len(value) == 1:
+            if '$datetime' in value: return datetime.datetime.fromisoformat(value['$datetime'])
+            if '$bytes' in value: return base64.b64decode(value['$bytes'])
+        return {k: decodeValue(v) for (k, v) in value.items()}
+    if isinstance(value, list):
+        return [decodeValue(v) for v in value]
+    return value
+
+def requestKey(serviceName, operationName, encodedParams):
+    return "{}:{}:{}".format(serviceName, operationName, json.dumps(encodedParams, sort_keys=True))
+
+def loadRecording(path) -> list:
+    records = []
+    with gzip.open(path, 'rt') as f:
+        for line in f:
+            if line.strip(): records.append(json.loads(line))
+    return records
+
+
+class TrafficRecorder:
+    def __init__(self, path, redactKeys=None):
+        self._path = path
+        self._redactKeys = _RedactedKeys.union(redactKeys) if redactKeys else _RedactedKeys
+        self._lock = threading.Lock()
+        self._pending = []
+        self.recordCount = 0
+
+    @property
+    def path(self): return self._path
+
+    def read_payload(self, parsed):
+        import botocore.response
+        payload = parsed.get('Payload')
+        if not isinstance(payload, botocore.response.StreamingBody): return
+        content = payload.read()
+        parsed['Payload'] = botocore.response.StreamingBody(io.BytesIO(content), len(content))
+        return content
+
+    def record(self, serviceName, regionName, profile, http_response=None, parsed=None, model=None, context=None, **kwargs):
+        if (context is None) or (model is None) or (parsed is None): return None
+        startedAt = context.pop('rdqRecordStartedAt', None)
+        latencyMs = (time.perf_counter() - startedAt) * 1000.0 if startedAt else 0.0
+        content = self.read_payload(parsed)
+        response = {k: v for (k, v) in parsed.items() if k != 'ResponseMetadata'}
+        if not (content is None): response['Payload'] = content
+        metadata = parsed.get('ResponseMetadata', {})
+        record = {
+            'Service': serviceName,
+            'Operation': model.name,
+            'AccountId': profile.accountId,
+            'Region': regionName,
+            'Params': context.pop('rdqRecordParams', {}),
+            'Status': http_response.status_code if http_response is not None else metadata.get('HTTPStatusCode', 200),
+            'Retries': metadata.get('RetryAttempts', 0),
+            'LatencyMs': round(latencyMs, 3),
+            'Response': encodeValue(response, self._redactKeys)
+        }
+        with self._lock:
+            self._pending.append(record)
+            self.recordCount += 1
+        return None
+
+    def flush(self):
+        with self._lock:
+            pending = self._pending
+            self._pending = []
+        if not pending: return 0
+        folder = os.path.dirname(self._path)
+        if folder: os.makedirs(folder, exist_ok=True)
+        lines = "".join([json.dumps(record, separators=(',', ':')) + "\n" for record in pending])
+        with gzip.open(self._path, 'at') as f:
+            f.write(lines)
+        return len(pending)
+
+    def attach(self, client, profile):
+        serviceName = _service_key(client.meta.service_model.endpoint_prefix)
+        regionName = client.meta.region_name
+        redactKeys = self._redactKeys
+        def before_parameter_build(params=None, context=None, **kwargs):
+            if context is not None: context['rdqRecordParams'] = encodeValue(params if params else {}, redactKeys)
+        def before_call(context=None, **kwargs):
+            if context is not None: context['rdqRecordStartedAt'] = time.perf_counter()
+        def after_call(**kwargs):
+            return self.record(serviceName, regionName, profile, **kwargs)
+        client.meta.events.register('before-parameter-build', before_parameter_build)
+        client.meta.events.register('before-call', before_call)
+        client.meta.events.register('after-call', after_call)
+
+
+class TrafficReplayer(AwsEmulator):
+    def __init__(self, records :list, latencyScale=1.0, redactKeys=None, **kwargs):
+        AwsEmulator.__init__(self, **kwargs)
+        self._latencyScale = latencyScale
+        self._redactKeys = _RedactedKeys.union(redactKeys) if redactKeys else _RedactedKeys
+        self._exact = {}
+        self._ordered = {}
+        self._cursors = {}
+        self._consumed = set()
+        self.missing = []
+        for (position, record) in enumerate(records):
+            entry = (position, record)
+            self._exact.setdefault(requestKey(record['Service'], record['Operation'], record['Params']), []).append(entry)
+            self._ordered.setdefault((record['Service'], record['Operation']), []).append(entry)
+
+    # Each recorded response is replayed at most once, whether it was matched by parameters or by order
+    def next_from(self, key, entries):
+        cursor = self._cursors.get(key, 0)
+        while (cursor < len(entries)) and (entries[cursor][0] in self._consumed):
+            cursor += 1
+        self._cursors[key] = cursor
+        if cursor >= len(entries): return None
+        (position, record) = entries[cursor]
+        self._consumed.add(position)
+        return record
+
+    def next_record(self, call :EmulatedCall):
+        exactKey = requestKey(call.serviceName, call.operationName, encodeValue(call.params, self._redactKeys))
+        orderKey = (call.serviceName, call.operationName)
+        with self._lock:
+            record = self.next_from(exactKey, self._exact.get(exactKey, []))
+            if record: return record
+            record = self.next_from(orderKey, self._ordered.get(orderKey, []))
+            if record: return record
+            self.missing.append("{}:{}".format(call.serviceName, call.operationName))
+            return None
+
+    def dispatch(self, call :EmulatedCall):
+        import botocore.response
+        record = self.next_record(call)
+        if not record:
+            with self._lock:
+                self.count(call.serviceName, call.operationName, 'Errors')
+            message = "No recorded response for {}:{}".format(call.serviceName, call.operationName)
+            return self.respond(call.serviceName, call.operationName, {'Error': {'Code': 'ReplayMissing', 'Message': message}}, 400)
+        latencySecs = record['LatencyMs'] * self._latencyScale / 1000.0
+        if latencySecs > 0: self._sleep(latencySecs)
+        parsed = decodeValue(record['Response'])
+        payload = parsed.get('Payload')
+        if isinstance(payload, bytes):
+            parsed['Payload'] = botocore.response.StreamingBody(io.BytesIO(payload), len(payload))
+        return self.respond(call.serviceName, call.operationName, parsed, record['Status'])
+
+def createReplayer(path, latencyScale=1.0, **kwargs) -> TrafficReplayer:
+    return TrafficReplayer(loadRecording(path), latencyScale, **kwargs)
+
+def initRecording(recordVariable='RDQRECORD'):
+    path = os.environ.get(recordVariable) if recordVariable else None
+    if not path or path.lower() == 'none': return
+    if getTrafficRecorder(): return
+    setTrafficRecorder(TrafficRecorder(path))
+
+def flushRecording():
+    recorder = getTrafficRecorder()
+    if not recorder: return
+    try:
+        count = recorder.flush()
+        if count:
+            logging.info({RK.Synopsis: 'TrafficRecorded', 'Records': count, 'Path': recorder.path})
+    except OSError as e:
+        logging.warning({RK.Synopsis: 'TrafficNotRecorded', RK.Cause: str(e), 'Path': recorder.path})
@@ -1,9 +1,13 @@
+import time
+import threading
 import botocore
 
 from lib.base import Tags
 from lib.rdq import RdqError
 from lib.rdq.base import ServiceUtils
 
+_MaxMetricDataPerCall = 1000
+
 def _create_dimlist(dimensionMap: dict):
     dimlist = []
     for key in dimensionMap:
@@ -14,12 +18,20 @@ def _create_dimlist(dimensionMap: dict):
         dimlist.append(item)
     return dimlist
 
+def _dimension_key(dimensionMap: dict):
+    return tuple(sorted(dimensionMap.items()))
+
 class CwmClient:
-    def __init__(self, profile, maxAttempts=10):
+    def __init__(self, profile, maxAttempts=10, maxPendingData=_MaxMetricDataPerCall, maxPendingSecs=30):
         service = 'cloudwatch'
         self._profile = profile
         self._client = profile.getClient(service)
         self._utils = ServiceUtils(profile, service, maxAttempts)
+        self._maxPendingData = min(maxPendingData, _MaxMetricDataPerCall)
+        self._maxPendingSecs = maxPendingSecs
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._pendingSince = None
 
     def put_metric_data(self, namespace, metricDataList :list):
         op = 'put_metric_data'
@@ -34,6 +46,22 @@ class CwmClient:
     def put_metric_datum(self, namespace, metric :dict):
         self.put_metric_data(namespace, [metric])
 
+    def put_metric_data_chunked(self, namespace, metricDataList :list):
+        for i in range(0, len(metricDataList), _MaxMetricDataPerCall):
+            self.put_metric_data(namespace, metricDataList[i:i + _MaxMetricDataPerCall])
+
+    def take_pending(self):
+        with self._lock:
+            pending = self._pending
+            self._pending = {}
+            self._pendingSince = None
+        return pending
+
+    def is_flush_due(self):
+        if len(self._pending) >= self._maxPendingData: return True
+        if self._pendingSince is None: return False
+        return (time.time() - self._pendingSince) >= self._maxPendingSecs
+
     def putCount(self, namespace, metricName, dimensionMap :dict, value=1.0):
         metric = {}
         metric['MetricName'] = metricName
@@ -42,3 +70,38 @@ class CwmClient:
         metric['Unit'] = 'Count'
         self.put_metric_datum(namespace, metric)
 
+    def addCount(self, namespace, metricName, dimensionMap :dict, value=1.0):
+        key = (namespace, metricName, _dimension_key(dimensionMap))
+        with self._lock:
+            exStats = self._pending.get(key)
+            if exStats:
+                exStats['SampleCount'] = exStats['SampleCount'] + 1
+                exStats['Sum'] = exStats['Sum'] + value
+                exStats['Minimum'] = min(exStats['Minimum'], value)
+                exStats['Maximum'] = max(exStats['Maximum'], value)
+            else:
+                self._pending[key] = {'SampleCount': 1, 'Sum': value, 'Minimum': value, 'Maximum': value}
+                if self._pendingSince is None:
+                    self._pendingSince = time.time()
+            flushDue = self.is_flush_due()
+        if flushDue:
+            self.flushCounts()
+
+    def pendingCount(self):
+        with self._lock:
+            return len(self._pending)
+
+    def flushCounts(self):
+        pending = self.take_pending()
+        if len(pending) == 0: return 0
+        dataByNamespace = {}
+        for (namespace, metricName, dimensionKey) in pending:
+            metric = {}
+            metric['MetricName'] = metricName
+            metric['Dimensions'] = _create_dimlist(dict(dimensionKey))
+            metric['StatisticValues'] = pending[(namespace, metricName, dimensionKey)]
+            metric['Unit'] = 'Count'
+            dataByNamespace.setdefault(namespace, []).append(metric)
+        for namespace in dataByNamespace:
+            self.put_metric_data_chunked(namespace, dataByNamespace[namespace])
+        return len(pending)
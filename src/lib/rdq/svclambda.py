@@ -74,6 +74,7 @@ class LambdaClient:
                     Timeout=rq['Timeout'],
                     MemorySize=rq['MemorySize'],
                     Environment=rq['Environment'],
+                    Layers=rq.get('Layers', []),
                     Code={
                         'ZipFile': codeZip
                     },
@@ -100,7 +101,8 @@ class LambdaClient:
                     Description=rq['Description'],
                     Timeout=rq['Timeout'],
                     MemorySize=rq['MemorySize'],
-                    Environment=rq['Environment']
+                    Environment=rq['Environment'],
+                    Layers=rq.get('Layers', [])
                 )
                 return response
             except botocore.exceptions.ClientError as e:
@@ -190,6 +192,50 @@ class LambdaClient:
             if self._utils.is_resource_not_found(e): return False
             raise RdqError(self._utils.fail(e, op, 'FunctionName', functionName))
 
+    def list_layer_versions(self, layerName):
+        op = "list_layer_versions"
+        try:
+            paginator = self._client.get_paginator(op)
+            page_iterator = paginator.paginate(LayerName=layerName)
+            versions = []
+            for page in page_iterator:
+                items = page["LayerVersions"]
+                for item in items:
+                    versions.append(item)
+            return versions
+        except botocore.exceptions.ClientError as e:
+            if self._utils.is_resource_not_found(e): return []
+            raise RdqError(self._utils.fail(e, op, 'LayerName', layerName))
+
+    # Allow lambda:PublishLayerVersion
+    def publish_layer_version(self, layerName, description, codeZip, runtimes):
+        op = 'publish_layer_version'
+        try:
+            response = self._client.publish_layer_version(
+                LayerName=layerName,
+                Description=description,
+                Content={
+                    'ZipFile': codeZip
+                },
+                CompatibleRuntimes=runtimes
+            )
+            return response
+        except botocore.exceptions.ClientError as e:
+            raise RdqError(self._utils.fail(e, op, 'LayerName', layerName))
+
+    # Allow lambda:DeleteLayerVersion
+    def delete_layer_version(self, layerName, versionNumber):
+        op = 'delete_layer_version'
+        try:
+            self._client.delete_layer_version(
+                LayerName=layerName,
+                VersionNumber=versionNumber
+            )
+            return True
+        except botocore.exceptions.ClientError as e:
+            if self._utils.is_resource_not_found(e): return False
+            raise RdqError(self._utils.fail(e, op, 'LayerName', layerName, 'VersionNumber', versionNumber))
+
     def list_event_source_mappings(self, functionName, eventSourceArn):
         op = "list_event_source_mappings"
         try:
@@ -247,6 +293,7 @@ class LambdaClient:
                 EventSourceArn=eventSourceArn,
                 BatchSize=cfg['BatchSize'],
                 MaximumBatchingWindowInSeconds=cfg['MaximumBatchingWindowInSeconds'],
+                FunctionResponseTypes=cfg.get('FunctionResponseTypes', []),
                 Enabled=True
             )
             return response['UUID']
@@ -259,7 +306,8 @@ class LambdaClient:
             self._client.update_event_source_mapping(
                 UUID=uuid,
                 BatchSize=cfg['BatchSize'],
-                MaximumBatchingWindowInSeconds=cfg['MaximumBatchingWindowInSeconds']
+                MaximumBatchingWindowInSeconds=cfg['MaximumBatchingWindowInSeconds'],
+                FunctionResponseTypes=cfg.get('FunctionResponseTypes', [])
             )
         except botocore.exceptions.ClientError as e:
             raise RdqError(self._utils.fail(e, op, 'UUID', uuid))
@@ -340,6 +388,7 @@ class LambdaClient:
         exFunctionConfiguration = exFunction['Configuration']
         exFunctionArn = exFunctionConfiguration['FunctionArn']
         dbCfg.loadExisting(exFunctionConfiguration)
+        dbCfg.loadExisting({'Layers': [layer['Arn'] for layer in exFunctionConfiguration.get('Layers', [])]})
         delta = dbCfg.delta()
         if delta:
             self._utils.info('CheckConfigurationDelta', 'FunctionName', functionName, "Reconfiguring", "Delta", delta)
@@ -359,6 +408,23 @@ class LambdaClient:
         self._utils.declare_tags(exFunctionArn, tags, exTags)
         return exFunctionArn
 
+    def declareLayerVersionArn(self, layerName, description, runtimes, codeZip):
+        inCodeSha256 = _codeSha256(codeZip)
+        rqDescription = "{} | CodeSha256 {}".format(description, inCodeSha256)
+        exVersions = self.list_layer_versions(layerName)
+        for exVersion in sorted(exVersions, key=(lambda v: v['Version']), reverse=True):
+            if exVersion.get('Description') == rqDescription:
+                self._utils.info('CheckCodeSHA256', 'LayerName', layerName, "Layer unchanged", "CodeSHA256", inCodeSha256)
+                return exVersion['LayerVersionArn']
+        newVersion = self.publish_layer_version(layerName, rqDescription, codeZip, runtimes)
+        return newVersion['LayerVersionArn']
+
+    def removeLayer(self, layerName):
+        exVersions = self.list_layer_versions(layerName)
+        for exVersion in exVersions:
+            self.delete_layer_version(layerName, exVersion['Version'])
+        return len(exVersions)
+
     def declareInvokePermission(self, functionArn, sid, principal, sourceArn):
         action = "lambda:InvokeFunction"
         self.remove_permission(functionArn, sid)
@@ -374,6 +440,10 @@ class LambdaClient:
         uuid = exMapping['UUID']
         anames = ['BatchSize', 'MaximumBatchingWindowInSeconds']
         delta = False
+        rqResponseTypes = sorted(cfg.get('FunctionResponseTypes', []))
+        exResponseTypes = sorted(exMapping.get('FunctionResponseTypes', []))
+        if rqResponseTypes != exResponseTypes:
+            delta = True
         for aname in anames:
             rq = cfg[aname]
             ex = exMapping[aname]
@@ -155,6 +155,10 @@ class OrganizationClient:
         self._client = profile.getClient(service)
         self._utils = ServiceUtils(profile, service)
 
+    @property
+    def accountId(self):
+        return self._profile.accountId
+
     def diagnosticDelegated(self, op):
         accountId = self._profile.accountId
         msg = "Ensure account is delegated administrator for Organization"
@@ -181,6 +185,21 @@ class OrganizationClient:
             self.diagnosticDelegated(op)
             raise RdqError(self._utils.fail(e, op))
 
+    def list_accounts(self) -> List[AccountDescriptor]:
+        op = "list_accounts"
+        try:
+            paginator = self._client.get_paginator(op)
+            page_iterator = paginator.paginate()
+            results = []
+            for page in page_iterator:
+                items = page["Accounts"]
+                for item in items:
+                    results.append(AccountDescriptor(item))
+            return results
+        except botocore.exceptions.ClientError as e:
+            self.diagnosticDelegated(op)
+            raise RdqError(self._utils.fail(e, op))
+
     def get_root_ou(self) -> OrganizationUnit:
         op = "list_roots"
         try:
@@ -232,3 +251,6 @@ class OrganizationClient:
 
     def getAccountDescriptor(self, accountId) -> AccountDescriptor:
         return AccountDescriptor(self.describe_account(accountId))
+
+    def listAccountDescriptors(self) -> List[AccountDescriptor]:
+        return self.list_accounts()
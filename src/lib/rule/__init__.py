@@ -1,3 +1,4 @@
+import os
 import logging
 import json
 import time
@@ -5,8 +6,14 @@ import time
 from typing import Callable
 
 from lib.base import initLogging, Tags, RK
+from lib.base.trace import getTracer, initTracing
+from lib.base.profiling import getProfiler, initProfiling
 import lib.base.ruleresponse as rr
-from lib.rdq import Profile, RdqError, RdqTimeout
+from lib.rdq import Profile, RdqError, RdqTimeout, getSourceProfile
+from lib.rdq.base import getRetryPolicy
+from lib.rdq.ratelimit import initRateLimits
+from lib.rdq.replay import initRecording, flushRecording
+from lib.rdq.instrument import getApiStatsRegistry, dumpApiStats
 
 
 class RuleSoftwareError(Exception):
@@ -113,6 +120,9 @@ class Task:
     @property
     def roleName(self): return self._props['roleName']
 
+    @property
+    def traceId(self): return self._props.get('trace', {}).get('traceId')
+
     @property
     def elapsedSecs(self):
         return time.time() - self._startedAt
@@ -127,6 +137,10 @@ class Task:
 class RuleMain:
     def __init__(self, logLevelVariable='LOGLEVEL', defaultLevel='INFO'):
         initLogging(logLevelVariable, defaultLevel)
+        initRateLimits()
+        initRecording()
+        initTracing()
+        initProfiling()
         self._remediationHandlers = []
         self._baselineHandlers = []
 
@@ -177,14 +191,18 @@ class RuleMain:
             isPreview = task.isPreview
             roleName = task.roleName
             sessionName = self._session_name(action, configRuleName)
-            fromProfile = Profile(regionName=awsRegion)
-            if roleName == 'LOCAL':
-                targetProfile = fromProfile
-            else:
-                targetProfile = fromProfile.assumeRole(awsAccountId, roleName, awsRegion, sessionName)
+            tracer = getTracer()
+            with tracer.span('rule.assume_role', roleName=roleName, accountId=awsAccountId):
+                fromProfile = getSourceProfile(awsRegion)
+                if roleName == 'LOCAL':
+                    targetProfile = fromProfile
+                else:
+                    targetProfile = fromProfile.assumeRole(awsAccountId, roleName, awsRegion, sessionName)
             targetProfile.enablePreview(isPreview)
             previewResponse = {}
-            actionResponse = handlingMethod(targetProfile, task)
+            with tracer.span('rule.handler', resourceId=task.resourceId) as span:
+                actionResponse = handlingMethod(targetProfile, task)
+                if span: span.setAttribute('major', actionResponse.major)
             if targetProfile.isPreviewing:
                 previewResponse = targetProfile.enablePreview(False)
                 actionResponse.putPreview(previewResponse)
@@ -219,6 +237,8 @@ class RuleMain:
     def _action_event(self, event) -> rr.ActionResponse:
         _context = 'Task Setup'
         action = 'setup'
+        tracer = getTracer()
+        setupSpan = tracer.startSpan('rule.setup')
         try:
             action = self._required_action(event)
             configRuleName = _required_value(event, 'configRuleName')
@@ -246,9 +266,12 @@ class RuleMain:
                 'manualTagName': _required_value(event, 'manualTagName'),
                 'autoResourceTags': _required_value(event, 'autoResourceTags'),
                 'stackNamePattern': _required_value(event, 'stackNamePattern'),
-                'deploymentMethod': _defaulted_value(event, 'deploymentMethod', {})
+                'deploymentMethod': _defaulted_value(event, 'deploymentMethod', {}),
+                'trace': _defaulted_value(event, 'trace', {})
             }
             task = Task(taskProps)
+            tracer.endSpan(setupSpan)
+            setupSpan = None
             return self._action_task(handlingMethod, task)
         except RuleConfigurationError as e:
             report = {RK.Synopsis: "RuleConfigurationError", RK.Context: _context, RK.Cause: e.message, 'Event': event}
@@ -264,6 +287,8 @@ class RuleMain:
             report = {RK.Synopsis: syn, RK.Context: "Task Setup", RK.Cause: msg, 'Event': event}
             logging.exception(report)
             return rr.ActionFailure(action, syn)
+        finally:
+            if setupSpan: tracer.endSpan(setupSpan, 'TaskSetupFailed')
 
     def addRemediationHandler(self, configRuleName :str, resourceType :str, handlingMethod :Callable[[Profile, Task], rr.RemediationResponse]):
         handler = self._create_handler(configRuleName, resourceType, handlingMethod)
@@ -273,6 +298,19 @@ class RuleMain:
         handler = self._create_handler(configRuleName, resourceType, handlingMethod)
         self._baselineHandlers.append(handler)
 
+    def report_api_retries(self):
+        counters = getRetryPolicy().getCounters()
+        if counters['Retries'] == 0 and counters['BudgetExhausted'] == 0: return
+        report = {RK.Synopsis: "ApiRetries", 'Counters': counters}
+        logging.info(report)
+
     def action(self, event):
-        actionResponse = self._action_event(event)
+        getRetryPolicy().beginInvocation()
+        getApiStatsRegistry().reset()
+        trace = event.get('trace', {}) if type(event) is dict else {}
+        with getTracer().span('rule.action', trace.get('traceId'), trace.get('parentSpanId'), messageId=trace.get('messageId')):
+            actionResponse = getProfiler().call(os.environ.get('AWS_LAMBDA_FUNCTION_NAME', 'rule'), self._action_event, event)
+        self.report_api_retries()
+        dumpApiStats({'Function': os.environ.get('AWS_LAMBDA_FUNCTION_NAME', 'local')})
+        flushRecording()
         return actionResponse.toDict()
@@ -0,0 +1,83 @@
+import unittest
+import time
+import threading
+
+from lib.base import initLogging
+from lib.rdq import RdqError
+import cmds.builder as builder
+
+import cfg.core as cfgCore
+import cfg.rules as cfgRules
+import tests.util_synthetic as synthetic
+
+
+class _DeployStub:
+    def __init__(self, taskSecs, failedFolders=[]):
+        self._taskSecs = taskSecs
+        self._failedFolders = set(failedFolders)
+        self._lock = threading.Lock()
+        self._active = 0
+        self.peakActive = 0
+
+    def __call__(self, ruleFolder, functionName):
+        with self._lock:
+            self._active += 1
+            self.peakActive = max(self.peakActive, self._active)
+        time.sleep(self._taskSecs)
+        with self._lock:
+            self._active -= 1
+        if ruleFolder in self._failedFolders:
+            raise RdqError("Stub failure for {}".format(functionName))
+        return "arn:aws:lambda:ap-southeast-2:111111111111:function:{}".format(functionName)
+
+def _matches(pattern, value):
+    if isinstance(pattern, dict):
+        if not isinstance(value, dict): return False
+        return all(_matches(p, value.get(k)) for (k, p) in pattern.items())
+    for p in pattern:
+        if isinstance(p, dict) and isinstance(value, str) and value.startswith(p['prefix']): return True
+        if p == value: return True
+    return False
+
+
+class TestBuilder(unittest.TestCase):
+    def test_parallel(self):
+        ruleFolders = ["Rule{}".format(i) for i in range(cfgCore.ruleDeployParallelism * 2)]
+        task = _DeployStub(0.1)
+        startedAt = time.time()
+        results = builder.run_function_tasks(ruleFolders, task)
+        elapsedSecs = time.time() - startedAt
+        self.assertEqual(task.peakActive, cfgCore.ruleDeployParallelism)
+        self.assertLess(elapsedSecs, 0.1 * 4)
+        self.assertEqual([r.ruleFolder for r in results], ruleFolders)
+        self.assertEqual(results[0].functionName, cfgCore.ruleFunctionName('Rule0'))
+        self.assertFalse(any(r.failed for r in results))
+        builder.report_function_results(results, "Rule Lambda ARN: {}", 'deployed')
+
+    def test_failure_summary(self):
+        results = builder.run_function_tasks(['R1', 'R2', 'R3'], _DeployStub(0.01, ['R2']))
+        self.assertEqual([r.failed for r in results], [False, True, False])
+        self.assertTrue(results[2].output.endswith(cfgCore.ruleFunctionName('R3')))
+        with self.assertRaises(RdqError):
+            builder.report_function_results(results, "Rule Lambda ARN: {}", 'deployed')
+
+    def test_event_pattern(self):
+        pattern = builder.complianceChangeEventPattern()
+        self.assertEqual(pattern['detail']['newEvaluationResult'], {'complianceType': ['NON_COMPLIANT']})
+        self.assertEqual(len(pattern['detail']['configRuleName']), len(cfgRules.remediatedRuleNames()))
+        ruleMix = {'cloudwatch-log-group-encrypted': 1.0, 'iam-password-policy': 1.0}
+        generator = synthetic.ComplianceEventGenerator(ruleMix=ruleMix, complianceMix={'NON_COMPLIANT': 1.0, 'COMPLIANT': 1.0}, seed=3)
+        bodies = [generator.body() for i in range(200)]
+        matched = [b for b in bodies if _matches(pattern, b)]
+        self.assertGreater(len(matched), 0)
+        for body in bodies:
+            detail = body['detail']
+            expected = detail['configRuleName'].startswith('cloudwatch-log-group-encrypted-') and (detail['newEvaluationResult']['complianceType'] == 'NON_COMPLIANT')
+            self.assertEqual(_matches(pattern, body), expected)
+
+
+if __name__ == '__main__':
+    initLogging(None, 'INFO')
+    loader = unittest.TestLoader()
+    loader.testMethodPrefix = "test_"
+    unittest.main(warnings='default', testLoader = loader)
@@ -0,0 +1,96 @@
+import unittest
+import os
+import io
+import sys
+import time
+import tempfile
+from zipfile import ZipFile, ZIP_DEFLATED
+
+from lib.base import initLogging
+import cmds.codeLoader as codeLoader
+
+
+def _write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(text)
+
+def _create_tree(home):
+    _write(os.path.join(home, 'lambdas', 'rules', 'R1', 'lambda_function.py'), "import lib.base\n" * 50)
+    _write(os.path.join(home, 'lambdas', 'rules', 'R1', '__pycache__', 'lambda_function.cpython-38.pyc'), "x")
+    _write(os.path.join(home, 'lib', 'base', '__init__.py'), "X = 1\n" * 50)
+    _write(os.path.join(home, 'lib', 'base', 'stale.pyc'), "x")
+    _write(os.path.join(home, 'lib', 'base', 'request.py'), "Y = 2\n" * 50)
+
+def _build(home):
+    mainPath = os.path.join(home, 'lambdas', 'rules', 'R1')
+    return codeLoader.get_zip_code_bytes('R1', mainPath, mainPath, home, [os.path.join(home, 'lib', 'base')])
+
+
+class TestCodeLoader(unittest.TestCase):
+    def setUp(self):
+        self._savedCache = codeLoader.getBuildCache()
+
+    def tearDown(self):
+        codeLoader.setBuildCache(self._savedCache)
+
+    def test_deterministic(self):
+        with tempfile.TemporaryDirectory() as folder:
+            home = os.path.join(folder, 'src')
+            _create_tree(home)
+            codeLoader.setBuildCache(codeLoader.BuildCache(os.path.join(folder, 'cacheA')))
+            zipA = _build(home)
+            past = time.time() - 86400
+            for (root, dirnames, files) in os.walk(home):
+                for filename in files:
+                    os.utime(os.path.join(root, filename), (past, past))
+            codeLoader.setBuildCache(codeLoader.BuildCache(os.path.join(folder, 'cacheB')))
+            zipB = _build(home)
+            self.assertEqual(zipA, zipB)
+            with ZipFile(io.BytesIO(zipA)) as zip:
+                names = zip.namelist()
+                infos = zip.infolist()
+            self.assertEqual(names, ['./lambda_function.py', './lib/base/__init__.py', './lib/base/request.py'])
+            for info in infos:
+                self.assertEqual(info.date_time, (1980, 1, 1, 0, 0, 0))
+                self.assertEqual(info.compress_type, ZIP_DEFLATED)
+                self.assertLess(info.compress_size, info.file_size)
+
+    def test_build_cache(self):
+        with tempfile.TemporaryDirectory() as folder:
+            home = os.path.join(folder, 'src')
+            _create_tree(home)
+            buildCache = codeLoader.BuildCache(os.path.join(folder, 'cache'))
+            codeLoader.setBuildCache(buildCache)
+            zip1 = _build(home)
+            zip2 = _build(home)
+            self.assertEqual(zip1, zip2)
+            self.assertEqual((buildCache.hits, buildCache.misses), (1, 1))
+            _write(os.path.join(home, 'lib', 'base', '__pycache__', 'request.cpython-38.pyc'), "y")
+            _build(home)
+            self.assertEqual((buildCache.hits, buildCache.misses), (2, 1))
+            _write(os.path.join(home, 'lib', 'base', 'request.py'), "Y = 3\n")
+            zip3 = _build(home)
+            self.assertNotEqual(zip1, zip3)
+            self.assertEqual((buildCache.hits, buildCache.misses), (2, 2))
+
+    def test_bytecode(self):
+        with tempfile.TemporaryDirectory() as folder:
+            home = os.path.join(folder, 'src')
+            _create_tree(home)
+            filePairs = codeLoader.get_all_file_pairs(home, os.path.join(home, 'lib', 'base'))
+            zipBytes = codeLoader.make_zip_bytes(filePairs, bytecode=True)
+            self.assertEqual(zipBytes, codeLoader.make_zip_bytes(filePairs, bytecode=True))
+        pycName = "./lib/base/__pycache__/request.{}.pyc".format(sys.implementation.cache_tag)
+        with ZipFile(io.BytesIO(zipBytes)) as zip:
+            self.assertIn(pycName, zip.namelist())
+            self.assertIn('./lib/base/request.py', zip.namelist())
+            pyc = zip.read(pycName)
+        self.assertEqual(int.from_bytes(pyc[4:8], 'little'), 1)
+
+
+if __name__ == '__main__':
+    initLogging(None, 'INFO')
+    loader = unittest.TestLoader()
+    loader.testMethodPrefix = "test_"
+    unittest.main(warnings='default', testLoader = loader)
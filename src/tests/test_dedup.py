@@ -0,0 +1,127 @@
+import unittest
+import os
+import json
+
+from lib.base import initLogging
+from lib.lambdas.core.dedup import EventDeduplicator, MemoryTtlCache, KeyValueTtlCache, ReasonBatch, ReasonWindow
+from lib.lambdas.core.directory import LocalKeyValueTable
+from lib.lambdas.core.dispatcher import Dispatcher
+
+import cfg.core as cfgCore
+import cfg.roles as cfgRoles
+from tests.test_dispatcher import _LambdaStub, _ProfileStub, _record
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+class _CloudWatchRecorder:
+    def __init__(self):
+        self.metricData = []
+
+    def put_metric_data(self, Namespace, MetricData):
+        self.metricData.extend(MetricData)
+
+def _dispatch(messageId, resourceId, recordedTime='2021-11-23T11:05:04.582Z', accountId='111111111111'):
+    return {
+        'messageId': messageId,
+        'configRuleNameBase': 'cloudwatch-log-group-encrypted',
+        'awsAccountId': accountId,
+        'awsRegion': 'ap-southeast-2',
+        'resourceId': resourceId,
+        'resultRecordedTime': recordedTime
+    }
+
+def _recorded_record(messageId, resourceId, recordedTime):
+    record = _record(messageId, resourceId)
+    body = json.loads(record['body'])
+    body['detail']['newEvaluationResult']['resultRecordedTime'] = recordedTime
+    record['body'] = json.dumps(body)
+    return record
+
+
+class TestDedup(unittest.TestCase):
+    def test_batch(self):
+        deduplicator = EventDeduplicator(MemoryTtlCache(600))
+        dispatchList = [_dispatch('m1', 'r1'), _dispatch('m2', 'r1', '2021-11-23T11:06:00.000Z'), _dispatch('m3', 'r2'), _dispatch('m4', 'r1', accountId='222222222222')]
+        (uniqueList, duplicates) = deduplicator.filter(dispatchList)
+        self.assertEqual([d['messageId'] for d in uniqueList], ['m1', 'm3', 'm4'])
+        self.assertEqual([(d.reason, d.originalMessageId) for d in duplicates], [(ReasonBatch, 'm1')])
+
+    def test_window(self):
+        clock = _Clock()
+        deduplicator = EventDeduplicator(MemoryTtlCache(600, clock=clock))
+        deduplicator.filter([_dispatch('m1', 'r1')])
+        (uniqueList, duplicates) = deduplicator.filter([_dispatch('m2', 'r1'), _dispatch('m1', 'r1')])
+        self.assertEqual([d['messageId'] for d in uniqueList], ['m1'])
+        self.assertEqual(duplicates[0].reason, ReasonWindow)
+        (uniqueList, duplicates) = deduplicator.filter([_dispatch('m3', 'r1', '2021-11-23T12:00:00.000Z')])
+        self.assertEqual(len(uniqueList), 1)
+        clock.now += 601
+        (uniqueList, duplicates) = deduplicator.filter([_dispatch('m4', 'r1')])
+        self.assertEqual(len(uniqueList), 1)
+
+    def test_shared_tier(self):
+        clock = _Clock()
+        table = LocalKeyValueTable()
+        d1 = EventDeduplicator(MemoryTtlCache(600, clock=clock), KeyValueTtlCache(table, 600, clock))
+        d2 = EventDeduplicator(MemoryTtlCache(600, clock=clock), KeyValueTtlCache(table, 600, clock))
+        d1.filter([_dispatch('m1', 'r1')])
+        (uniqueList, duplicates) = d2.filter([_dispatch('m2', 'r1')])
+        self.assertEqual(uniqueList, [])
+        self.assertEqual(duplicates[0].originalMessageId, 'm1')
+        clock.now += 601
+        (uniqueList, duplicates) = d2.filter([_dispatch('m2', 'r1')])
+        self.assertEqual(len(uniqueList), 1)
+
+    def test_memory_bound(self):
+        clock = _Clock()
+        cache = MemoryTtlCache(600, maxEntries=3, clock=clock)
+        for i in range(5):
+            clock.now += 1
+            cache.put("k{}".format(i), "v{}".format(i))
+        self.assertEqual(cache.size(), 3)
+        self.assertIsNone(cache.get('k0'))
+        self.assertEqual(cache.get('k4'), 'v4')
+        cache.put('k2', 'v2')
+        cache.put('k5', 'v5')
+        self.assertIsNone(cache.get('k3'))
+        self.assertEqual(cache.get('k2'), 'v2')
+        clock.now += 601
+        cache.put('k6', 'v6')
+        self.assertEqual(cache.size(), 1)
+
+    def test_dispatcher(self):
+        os.environ[cfgCore.environmentVariableNameRemediationRole()] = cfgRoles.standaloneRoles()['Remediation']
+        lambdaStub = _LambdaStub(invokeSecs=0.001)
+        profile = _ProfileStub(lambdaStub)
+        cloudWatch = _CloudWatchRecorder()
+        profile._clients['cloudwatch'] = cloudWatch
+        dispatcher = Dispatcher(profile, reportBatchItemFailures=True)
+        recordedTime = '2021-11-23T11:05:04.582Z'
+        event = {'Records': [
+            _recorded_record('m1', '/aws/lambda/app1', recordedTime),
+            _recorded_record('m2', '/aws/lambda/app1', recordedTime),
+            _recorded_record('m3', '/aws/lambda/app2', recordedTime)
+        ]}
+        response = dispatcher.dispatch(event)
+        self.assertEqual(response, {'batchItemFailures': []})
+        self.assertEqual(lambdaStub.invokeCount, 2)
+        response = dispatcher.dispatch({'Records': [_recorded_record('m4', '/aws/lambda/app2', recordedTime)]})
+        self.assertEqual(lambdaStub.invokeCount, 2)
+        counts = {}
+        for datum in cloudWatch.metricData:
+            if datum['MetricName'].startswith('Events.'):
+                counts[datum['MetricName']] = counts.get(datum['MetricName'], 0) + datum['StatisticValues']['Sum']
+        self.assertEqual(counts, {'Events.' + ReasonBatch: 1.0, 'Events.' + ReasonWindow: 1.0})
+
+
+if __name__ == '__main__':
+    initLogging(None, 'INFO')
+    loader = unittest.TestLoader()
+    loader.testMethodPrefix = "test_"
+    unittest.main(warnings='default', testLoader = loader)
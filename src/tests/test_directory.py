@@ -0,0 +1,127 @@
+import unittest
+import os
+import datetime
+import tempfile
+
+from lib.base import initLogging
+from lib.rdq import setEmulator
+from lib.rdq.emulator import AwsEmulator
+from lib.rdq.svcorg import AccountDescriptor, OrganizationClient
+from lib.lambdas.core.directory import AccountDirectory, FileSnapshotStore, KeyValueSnapshotStore, LocalKeyValueTable, createAccountDirectory
+
+import cfg.core as cfgCore
+
+
+def _account(accountId, name, status='ACTIVE'):
+    return {
+        'Id': accountId,
+        'Arn': "arn:aws:organizations::000000000000:account/o-test/{}".format(accountId),
+        'Name': name,
+        'Email': "{}@local".format(name),
+        'Status': status,
+        'JoinedMethod': 'INVITED',
+        'JoinedTimestamp': datetime.datetime(2021, 11, 23, 11, 5, 4, tzinfo=datetime.timezone.utc)
+    }
+
+class _OrganizationClientStub:
+    def __init__(self, accounts):
+        self.accounts = accounts
+        self.listCount = 0
+        self.describeCount = 0
+
+    def listAccountDescriptors(self):
+        self.listCount += 1
+        return [AccountDescriptor(a) for a in self.accounts]
+
+    def getAccountDescriptor(self, accountId):
+        self.describeCount += 1
+        return AccountDescriptor(_account(accountId, 'late'))
+
+class _FailingStore:
+    def load(self):
+        return None
+
+    def save(self, snapshot):
+        raise TypeError("Object of type datetime is not JSON serializable")
+
+
+class TestDirectory(unittest.TestCase):
+    def test_single_sweep(self):
+        accounts = [_account("{:012d}".format(i), "a{}".format(i)) for i in range(300)]
+        orgc = _OrganizationClientStub(accounts)
+        directory = AccountDirectory(orgc, ttlSecs=900)
+        for i in range(300):
+            accountDesc = directory.getAccountDescriptor("{:012d}".format(i))
+            self.assertEqual(accountDesc.accountName, "a{}".format(i))
+        self.assertEqual(orgc.listCount, 1)
+        self.assertEqual(orgc.describeCount, 0)
+        self.assertEqual(directory.getAccountDescriptor('999999999999').accountName, 'late')
+        self.assertEqual(directory.getAccountDescriptor('999999999999').accountName, 'late')
+        self.assertEqual(orgc.describeCount, 1)
+
+    def test_ttl(self):
+        orgc = _OrganizationClientStub([_account('111111111111', 'a1')])
+        directory = AccountDirectory(orgc, ttlSecs=0)
+        directory.getAccountDescriptor('111111111111')
+        directory.getAccountDescriptor('111111111111')
+        self.assertEqual(orgc.listCount, 2)
+
+    def test_file_snapshot(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'directory.json')
+            orgc = _OrganizationClientStub([_account('111111111111', 'a1', 'SUSPENDED')])
+            AccountDirectory(orgc, 900, FileSnapshotStore(path)).getAccountDescriptor('111111111111')
+            warm = AccountDirectory(orgc, 900, FileSnapshotStore(path))
+            accountDesc = warm.getAccountDescriptor('111111111111')
+            self.assertFalse(accountDesc.isActive)
+            self.assertEqual(orgc.listCount, 1)
+            with open(path, 'w') as f:
+                f.write('{not json')
+            AccountDirectory(orgc, 900, FileSnapshotStore(path)).getAccountDescriptor('111111111111')
+            self.assertEqual(orgc.listCount, 2)
+
+    def test_key_value_snapshot(self):
+        table = LocalKeyValueTable()
+        orgc = _OrganizationClientStub([_account('111111111111', 'a1')])
+        AccountDirectory(orgc, 900, KeyValueSnapshotStore(table)).getAccountDescriptor('111111111111')
+        warm = AccountDirectory(orgc, 900, KeyValueSnapshotStore(table))
+        self.assertEqual(warm.getAccountDescriptor('111111111111').accountName, 'a1')
+        self.assertEqual(orgc.listCount, 1)
+        expired = AccountDirectory(orgc, 0, KeyValueSnapshotStore(table))
+        expired.getAccountDescriptor('111111111111')
+        self.assertEqual(orgc.listCount, 2)
+
+    def test_emulated_organization(self):
+        emulator = AwsEmulator()
+        emulator.addAccount('222222222222', 'workload')
+        setEmulator(emulator)
+        try:
+            orgc = OrganizationClient(emulator.createProfile())
+            with tempfile.TemporaryDirectory() as tmpdir:
+                path = os.path.join(tmpdir, 'directory.json')
+                AccountDirectory(orgc, 900, FileSnapshotStore(path)).getAccountDescriptor('222222222222')
+                self.assertEqual(os.listdir(tmpdir), ['directory.json'])
+                warm = AccountDirectory(orgc, 900, FileSnapshotStore(path))
+                self.assertTrue(warm.load_snapshot())
+                self.assertEqual(warm.getAccountDescriptor('222222222222').accountName, 'workload')
+            snapshotPath = cfgCore.coreAccountDirectoryCfg()['SnapshotPath'].format(emulator.managementAccountId)
+            if os.path.exists(snapshotPath): os.remove(snapshotPath)
+            createAccountDirectory(orgc).getAccountDescriptor('222222222222')
+            self.assertTrue(os.path.exists(snapshotPath))
+            os.remove(snapshotPath)
+        finally:
+            setEmulator(None)
+
+    def test_snapshot_failure(self):
+        orgc = _OrganizationClientStub([_account('111111111111', 'a1')])
+        directory = AccountDirectory(orgc, 900, _FailingStore())
+        with self.assertLogs(level='WARNING'):
+            accountDesc = directory.getAccountDescriptor('111111111111')
+        self.assertEqual(accountDesc.accountName, 'a1')
+
+
+if __name__ == '__main__':
+    initLogging(None, 'INFO')
+    loader = unittest.TestLoader()
+    loader.testMethodPrefix = "test_"
+    unittest.main(warnings='default', testLoader = loader)
@@ -0,0 +1,193 @@
+import unittest
+import os
+import io
+import json
+import time
+import threading
+
+from lib.base import initLogging
+from lib.base.request import DispatchEvent, DispatchEventTarget
+from lib.lambdas.core.parser import RuleInvocation
+from lib.lambdas.core.dispatcher import Dispatcher, _create_lanes
+from lib.lambdas.core.runtime import DispatcherRuntime
+from lib.rdq.instrument import ApiStatsRegistry
+
+import cfg.core as cfgCore
+import cfg.roles as cfgRoles
+
+
+class _LambdaStub:
+    def __init__(self, invokeSecs=0.05, retryFunctions=None):
+        self._invokeSecs = invokeSecs
+        self._retryFunctions = set(retryFunctions) if retryFunctions else set()
+        self._lock = threading.Lock()
+        self._active = {}
+        self.peakActive = {}
+        self.peakTotal = 0
+        self.invokeCount = 0
+
+    def _enter(self, functionName):
+        with self._lock:
+            self.invokeCount += 1
+            active = self._active.get(functionName, 0) + 1
+            self._active[functionName] = active
+            self.peakActive[functionName] = max(self.peakActive.get(functionName, 0), active)
+            self.peakTotal = max(self.peakTotal, sum(self._active.values()))
+
+    def _exit(self, functionName):
+        with self._lock:
+            self._active[functionName] = self._active[functionName] - 1
+
+    def invoke(self, FunctionName, InvocationType, Payload):
+        self._enter(FunctionName)
+        time.sleep(self._invokeSecs)
+        self._exit(FunctionName)
+        major = 'Timeout' if FunctionName in self._retryFunctions else 'Success'
+        response = {'action': 'remediate', 'major': major, 'minor': 'Applied', 'message': 'stub'}
+        return {'StatusCode': 200, 'Payload': io.BytesIO(json.dumps(response).encode("utf-8"))}
+
+class _CloudWatchStub:
+    def put_metric_data(self, Namespace, MetricData):
+        pass
+
+class _ProfileStub:
+    def __init__(self, lambdaStub):
+        self.accountId = '111111111111'
+        self.regionName = 'ap-southeast-2'
+        self.sessionName = 'Stub'
+        self._clients = {'lambda': lambdaStub, 'cloudwatch': _CloudWatchStub()}
+        self.expiring = False
+        self.apiStats = ApiStatsRegistry()
+
+    def getClient(self, serviceName):
+        return self._clients.get(serviceName)
+
+    def credentialsExpiring(self, marginSecs=300):
+        return self.expiring
+
+def _invocation(functionName, resourceId):
+    t = {
+        'awsAccountId': '111111111111',
+        'awsAccountName': 'a1',
+        'awsAccountEmail': 'a1@local',
+        'awsRegion': 'ap-southeast-2',
+        'roleName': 'LOCAL',
+        'resourceType': 't1',
+        'resourceId': resourceId
+    }
+    e = {
+        'configRuleName': 'c1',
+        'action': 'remediate',
+        'conformancePackName': 'NZISM',
+        'preview': False,
+        'deploymentMethod': {},
+        'manualTagName': 'ManualRemediation',
+        'autoResourceTags': {'NZISM': 'CID:1'},
+        'stackNamePattern': 'NZISM-AutoDeployed-{}'
+    }
+    return RuleInvocation(functionName, DispatchEvent(e, DispatchEventTarget(t)))
+
+def _record(messageId, resourceId, complianceType='NON_COMPLIANT', accountId='111111111111'):
+    body = {
+        "detail-type": "Config Rules Compliance Change",
+        "source": "aws.config",
+        "detail": {
+            "resourceId": resourceId,
+            "awsRegion": "ap-southeast-2",
+            "awsAccountId": accountId,
+            "configRuleName": "cloudwatch-log-group-encrypted-conformance-pack-qayjyopmd",
+            "messageType": "ComplianceChangeNotification",
+            "newEvaluationResult": {
+                "complianceType": complianceType,
+                "resultRecordedTime": "2021-11-23T11:05:04.582Z"
+            },
+            "resourceType": "AWS::Logs::LogGroup"
+        }
+    }
+    return {
+        "messageId": messageId,
+        "body": json.dumps(body),
+        "attributes": {"ApproximateReceiveCount": "2"},
+        "eventSource": "aws:sqs"
+    }
+
+
+class TestDispatcher(unittest.TestCase):
+    def setUp(self):
+        os.environ[cfgCore.environmentVariableNameRemediationRole()] = 'UnitTestRemediationRole'
+
+    def test_lanes(self):
+        invocations = [_invocation('fA', 'r1'), _invocation('fB', 'r2'), _invocation('fA', 'r3'), _invocation('fA', 'r4')]
+        concurrencyCfg = {'FunctionConcurrencyDefault': 1, 'FunctionConcurrency': {'fA': 2}}
+        lanes = _create_lanes(invocations, concurrencyCfg)
+        self.assertEqual(len(lanes), 3)
+        self.assertEqual(lanes[0].functionName, 'fA')
+        self.assertEqual(lanes[0].positions, [0, 3])
+        self.assertEqual(lanes[1].functionName, 'fB')
+        self.assertEqual(lanes[2].positions, [2])
+
+    def test_parallel(self):
+        lambdaStub = _LambdaStub(invokeSecs=0.2, retryFunctions=['fC'])
+        dispatcher = Dispatcher(_ProfileStub(lambdaStub), maxParallelism=8)
+        dispatcher._concurrencyCfg = {'FunctionConcurrencyDefault': 1, 'FunctionConcurrency': {'fA': 3}}
+        invocations = []
+        for i in range(6):
+            invocations.append(_invocation('fA', "a{}".format(i)))
+        invocations.append(_invocation('fB', 'b1'))
+        invocations.append(_invocation('fC', 'c1'))
+        retryList = dispatcher.dispatch_rule_invocations(invocations)
+        self.assertEqual(lambdaStub.invokeCount, 8)
+        self.assertEqual(lambdaStub.peakActive['fA'], 3)
+        self.assertEqual(lambdaStub.peakActive['fB'], 1)
+        self.assertGreaterEqual(lambdaStub.peakTotal, 4)
+        self.assertEqual(len(retryList), 1)
+        self.assertEqual(retryList[0].functionName, 'fC')
+        self.assertEqual(retryList[0].attempt, 2)
+
+    def test_serial(self):
+        lambdaStub = _LambdaStub(invokeSecs=0.01)
+        dispatcher = Dispatcher(_ProfileStub(lambdaStub), maxParallelism=1)
+        invocations = [_invocation('fA', 'a1'), _invocation('fB', 'b1')]
+        retryList = dispatcher.dispatch_rule_invocations(invocations)
+        self.assertEqual(len(retryList), 0)
+        self.assertEqual(lambdaStub.peakTotal, 1)
+
+    def test_batch_item_failures(self):
+        os.environ[cfgCore.environmentVariableNameRemediationRole()] = cfgRoles.standaloneRoles()['Remediation']
+        functionName = cfgCore.ruleFunctionName('EncryptCWL')
+        lambdaStub = _LambdaStub(invokeSecs=0.01, retryFunctions=[functionName])
+        dispatcher = Dispatcher(_ProfileStub(lambdaStub), reportBatchItemFailures=True)
+        event = {'Records': [
+            _record('m1', '/aws/lambda/app1'),
+            _record('m2', '/aws/lambda/app2', 'COMPLIANT'),
+            _record('m3', '/aws/lambda/app3', accountId='222222222222')
+        ]}
+        response = dispatcher.dispatch(event)
+        self.assertEqual(lambdaStub.invokeCount, 1)
+        self.assertEqual(response, {'batchItemFailures': [{'itemIdentifier': 'm1'}]})
+
+    def test_runtime_reuse(self):
+        profiles = []
+        def profileFactory():
+            profile = _ProfileStub(_LambdaStub())
+            profiles.append(profile)
+            return profile
+        runtime = DispatcherRuntime(maxAgeSecs=3600, profileFactory=profileFactory)
+        d1 = runtime.getDispatcher()
+        d2 = runtime.getDispatcher()
+        self.assertIs(d1, d2)
+        self.assertEqual(len(profiles), 1)
+        profiles[0].expiring = True
+        d3 = runtime.getDispatcher()
+        self.assertIsNot(d1, d3)
+        self.assertEqual(len(profiles), 2)
+        runtime.reset()
+        runtime.getDispatcher()
+        self.assertEqual(len(profiles), 3)
+
+
+if __name__ == '__main__':
+    initLogging(None, 'INFO')
+    loader = unittest.TestLoader()
+    loader.testMethodPrefix = "test_"
+    unittest.main(warnings='default', testLoader = loader)
@@ -0,0 +1,132 @@
+import unittest
+import os
+
+from lib.base import initLogging, Tags
+from lib.rdq import Profile, RdqError, setEmulator
+from lib.rdq.base import RetryPolicy, getRetryPolicy, setRetryPolicy
+from lib.rdq.ratelimit import getRateLimiter
+from lib.rdq.emulator import AwsEmulator
+from lib.rdq.svckms import KmsClient
+from lib.rdq.svccwl import CwlClient
+from lib.rdq.svcs3control import S3ControlClient
+from lib.rdq.svclambda import LambdaClient
+from lib.rdq.svcorg import OrganizationClient
+
+_managementAccountId = '111111111111'
+_targetAccountId = '222222222222'
+_regionName = 'ap-southeast-2'
+_rulesFolder = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'lambdas', 'rules')
+
+def _rule_event(configRuleName, resourceType, resourceId, deploymentMethod={}):
+    return {
+        'action': 'remediate',
+        'preview': False,
+        'conformancePackName': 'NZISM',
+        'configRuleName': configRuleName,
+        'manualTagName': 'ManualRemediation',
+        'autoResourceTags': {'AutoDeployed': 'True'},
+        'stackNamePattern': 'NZISM-AutoDeployed-{}',
+        'deploymentMethod': deploymentMethod,
+        'target': {
+            'awsAccountId': _targetAccountId,
+            'awsAccountName': 'Application-1',
+            'awsAccountEmail': 'application1@emulated.local',
+            'awsRegion': _regionName,
+            'roleName': 'NZISM-Remediation',
+            'resourceType': resourceType,
+            'resourceId': resourceId
+        }
+    }
+
+
+class TestEmulator(unittest.TestCase):
+    def setUp(self):
+        self._exPolicy = getRetryPolicy()
+        setRetryPolicy(RetryPolicy(baseSecs=0.001, capSecs=0.01))
+        self._sleeps = []
+        self._emulator = AwsEmulator(_managementAccountId, _regionName, sleep=self._sleeps.append)
+        self._emulator.addAccount(_targetAccountId, 'Application-1')
+        setEmulator(self._emulator)
+
+    def tearDown(self):
+        setEmulator(None)
+        setRetryPolicy(self._exPolicy)
+        getRateLimiter().configure({})
+
+    def test_identity(self):
+        profile = Profile()
+        self.assertEqual(profile.accountId, _managementAccountId)
+        targetProfile = profile.assumeRole(_targetAccountId, 'NZISM-Remediation', _regionName, 'unittest')
+        self.assertEqual(targetProfile.accountId, _targetAccountId)
+        identity = targetProfile.getClient('sts').get_caller_identity()
+        self.assertEqual(identity['Arn'], "arn:aws:sts::{}:assumed-role/NZISM-Remediation/unittest".format(_targetAccountId))
+        with self.assertRaises(RdqError):
+            profile.assumeRole('333333333333', 'NZISM-Remediation', _regionName, 'unittest')
+        accountIds = [a.accountId for a in OrganizationClient(profile).listAccountDescriptors()]
+        self.assertEqual(accountIds, [_managementAccountId, _targetAccountId])
+
+    def test_kms_idempotent(self):
+        profile = Profile()
+        kmsc = KmsClient(profile)
+        self.assertIsNone(kmsc.getCMKByAlias('cwlog'))
+        cmkArn = kmsc.declareCMKArn('For unittest', 'cwlog', [], Tags({'A': 'B'}))
+        self.assertEqual(kmsc.getCMKByAlias('cwlog')['Arn'], cmkArn)
+        calls = self._emulator.getCounters()['kms:CreateKey']['Calls']
+        self.assertEqual(kmsc.declareCMKArn('For unittest', 'cwlog', [], Tags({'A': 'B'})), cmkArn)
+        self.assertEqual(self._emulator.getCounters()['kms:CreateKey']['Calls'], calls)
+
+    def test_rule_invoke(self):
+        self._emulator.registerFunctionModule('ApplyS3BPA', os.path.join(_rulesFolder, 'ApplyS3BPA', 'lambda_function.py'))
+        profile = Profile()
+        event = _rule_event('s3-account-level-public-access-blocks-periodic', 'AWS::::Account', _targetAccountId)
+        response = LambdaClient(profile).invokeFunctionJson('ApplyS3BPA', event)
+        self.assertEqual(response['Payload']['minor'], 'Applied')
+        targetProfile = profile.assumeRole(_targetAccountId, 'NZISM-Remediation', _regionName, 'unittest')
+        publicAccessBlock = S3ControlClient(targetProfile).get_public_access_block(_targetAccountId)
+        self.assertTrue(all(publicAccessBlock.values()))
+        response = LambdaClient(profile).invokeFunctionJson('ApplyS3BPA', event)
+        self.assertEqual(response['Payload']['minor'], 'Validated')
+
+    def test_rule_stack(self):
+        module = self._emulator.registerFunctionModule('EncryptCWL', os.path.join(_rulesFolder, 'EncryptCWL', 'lambda_function.py'))
+        self._emulator.service('logs').createLogGroup(_targetAccountId, _regionName, '/unittest/app')
+        event = _rule_event('cloudwatch-log-group-encrypted', 'AWS::Logs::LogGroup', '/unittest/app', {'CreateStack': True, 'StackMaxSecs': 5})
+        response = module.lambda_handler(event, None)
+        self.assertEqual(response['minor'], 'Applied')
+        targetProfile = Profile().assumeRole(_targetAccountId, 'NZISM-Remediation', _regionName, 'unittest')
+        descriptor = CwlClient(targetProfile).getLogGroupDescriptor('/unittest/app')
+        self.assertEqual(descriptor.kmsArn, KmsClient(targetProfile).getCMKByAlias('cwlog')['Arn'])
+        self.assertEqual(self._emulator.getCounters()['cloudformation:CreateStack']['Calls'], 1)
+
+    def test_throttling(self):
+        getRateLimiter().configure({'kms:*': {'Rate': 1000}})
+        exThrottles = getRateLimiter().getCounters()['Throttles']
+        profile = Profile()
+        self._emulator.injectFaults('kms', 'DescribeKey', throttleCount=3)
+        self.assertIsNone(KmsClient(profile).getCMKByAlias('cwlog'))
+        self.assertEqual(getRetryPolicy().getCounters()['Throttles'], 3)
+        self.assertEqual(getRateLimiter().getCounters()['Throttles'] - exThrottles, 3)
+        counters = self._emulator.getCounters()['kms:DescribeKey']
+        self.assertEqual((counters['Calls'], counters['Throttles']), (4, 3))
+        self.assertEqual(len(self._sleeps), 3)
+        self._emulator.clearFaults()
+        self._emulator.injectFaults('kms', throttleFraction=1.0)
+        with self.assertRaises(RdqError):
+            KmsClient(profile).getCMKByAlias('cwlog')
+
+    def test_latency(self):
+        profile = Profile()
+        self._emulator.injectFaults('logs', latencySecs=0.05, jitterSecs=0.01)
+        CwlClient(profile).getLogGroupDescriptor('/unittest/none')
+        self.assertEqual(len(self._sleeps), 1)
+        self.assertTrue(0.05 <= self._sleeps[0] <= 0.06)
+        self._emulator.clearFaults()
+        CwlClient(profile).getLogGroupDescriptor('/unittest/none')
+        self.assertEqual(len(self._sleeps), 1)
+
+
+if __name__ == '__main__':
+    initLogging(None, 'INFO')
+    loader = unittest.TestLoader()
+    loader.testMethodPrefix = "test_"
+    unittest.main(warnings='default', testLoader = loader)
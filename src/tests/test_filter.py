@@ -0,0 +1,64 @@
+import unittest
+import re
+
+from lib.base import initLogging
+from lib.lambdas.core.filter import PatternSet, ResourceIdFilter, acceptResourceId, clearResourceIdFilters
+
+
+def _naive_matches(patterns, value):
+    for pattern in patterns:
+        if re.fullmatch(pattern, value): return True
+    return False
+
+
+class TestFilter(unittest.TestCase):
+    def setUp(self):
+        clearResourceIdFilters()
+
+    def test_pattern_set(self):
+        patterns = [
+            '/aws/lambda/app1',
+            '/aws/lambda/team-a.*',
+            '/aws/lambda/team-ab.*',
+            '.*aws-controltower.*',
+            '/aws/rds/[a-z]+-prod',
+            '(?i)/AWS/CODEBUILD/.*',
+            r'(x)\1-dup'
+        ]
+        values = [
+            '/aws/lambda/app1', '/aws/lambda/app12', '/aws/lambda/team-a', '/aws/lambda/team-abc/x',
+            '/aws/lambda/team-b', '/aws/lambda/aws-controltower-Forwarder', '/aws/rds/db-prod', '/aws/rds/db1-prod',
+            '/aws/codebuild/p1', 'xx-dup', 'x-dup', ''
+        ]
+        ps = PatternSet(patterns)
+        for value in values:
+            self.assertEqual(ps.matches(value), _naive_matches(patterns, value), value)
+
+    def test_many_exclusions(self):
+        excluded = ["/aws/lambda/svc{}-.*".format(i) for i in range(500)]
+        excluded.extend(["/aws/lambda/exact{}".format(i) for i in range(500)])
+        excluded.append("/aws/lambda/[0-9]+")
+        rf = ResourceIdFilter(None, excluded)
+        self.assertFalse(rf.accept('/aws/lambda/svc499-worker'))
+        self.assertFalse(rf.accept('/aws/lambda/exact7'))
+        self.assertFalse(rf.accept('/aws/lambda/12345'))
+        self.assertTrue(rf.accept('/aws/lambda/exact7b'))
+        self.assertTrue(rf.accept('/aws/lambda/svc500-worker'))
+        self.assertFalse(rf.accept(''))
+
+    def test_included(self):
+        rf = ResourceIdFilter('/aws/lambda/.*', '/aws/lambda/skip')
+        self.assertTrue(rf.accept('/aws/lambda/app1'))
+        self.assertFalse(rf.accept('/aws/lambda/skip'))
+        self.assertFalse(rf.accept('/aws/rds/db1'))
+
+    def test_rule_config(self):
+        self.assertFalse(acceptResourceId('cloudwatch-log-group-encrypted', 'remediate', 'a1', '/aws/lambda/aws-controltower-x'))
+        self.assertTrue(acceptResourceId('cloudwatch-log-group-encrypted', 'remediate', 'a1', '/aws/lambda/app1'))
+
+
+if __name__ == '__main__':
+    initLogging(None, 'INFO')
+    loader = unittest.TestLoader()
+    loader.testMethodPrefix = "test_"
+    unittest.main(warnings='default', testLoader = loader)
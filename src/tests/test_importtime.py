@@ -0,0 +1,78 @@
+import unittest
+import os
+import sys
+import logging
+import statistics
+import subprocess
+
+from lib.base import initLogging
+
+# Cumulative import time of each Lambda entry point module, measured with `python -X importtime`; checked when RDQBENCHMARK is set
+_BaselineMs = {
+    'core/ComplianceDispatcher': 60,
+    'rules/EncryptCWL': 45,
+    'rules/ApplyS3BPA': 45
+}
+_RegressionRatio = 2.0
+_Runs = 5
+
+# Modules that must only be imported when the handler first needs them
+_DeferredModules = ['boto3', 'botocore.session', 'botocore.config', 'botocore.client', 'urllib3', 'cProfile', 'pstats', 'tracemalloc']
+
+def _src_home():
+    return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def measure_import(entryPoint):
+    srcHome = _src_home()
+    lambdaPath = os.path.join(srcHome, 'lambdas', entryPoint)
+    code = "import sys; sys.path.insert(0, {}); import lambda_function".format(repr(lambdaPath))
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=srcHome, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+    if result.returncode != 0:
+        raise AssertionError("Import of {} failed: {}".format(entryPoint, result.stderr[-2000:]))
+    cumulativeMs = None
+    modules = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:'): continue
+        parts = line[len('import time:'):].split('|')
+        if len(parts) != 3: continue
+        moduleName = parts[2].strip()
+        modules.add(moduleName)
+        if moduleName == 'lambda_function':
+            cumulativeMs = int(parts[1]) / 1000.0
+    return (cumulativeMs, modules)
+
+def benchmark(entryPoint, runs=_Runs):
+    measure_import(entryPoint)
+    samples = []
+    modules = set()
+    for i in range(runs):
+        (cumulativeMs, modules) = measure_import(entryPoint)
+        samples.append(cumulativeMs)
+    return (statistics.median(samples), modules)
+
+
+class TestImportTime(unittest.TestCase):
+    def test_deferred_modules(self):
+        for entryPoint in sorted(_BaselineMs.keys()):
+            (cumulativeMs, modules) = measure_import(entryPoint)
+            self.assertIn('lambda_function', modules)
+            eager = [m for m in _DeferredModules if m in modules]
+            self.assertEqual(eager, [], "{} imports deferred modules at cold start".format(entryPoint))
+
+    @unittest.skipUnless(os.environ.get('RDQBENCHMARK'), "Set RDQBENCHMARK to compare import time with the reference build")
+    def test_entry_points(self):
+        regressions = []
+        for entryPoint in sorted(_BaselineMs.keys()):
+            (medianMs, modules) = benchmark(entryPoint)
+            baselineMs = _BaselineMs[entryPoint]
+            logging.info("Import time | EntryPoint: %s | MedianMs: %.1f | BaselineMs: %d", entryPoint, medianMs, baselineMs)
+            if medianMs > baselineMs * _RegressionRatio:
+                regressions.append("{} {:.1f}ms > {}ms x {}".format(entryPoint, medianMs, baselineMs, _RegressionRatio))
+        self.assertEqual(regressions, [])
+
+
+if __name__ == '__main__':
+    initLogging(None, 'INFO')
+    loader = unittest.TestLoader()
+    loader.testMethodPrefix = "test_"
+    unittest.main(warnings='default', testLoader = loader)
@@ -0,0 +1,113 @@
+import unittest
+import io
+import json
+import threading
+import http.server
+import boto3
+
+from lib.base import initLogging
+from lib.rdq import Profile, RdqError
+from lib.rdq.base import RetryPolicy, getRetryPolicy, setRetryPolicy
+from lib.rdq.instrument import ApiStatsRegistry, FormatEmf
+from lib.rdq.svckms import KmsClient
+from lib.rdq.svclambda import LambdaClient
+from tests.util_botocore import HttpStub, stubProfile, stubIdentity, throttlingResponse, describeKeyResponse
+
+_NotFound = (400, {'__type': 'NotFoundException', 'message': 'Missing'})
+
+class _InvokeHandler(http.server.BaseHTTPRequestHandler):
+    def do_POST(self):
+        request = self.rfile.read(int(self.headers['Content-Length']))
+        body = json.dumps({'echo': json.loads(request), 'padding': 'x' * 32}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('X-Amz-Executed-Version', '$LATEST')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class _EndpointSession:
+    def __init__(self, endpointUrl):
+        self._endpointUrl = endpointUrl
+        self._session = boto3.Session(region_name='ap-southeast-2', aws_access_key_id='AKIASTUB', aws_secret_access_key='secret')
+        self.region_name = self._session.region_name
+        self.profile_name = 'default'
+
+    def client(self, serviceName, config=None):
+        return self._session.client(serviceName, config=config, endpoint_url=self._endpointUrl)
+
+    def get_credentials(self):
+        return self._session.get_credentials()
+
+
+class TestInstrument(unittest.TestCase):
+    def setUp(self):
+        self._exPolicy = getRetryPolicy()
+        setRetryPolicy(RetryPolicy(baseSecs=0.001, capSecs=0.01))
+
+    def tearDown(self):
+        setRetryPolicy(self._exPolicy)
+
+    def test_record(self):
+        apiStats = ApiStatsRegistry()
+        httpStub = HttpStub([throttlingResponse(), describeKeyResponse(), describeKeyResponse(), _NotFound])
+        kms = KmsClient(stubProfile(httpStub, 'kms', apiStats))
+        kms.describe_key('alias/k1')
+        kms.describe_key('alias/k1')
+        self.assertIsNone(kms.describe_key('alias/k2'))
+        stats = apiStats.toDict()['kms:DescribeKey']
+        self.assertEqual(stats['Calls'], 3)
+        self.assertEqual(stats['Retries'], 1)
+        self.assertEqual(stats['Errors'], 1)
+        self.assertEqual(stats['ErrorCodes'], {'NotFoundException': 1})
+        self.assertGreater(stats['RequestBytes'], 0)
+        self.assertGreater(stats['ResponseBytes'], 0)
+        self.assertEqual(sum(stats['LatencyMs'].values()), 3)
+
+    def test_dump(self):
+        apiStats = ApiStatsRegistry()
+        apiStats.record('kms', 'GetKeyPolicy', 12.0, 0, 100, 900)
+        apiStats.record('kms', 'GetKeyPolicy', 30.0, 1, 100, 900)
+        apiStats.record('kms', 'ListResourceTags', 3.0, 0, 50, 80, 'AccessDeniedException')
+        stream = io.StringIO()
+        apiStats.dump(FormatEmf, 'NZISM-operations', {'Function': 'f1'}, stream)
+        docs = [json.loads(line) for line in stream.getvalue().splitlines()]
+        self.assertEqual(len(docs), 2)
+        doc = [d for d in docs if d['Operation'] == 'GetKeyPolicy'][0]
+        self.assertEqual(doc['ApiLatency'], {'Values': [25, 50], 'Counts': [1, 1]})
+        self.assertEqual(doc['ApiRetries'], 1)
+        self.assertEqual(doc['Function'], 'f1')
+        self.assertEqual(doc['_aws']['CloudWatchMetrics'][0]['Dimensions'], [['Function', 'Service', 'Operation']])
+        self.assertTrue(apiStats.isEmpty())
+        with self.assertLogs(level='INFO') as logs:
+            apiStats.record('kms', 'GetKeyPolicy', 12.0, 0, 100, 900)
+            apiStats.dump()
+        self.assertIn('ApiStats', logs.output[0])
+
+    def test_streaming_output(self):
+        server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), _InvokeHandler)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            apiStats = ApiStatsRegistry()
+            endpointUrl = "http://127.0.0.1:{}".format(server.server_address[1])
+            profile = Profile(_EndpointSession(endpointUrl), identity=stubIdentity(), apiStats=apiStats)
+            response = LambdaClient(profile).invokeFunctionJson('f1', {'resourceId': 'r1'})
+            self.assertEqual(response['StatusCode'], 200)
+            self.assertEqual(response['Payload']['echo'], {'resourceId': 'r1'})
+            stats = apiStats.toDict()['lambda:Invoke']
+            self.assertEqual(stats['Calls'], 1)
+            self.assertEqual(stats['ResponseBytes'], len(json.dumps(response['Payload']).encode('utf-8')))
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == '__main__':
+    initLogging(None, 'INFO')
+    loader = unittest.TestLoader()
+    loader.testMethodPrefix = "test_"
+    unittest.main(warnings='default', testLoader = loader)
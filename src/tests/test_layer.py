@@ -0,0 +1,78 @@
+import unittest
+import os
+import io
+import tempfile
+from zipfile import ZipFile
+
+from lib.base import initLogging
+from lib.rdq.svclambda import LambdaClient, _codeSha256
+import cmds.codeLoader as codeLoader
+
+from tests.util_botocore import HttpStub, stubProfile
+
+
+def _layerVersion(version, description):
+    return {
+        'LayerVersionArn': "arn:aws:lambda:ap-southeast-2:111111111111:layer:NZISM-Core-Library:{}".format(version),
+        'Version': version,
+        'Description': description,
+        'CompatibleRuntimes': ['python3.8']
+    }
+
+
+class TestLayer(unittest.TestCase):
+    def test_layer_code(self):
+        savedCwd = os.getcwd()
+        savedCache = codeLoader.getBuildCache()
+        with tempfile.TemporaryDirectory() as folder:
+            for lib in ['base', 'rdq', 'rule', 'cfn', 'lambdas']:
+                os.makedirs(os.path.join(folder, 'src', 'lib', lib, '__pycache__'))
+                with open(os.path.join(folder, 'src', 'lib', lib, '__init__.py'), 'w') as f:
+                    f.write("NAME = '{}'\n".format(lib))
+            os.makedirs(os.path.join(folder, 'src', 'lambdas', 'rules', 'R1'))
+            with open(os.path.join(folder, 'src', 'lambdas', 'rules', 'R1', 'lambda_function.py'), 'w') as f:
+                f.write("import lib.rule\n")
+            try:
+                os.chdir(folder)
+                codeLoader.setBuildCache(codeLoader.BuildCache(os.path.join(folder, 'cache')))
+                layerZip = codeLoader.getLayerCode('L1')
+                ruleZip = codeLoader.getRuleCode('R1')
+            finally:
+                os.chdir(savedCwd)
+                codeLoader.setBuildCache(savedCache)
+        with ZipFile(io.BytesIO(layerZip)) as zip:
+            self.assertEqual(zip.namelist(), [
+                './python/lib/base/__init__.py',
+                './python/lib/cfn/__init__.py',
+                './python/lib/lambdas/__init__.py',
+                './python/lib/rdq/__init__.py',
+                './python/lib/rule/__init__.py'
+            ])
+        with ZipFile(io.BytesIO(ruleZip)) as zip:
+            self.assertEqual(zip.namelist(), ['./lambda_function.py'])
+
+    def test_declare_unchanged(self):
+        codeZip = b'layer'
+        description = "Libs | CodeSha256 {}".format(_codeSha256(codeZip))
+        httpStub = HttpStub([(200, {'LayerVersions': [_layerVersion(3, "Libs | CodeSha256 other"), _layerVersion(2, description)]})])
+        client = LambdaClient(stubProfile(httpStub, 'lambda'))
+        layerVersionArn = client.declareLayerVersionArn('NZISM-Core-Library', 'Libs', ['python3.8'], codeZip)
+        self.assertTrue(layerVersionArn.endswith(':2'))
+        self.assertEqual(httpStub.sendCount, 1)
+
+    def test_declare_changed(self):
+        httpStub = HttpStub([
+            (200, {'LayerVersions': [_layerVersion(1, "Libs | CodeSha256 other")]}),
+            (201, _layerVersion(2, "Libs | CodeSha256 new"))
+        ])
+        client = LambdaClient(stubProfile(httpStub, 'lambda'))
+        layerVersionArn = client.declareLayerVersionArn('NZISM-Core-Library', 'Libs', ['python3.8'], b'layer')
+        self.assertTrue(layerVersionArn.endswith(':2'))
+        self.assertEqual(httpStub.sendCount, 2)
+
+
+if __name__ == '__main__':
+    initLogging(None, 'INFO')
+    loader = unittest.TestLoader()
+    loader.testMethodPrefix = "test_"
+    unittest.main(warnings='default', testLoader = loader)
@@ -0,0 +1,88 @@
+import unittest
+import io
+import json
+
+from lib.base import initLogging
+from lib.rdq.svccwm import CwmClient
+from lib.lambdas.core.metrics import EmfWriter
+
+
+class _CloudWatchStub:
+    def __init__(self):
+        self.calls = []
+
+    def put_metric_data(self, Namespace, MetricData):
+        self.calls.append({'Namespace': Namespace, 'MetricData': MetricData})
+
+class _ProfileStub:
+    def __init__(self, cloudWatchStub):
+        self.accountId = '111111111111'
+        self.sessionName = 'Stub'
+        self._cloudWatchStub = cloudWatchStub
+
+    def getClient(self, serviceName):
+        return self._cloudWatchStub
+
+
+class TestMetrics(unittest.TestCase):
+    def test_aggregate(self):
+        stub = _CloudWatchStub()
+        cwm = CwmClient(_ProfileStub(stub))
+        for i in range(3):
+            cwm.addCount('NZISM-remediate', 'Success.Applied', {'ConfigRule': 'c1', 'AccountName': 'a1'})
+            cwm.addCount('NZISM-remediate', 'Success.Applied', {'AccountName': 'a1', 'ConfigRule': 'c1'})
+        cwm.addCount('NZISM-remediate', 'Success.Applied', {'ConfigRule': 'c2'})
+        cwm.addCount('NZISM-baseline', 'Failure.RdqApi', {'ConfigRule': 'c2'})
+        self.assertEqual(len(stub.calls), 0)
+        self.assertEqual(cwm.pendingCount(), 3)
+        self.assertEqual(cwm.flushCounts(), 3)
+        self.assertEqual(len(stub.calls), 2)
+        remediate = [c for c in stub.calls if c['Namespace'] == 'NZISM-remediate'][0]
+        self.assertEqual(len(remediate['MetricData']), 2)
+        stats = remediate['MetricData'][0]['StatisticValues']
+        self.assertEqual(stats['SampleCount'], 6)
+        self.assertEqual(stats['Sum'], 6.0)
+        self.assertEqual(cwm.flushCounts(), 0)
+
+    def test_size_threshold(self):
+        stub = _CloudWatchStub()
+        cwm = CwmClient(_ProfileStub(stub), maxPendingData=10)
+        for i in range(25):
+            cwm.addCount('NZISM-remediate', 'Success.Applied', {'ConfigRule': "c{}".format(i)})
+        self.assertEqual(len(stub.calls), 2)
+        self.assertEqual(cwm.pendingCount(), 5)
+
+    def test_age_threshold(self):
+        stub = _CloudWatchStub()
+        cwm = CwmClient(_ProfileStub(stub), maxPendingSecs=0)
+        cwm.addCount('NZISM-remediate', 'Success.Applied', {'ConfigRule': 'c1'})
+        self.assertEqual(len(stub.calls), 1)
+        self.assertEqual(cwm.pendingCount(), 0)
+
+    def test_emf(self):
+        stream = io.StringIO()
+        emf = EmfWriter(stream)
+        for i in range(3):
+            emf.addCount('NZISM-remediate', 'Success.Applied', {'ConfigRule': 'c1', 'AccountName': 'a1'})
+        emf.addCount('NZISM-remediate', 'Failure.RdqApi', {'AccountName': 'a1', 'ConfigRule': 'c1'})
+        emf.addCount('NZISM-remediate', 'Success.Applied', {'ConfigRule': 'c2'})
+        self.assertEqual(stream.getvalue(), '')
+        self.assertEqual(emf.flushCounts(), 2)
+        docs = [json.loads(line) for line in stream.getvalue().splitlines()]
+        self.assertEqual(len(docs), 2)
+        doc = [d for d in docs if d['ConfigRule'] == 'c1'][0]
+        directive = doc['_aws']['CloudWatchMetrics'][0]
+        self.assertEqual(directive['Namespace'], 'NZISM-remediate')
+        self.assertEqual(directive['Dimensions'], [['AccountName', 'ConfigRule']])
+        self.assertEqual([m['Name'] for m in directive['Metrics']], ['Success.Applied', 'Failure.RdqApi'])
+        self.assertEqual(doc['AccountName'], 'a1')
+        self.assertEqual(doc['Success.Applied'], [1.0, 1.0, 1.0])
+        self.assertEqual(doc['Failure.RdqApi'], 1.0)
+        self.assertEqual(emf.flushCounts(), 0)
+
+
+if __name__ == '__main__':
+    initLogging(None, 'INFO')
+    loader = unittest.TestLoader()
+    loader.testMethodPrefix = "test_"
+    unittest.main(warnings='default', testLoader = loader)
@@ -0,0 +1,176 @@
+import unittest
+import time
+import datetime
+import threading
+import boto3
+from unittest import mock
+
+from lib.base import initLogging
+import lib.rdq as rdq
+from lib.rdq import Profile, clearAssumedRoleCache, createClientConfig, getSourceProfile, setEmulator
+from lib.rdq.emulator import AwsEmulator
+
+
+class _EventsStub:
+    def register(self, eventName, handler):
+        pass
+
+class _ServiceModelStub:
+    def __init__(self, endpointPrefix):
+        self.endpoint_prefix = endpointPrefix
+
+class _MetaStub:
+    def __init__(self):
+        self.events = _EventsStub()
+        self.service_model = _ServiceModelStub('sts')
+        self.region_name = 'ap-southeast-2'
+
+class _StsStub:
+    def __init__(self, expiresInSecs=3600, assumeSecs=0):
+        self.meta = _MetaStub()
+        self.expiresInSecs = expiresInSecs
+        self.assumeSecs = assumeSecs
+        self.assumeCount = 0
+        self.identityCount = 0
+
+    def get_caller_identity(self):
+        self.identityCount += 1
+        return {'UserId': 'AIDSTUB', 'Account': '111111111111', 'Arn': 'arn:aws:iam::111111111111:user/stub'}
+
+    def assume_role(self, RoleArn, RoleSessionName, DurationSeconds):
+        self.assumeCount += 1
+        time.sleep(self.assumeSecs)
+        expiration = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(seconds=self.expiresInSecs)
+        return {
+            'Credentials': {
+                'AccessKeyId': "AKIASTUB{}".format(self.assumeCount),
+                'SecretAccessKey': 'secret',
+                'SessionToken': 'token',
+                'Expiration': expiration
+            },
+            'AssumedRoleUser': {
+                'AssumedRoleId': "AROASTUB:{}".format(RoleSessionName),
+                'Arn': "{}/{}".format(RoleArn.replace(':iam:', ':sts:').replace(':role/', ':assumed-role/'), RoleSessionName)
+            }
+        }
+
+class _SessionStub:
+    def __init__(self, stsStub):
+        self.region_name = 'ap-southeast-2'
+        self.profile_name = 'default'
+        self._stsStub = stsStub
+
+        self.clientCount = 0
+
+    def client(self, serviceName, config=None):
+        self.clientCount += 1
+        return self._stsStub if serviceName == 'sts' else None
+
+
+class TestProfile(unittest.TestCase):
+    def setUp(self):
+        clearAssumedRoleCache()
+
+    def test_assume_role_cached(self):
+        sts = _StsStub()
+        fromProfile = Profile(_SessionStub(sts))
+        self.assertEqual(sts.identityCount, 1)
+        p1 = fromProfile.assumeRole('222222222222', 'Remediation', 'ap-southeast-2', 'remediate-r1')
+        self.assertEqual(p1.accountId, '222222222222')
+        self.assertEqual(p1.regionName, 'ap-southeast-2')
+        self.assertEqual(sts.assumeCount, 1)
+        self.assertEqual(sts.identityCount, 1)
+        p2 = Profile(_SessionStub(sts)).assumeRole('222222222222', 'Remediation', 'ap-southeast-2', 'remediate-r1')
+        self.assertIs(p1, p2)
+        self.assertEqual(sts.assumeCount, 1)
+        fromProfile.assumeRole('333333333333', 'Remediation', 'ap-southeast-2', 'remediate-r1')
+        self.assertEqual(sts.assumeCount, 2)
+        self.assertFalse(p1.credentialsExpiring())
+
+    def test_refresh_before_expiry(self):
+        sts = _StsStub(expiresInSecs=60)
+        p1 = Profile(_SessionStub(sts)).assumeRole('222222222222', 'Remediation', 'ap-southeast-2', 'remediate-r1')
+        self.assertTrue(p1.credentialsExpiring())
+        frozen = p1._session.get_credentials().get_frozen_credentials()
+        self.assertEqual(sts.assumeCount, 2)
+        self.assertEqual(frozen.access_key, 'AKIASTUB2')
+
+    def test_assume_role_key(self):
+        sts = _StsStub()
+        fromProfile = Profile(_SessionStub(sts))
+        p1 = fromProfile.assumeRole('222222222222', 'Remediation', 'ap-southeast-2', 'remediate-r1')
+        p2 = fromProfile.assumeRole('222222222222', 'Remediation', 'ap-southeast-2', 'remediate-r1', durationSecs=900)
+        self.assertIsNot(p1, p2)
+        self.assertEqual(sts.assumeCount, 2)
+        with mock.patch.object(rdq, '_AssumedRoleMaxProfiles', 2):
+            fromProfile.assumeRole('333333333333', 'Remediation', 'ap-southeast-2', 'remediate-r1')
+            self.assertIs(fromProfile.assumeRole('222222222222', 'Remediation', 'ap-southeast-2', 'remediate-r1', durationSecs=900), p2)
+            self.assertIsNot(fromProfile.assumeRole('222222222222', 'Remediation', 'ap-southeast-2', 'remediate-r1'), p1)
+        self.assertEqual(sts.assumeCount, 4)
+
+    def test_refresh_through_current_source(self):
+        sts1 = _StsStub(expiresInSecs=60)
+        sts2 = _StsStub(expiresInSecs=60)
+        sources = [Profile(_SessionStub(sts1))]
+        fromProfile = Profile(_SessionStub(sts1), sourceFactory=lambda: sources[0])
+        p1 = fromProfile.assumeRole('222222222222', 'Remediation', 'ap-southeast-2', 'remediate-r1')
+        sources[0] = Profile(_SessionStub(sts2))
+        assumeCount = sts1.assumeCount
+        p1._session.get_credentials().get_frozen_credentials()
+        self.assertEqual(sts1.assumeCount, assumeCount)
+        self.assertEqual(sts2.assumeCount, 1)
+
+    def test_assume_role_concurrent(self):
+        sts = _StsStub(assumeSecs=0.2)
+        fromProfile = Profile(_SessionStub(sts))
+        accountIds = ['222222222222', '333333333333', '444444444444', '222222222222']
+        profiles = {}
+        def assume(position, accountId):
+            profiles[position] = fromProfile.assumeRole(accountId, 'Remediation', 'ap-southeast-2', 'remediate-r1')
+        threads = [threading.Thread(target=assume, args=(i, a)) for (i, a) in enumerate(accountIds)]
+        startedAt = time.time()
+        for thread in threads: thread.start()
+        for thread in threads: thread.join()
+        self.assertLess(time.time() - startedAt, 0.2 * 2)
+        self.assertEqual(sts.assumeCount, 3)
+        self.assertIs(profiles[0], profiles[3])
+
+    def test_source_profile_cached(self):
+        emulator = AwsEmulator()
+        setEmulator(emulator)
+        try:
+            p1 = getSourceProfile('ap-southeast-2')
+            p2 = getSourceProfile('ap-southeast-2')
+            self.assertIs(p1, p2)
+            self.assertEqual(emulator.getCounters()['sts:GetCallerIdentity']['Calls'], 1)
+            self.assertIsNot(getSourceProfile('ap-southeast-2', maxAgeSecs=0), p1)
+            self.assertEqual(emulator.getCounters()['sts:GetCallerIdentity']['Calls'], 2)
+        finally:
+            setEmulator(None)
+
+    def test_client_cache(self):
+        session = _SessionStub(_StsStub())
+        profile = Profile(session)
+        self.assertEqual(session.clientCount, 1)
+        self.assertIs(profile.getClient('sts'), profile.getClient('sts'))
+        self.assertEqual(session.clientCount, 1)
+        identity = {'UserId': 'AIDSTUB', 'Account': '111111111111', 'Arn': 'arn:aws:iam::111111111111:user/stub'}
+        lazySession = _SessionStub(_StsStub())
+        lazyProfile = Profile(lazySession, identity=identity)
+        self.assertEqual(lazySession.clientCount, 0)
+        self.assertEqual(lazyProfile.accountId, '111111111111')
+
+    def test_client_config(self):
+        identity = {'UserId': 'AIDSTUB', 'Account': '111111111111', 'Arn': 'arn:aws:iam::111111111111:user/stub'}
+        profile = Profile(boto3.Session(region_name='ap-southeast-2'), identity=identity, clientConfig=createClientConfig(maxPoolConnections=7, readTimeoutSecs=5))
+        client = profile.getClient('lambda')
+        self.assertIs(client, profile.getClient('lambda'))
+        self.assertEqual(client.meta.config.max_pool_connections, 7)
+        self.assertEqual(client.meta.config.read_timeout, 5)
+
+
+if __name__ == '__main__':
+    initLogging(None, 'INFO')
+    loader = unittest.TestLoader()
+    loader.testMethodPrefix = "test_"
+    unittest.main(warnings='default', testLoader = loader)
@@ -0,0 +1,87 @@
+import unittest
+import os
+import json
+import pstats
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from lib.base import initLogging
+from lib.base.profiling import Profiler, FileProfileSink, getProfiler, initProfiling
+
+
+def _workload(n):
+    return sorted([str(i) * 4 for i in range(n)])
+
+
+class TestProfiling(unittest.TestCase):
+    def test_unsampled(self):
+        with tempfile.TemporaryDirectory() as folder:
+            profiler = Profiler(sampleRate=0.5, folder=folder, randomSource=lambda: 0.9)
+            self.assertEqual(len(profiler.call('unsampled', _workload, 10)), 10)
+            self.assertEqual(os.listdir(folder), [])
+
+    def test_capture(self):
+        with tempfile.TemporaryDirectory() as folder:
+            captureFolder = os.path.join(folder, 'tmp')
+            sinkFolder = os.path.join(folder, 'sink')
+            profiler = Profiler(sampleRate=0.5, topN=3, folder=captureFolder, sink=FileProfileSink(sinkFolder), randomSource=lambda: 0.1)
+            with self.assertLogs(level='INFO') as logs:
+                result = profiler.call('unittest', _workload, 5000)
+            self.assertEqual(len(result), 5000)
+            self.assertIn('InvocationProfile', logs.output[-1])
+            captures = sorted(os.listdir(captureFolder))
+            self.assertEqual(len(captures), 2)
+            self.assertEqual(captures, sorted(os.listdir(sinkFolder)))
+            summaryPath = [c for c in captures if c.endswith('.json')][0]
+            with open(os.path.join(sinkFolder, summaryPath)) as f:
+                summary = json.load(f)
+            self.assertEqual(len(summary['TopFunctions']), 3)
+            self.assertTrue(any('_workload' in t['Function'] for t in summary['TopFunctions']))
+            self.assertGreater(summary['PeakMemoryKiB'], 0)
+            self.assertLessEqual(len(summary['TopAllocations']), 3)
+            statsPath = [c for c in captures if c.endswith('.pstats')][0]
+            stats = pstats.Stats(os.path.join(captureFolder, statsPath))
+            self.assertGreater(stats.total_calls, 0)
+
+    def test_worker_threads(self):
+        with tempfile.TemporaryDirectory() as folder:
+            profiler = Profiler(sampleRate=1.0, memory=False, folder=folder)
+            def fanout():
+                with ThreadPoolExecutor(max_workers=3) as executor:
+                    futures = [executor.submit(profiler.worker, _workload, 2000) for i in range(3)]
+                    return [len(f.result()) for f in futures]
+            with self.assertLogs(level='INFO') as logs:
+                self.assertEqual(profiler.call('fanout', fanout), [2000, 2000, 2000])
+            self.assertIn("'WorkerProfiles': 3", logs.output[-1])
+            statsPath = [c for c in os.listdir(folder) if c.endswith('.pstats')][0]
+            stats = pstats.Stats(os.path.join(folder, statsPath))
+            workloadCalls = [v[1] for (fn, v) in stats.stats.items() if fn[2] == '_workload']
+            self.assertEqual(workloadCalls, [3])
+            self.assertEqual(profiler.worker(_workload, 2), ['0000', '1111'])
+
+    def test_failure_propagates(self):
+        def failing():
+            raise ValueError('x')
+        with tempfile.TemporaryDirectory() as folder:
+            profiler = Profiler(sampleRate=1.0, memory=False, folder=folder)
+            with self.assertRaises(ValueError):
+                profiler.call('failing', failing)
+            self.assertEqual(len(os.listdir(folder)), 2)
+            self.assertEqual(profiler.call('again', _workload, 3), ['0000', '1111', '2222'])
+
+    def test_init(self):
+        os.environ['RDQPROFILE'] = json.dumps({'SampleRate': 0.25, 'TopN': 3})
+        try:
+            initProfiling('RDQPROFILE')
+            self.assertTrue(getProfiler().enabled)
+        finally:
+            del os.environ['RDQPROFILE']
+            getProfiler().configure(sampleRate=0.0)
+        self.assertFalse(getProfiler().enabled)
+
+
+if __name__ == '__main__':
+    initLogging(None, 'INFO')
+    loader = unittest.TestLoader()
+    loader.testMethodPrefix = "test_"
+    unittest.main(warnings='default', testLoader = loader)
@@ -0,0 +1,74 @@
+import unittest
+import time
+
+from lib.base import initLogging
+from lib.rdq.base import RetryPolicy, getRetryPolicy, setRetryPolicy
+from lib.rdq.ratelimit import TokenBucket, RateLimiter, getRateLimiter
+from lib.rdq.svckms import KmsClient
+from tests.util_botocore import HttpStub, stubProfile, throttlingResponse, describeKeyResponse
+
+
+def _kms(httpStub):
+    return KmsClient(stubProfile(httpStub, 'kms'))
+
+
+class TestRateLimit(unittest.TestCase):
+    def setUp(self):
+        self._exPolicy = getRetryPolicy()
+        setRetryPolicy(RetryPolicy(baseSecs=0.001, capSecs=0.01))
+
+    def tearDown(self):
+        setRetryPolicy(self._exPolicy)
+        getRateLimiter().configure({})
+
+    def test_bucket(self):
+        bucket = TokenBucket(20, 2)
+        startedAt = time.time()
+        for i in range(6):
+            bucket.acquire()
+        elapsedSecs = time.time() - startedAt
+        self.assertGreaterEqual(elapsedSecs, 0.18)
+        self.assertLess(elapsedSecs, 1.0)
+
+    def test_aimd(self):
+        bucket = TokenBucket(10, 1, minRate=1, increasePerSec=100, cooldownSecs=0)
+        bucket.onThrottle()
+        self.assertEqual(bucket.rate, 5)
+        bucket.onThrottle()
+        bucket.onThrottle()
+        bucket.onThrottle()
+        self.assertEqual(bucket.rate, 1)
+        time.sleep(0.05)
+        bucket.onSuccess()
+        self.assertGreater(bucket.rate, 1)
+        time.sleep(0.2)
+        bucket.onSuccess()
+        self.assertEqual(bucket.rate, 10)
+
+    def test_keyed(self):
+        limiter = RateLimiter({'kms:*': {'Rate': 5}, 'kms:CreateKey': {'Rate': 1}})
+        self.assertIs(limiter.get_bucket('kms', 'DescribeKey', 'a1', 'r1'), limiter.get_bucket('kms', 'DescribeKey', 'a1', 'r1'))
+        self.assertIsNot(limiter.get_bucket('kms', 'DescribeKey', 'a1', 'r1'), limiter.get_bucket('kms', 'DescribeKey', 'a2', 'r1'))
+        self.assertEqual(limiter.get_bucket('kms', 'CreateKey', 'a1', 'r1').rate, 1)
+        self.assertIsNone(limiter.get_bucket('logs', 'AssociateKmsKey', 'a1', 'r1'))
+
+    def test_client(self):
+        getRateLimiter().configure({'kms:DescribeKey': {'Rate': 20, 'Burst': 1, 'MinRate': 2}})
+        httpStub = HttpStub([throttlingResponse(), describeKeyResponse()])
+        kms = _kms(httpStub)
+        startedAt = time.time()
+        for i in range(4):
+            kms.describe_key('alias/k1')
+        elapsedSecs = time.time() - startedAt
+        self.assertEqual(httpStub.sendCount, 5)
+        counters = getRateLimiter().getCounters()
+        self.assertGreaterEqual(counters['Throttles'], 1)
+        self.assertGreaterEqual(counters['Waits'], 3)
+        self.assertGreaterEqual(elapsedSecs, 0.15)
+
+
+if __name__ == '__main__':
+    initLogging(None, 'INFO')
+    loader = unittest.TestLoader()
+    loader.testMethodPrefix = "test_"
+    unittest.main(warnings='default', testLoader = loader)
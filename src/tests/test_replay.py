@@ -0,0 +1,125 @@
+import unittest
+import os
+import gzip
+import tempfile
+
+from lib.base import initLogging
+from lib.rdq import Profile, RdqError, setEmulator, setTrafficRecorder
+from lib.rdq.base import RetryPolicy, getRetryPolicy, setRetryPolicy
+from lib.rdq.emulator import AwsEmulator
+from lib.rdq.replay import TrafficRecorder, TrafficReplayer, Redacted, createReplayer, loadRecording, flushRecording, encodeValue
+from lib.rdq.svccwl import CwlClient
+
+from tests.test_emulator import _rule_event, _rulesFolder, _targetAccountId, _regionName
+
+_configRuleName = 'cloudwatch-log-group-encrypted'
+_resourceType = 'AWS::Logs::LogGroup'
+
+def _log_group_page(names, nextToken=None):
+    page = {'logGroups': [{'logGroupName': name, 'arn': "arn:aws:logs:{}:{}:log-group:{}:*".format(_regionName, _targetAccountId, name)} for name in names]}
+    if nextToken: page['nextToken'] = nextToken
+    return page
+
+def _record(operation, params, response, latencyMs=10.0, service='logs'):
+    return {'Service': service, 'Operation': operation, 'AccountId': _targetAccountId, 'Region': _regionName, 'Params': params, 'Status': 200, 'Retries': 0, 'LatencyMs': latencyMs, 'Response': response}
+
+
+class TestReplay(unittest.TestCase):
+    def setUp(self):
+        self._exPolicy = getRetryPolicy()
+        setRetryPolicy(RetryPolicy(baseSecs=0.001, capSecs=0.01))
+        self._folder = tempfile.TemporaryDirectory()
+        self._path = os.path.join(self._folder.name, 'traffic.jsonl.gz')
+
+    def tearDown(self):
+        setEmulator(None)
+        setTrafficRecorder(None)
+        setRetryPolicy(self._exPolicy)
+        self._folder.cleanup()
+
+    def run_rule(self, emulator):
+        setEmulator(emulator)
+        module = emulator.registerFunctionModule('EncryptCWL', os.path.join(_rulesFolder, 'EncryptCWL', 'lambda_function.py'))
+        event = _rule_event(_configRuleName, _resourceType, '/unittest/app', {'CreateStack': True, 'StackMaxSecs': 5})
+        return module.lambda_handler(event, None)
+
+    def record_rule(self):
+        emulator = AwsEmulator(sleep=lambda secs: None)
+        emulator.addAccount(_targetAccountId)
+        emulator.service('logs').createLogGroup(_targetAccountId, _regionName, '/unittest/app')
+        setTrafficRecorder(TrafficRecorder(self._path))
+        response = self.run_rule(emulator)
+        setTrafficRecorder(None)
+        return response
+
+    def test_record(self):
+        response = self.record_rule()
+        self.assertEqual(response['minor'], 'Applied')
+        records = loadRecording(self._path)
+        operations = [(r['Service'], r['Operation']) for r in records]
+        self.assertIn(('sts', 'AssumeRole'), operations)
+        self.assertIn(('cloudformation', 'CreateStack'), operations)
+        self.assertIn(('logs', 'AssociateKmsKey'), operations)
+        assumeRole = [r for r in records if r['Operation'] == 'AssumeRole'][0]
+        credentials = assumeRole['Response']['Credentials']
+        self.assertEqual((credentials['SecretAccessKey'], credentials['SessionToken']), (Redacted, Redacted))
+        self.assertIn('$datetime', credentials['Expiration'])
+        describeKey = [r for r in records if r['Operation'] == 'DescribeKey']
+        self.assertEqual(describeKey[0]['Status'], 400)
+        self.assertEqual(describeKey[-1]['Status'], 200)
+        with gzip.open(self._path, 'rt') as f:
+            self.assertEqual(len(f.read().splitlines()), len(records))
+
+    def test_replay(self):
+        self.record_rule()
+        recordCount = len(loadRecording(self._path))
+        sleeps = []
+        replayer = createReplayer(self._path, latencyScale=2.0, sleep=sleeps.append)
+        response = self.run_rule(replayer)
+        self.assertEqual(response['minor'], 'Applied')
+        self.assertEqual(replayer.missing, [])
+        counters = replayer.getCounters()
+        self.assertEqual(sum([c['Calls'] for c in counters.values()]), recordCount)
+        recordedSecs = sum([r['LatencyMs'] for r in loadRecording(self._path)]) / 1000.0
+        self.assertAlmostEqual(sum(sleeps), recordedSecs * 2.0, places=4)
+
+    def test_pagination(self):
+        identity = {'UserId': 'AROAREPLAY:unittest', 'Account': _targetAccountId, 'Arn': "arn:aws:sts::{}:assumed-role/Replay/unittest".format(_targetAccountId)}
+        records = [
+            _record('GetCallerIdentity', {}, identity, service='sts'),
+            _record('DescribeLogGroups', {'logGroupNamePrefix': '/unittest/app'}, _log_group_page([], 't1')),
+            _record('DescribeLogGroups', {'logGroupNamePrefix': '/unittest/app', 'nextToken': 't1'}, _log_group_page([], 't2')),
+            _record('DescribeLogGroups', {'logGroupNamePrefix': '/unittest/app', 'nextToken': 't2'}, _log_group_page(['/unittest/app'])),
+            _record('ListTagsLogGroup', {'logGroupName': '/unittest/app'}, {'tags': {'ManualRemediation': 'true'}})
+        ]
+        sleeps = []
+        replayer = TrafficReplayer(records, latencyScale=0.5, sleep=sleeps.append)
+        setEmulator(replayer)
+        cwlClient = CwlClient(Profile())
+        descriptor = cwlClient.getLogGroupDescriptor('/unittest/app')
+        self.assertEqual(descriptor.logGroupName, '/unittest/app')
+        self.assertEqual(replayer.getCounters()['logs:DescribeLogGroups']['Calls'], 3)
+        self.assertEqual(replayer.missing, [])
+        self.assertEqual(sleeps, [0.005] * len(records))
+        with self.assertRaises(RdqError):
+            cwlClient.getLogGroupDescriptor('/unittest/app')
+        self.assertEqual(replayer.missing, ['logs:DescribeLogGroups'])
+
+    def test_flush_appends(self):
+        recorder = TrafficRecorder(self._path)
+        setTrafficRecorder(recorder)
+        recorder._pending.append(encodeValue({'Service': 'sts', 'Operation': 'GetCallerIdentity', 'Params': {}}))
+        flushRecording()
+        recorder._pending.append(encodeValue({'Service': 'sts', 'Operation': 'GetCallerIdentity', 'Params': {'SessionToken': 'secret'}}))
+        flushRecording()
+        flushRecording()
+        records = loadRecording(self._path)
+        self.assertEqual(len(records), 2)
+        self.assertEqual(records[1]['Params']['SessionToken'], Redacted)
+
+
+if __name__ == '__main__':
+    initLogging(None, 'INFO')
+    loader = unittest.TestLoader()
+    loader.testMethodPrefix = "test_"
+    unittest.main(warnings='default', testLoader = loader)
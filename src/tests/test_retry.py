@@ -0,0 +1,86 @@
+import unittest
+
+from lib.base import initLogging
+from lib.rdq import RdqError
+from lib.rdq.base import RetryPolicy, getRetryPolicy, setRetryPolicy
+from lib.rdq.svckms import KmsClient
+from tests.util_botocore import HttpStub, stubProfile, throttlingResponse, describeKeyResponse
+
+_ServiceUnavailable = (503, {'__type': 'KMSInternalException', 'message': 'Internal'})
+_AccessDenied = (403, {'__type': 'AccessDeniedException', 'message': 'Denied'})
+_QuotaExceeded = (400, {'__type': 'LimitExceededException', 'message': 'Too many aliases'})
+
+def _profile(httpStub):
+    return stubProfile(httpStub, 'kms')
+
+
+class TestRetry(unittest.TestCase):
+    def setUp(self):
+        self._exPolicy = getRetryPolicy()
+
+    def tearDown(self):
+        setRetryPolicy(self._exPolicy)
+
+    def test_throttle_then_success(self):
+        policy = RetryPolicy(baseSecs=0.001, capSecs=0.01)
+        setRetryPolicy(policy)
+        httpStub = HttpStub([throttlingResponse(), throttlingResponse(), _ServiceUnavailable, describeKeyResponse()])
+        KmsClient(_profile(httpStub)).describe_key('alias/k1')
+        self.assertEqual(httpStub.sendCount, 4)
+        counters = policy.getCounters()
+        self.assertEqual(counters['Retries'], 3)
+        self.assertEqual(counters['Throttles'], 2)
+        self.assertEqual(counters['Transients'], 1)
+
+    def test_budget(self):
+        policy = RetryPolicy(baseSecs=0.001, capSecs=0.01, retryBudget=2)
+        setRetryPolicy(policy)
+        policy.beginInvocation()
+        httpStub = HttpStub([throttlingResponse()])
+        kms = KmsClient(_profile(httpStub))
+        with self.assertRaises(RdqError):
+            kms.describe_key('alias/k1')
+        self.assertEqual(httpStub.sendCount, 3)
+        self.assertEqual(policy.getCounters()['BudgetExhausted'], 1)
+        policy.beginInvocation()
+        self.assertEqual(policy.getCounters()['Retries'], 0)
+
+    def test_unbudgeted_run(self):
+        policy = RetryPolicy(baseSecs=0.001, capSecs=0.01, retryBudget=2)
+        setRetryPolicy(policy)
+        for i in range(5):
+            httpStub = HttpStub([throttlingResponse(), throttlingResponse(), describeKeyResponse()])
+            KmsClient(_profile(httpStub)).describe_key('alias/k1')
+            self.assertEqual(httpStub.sendCount, 3)
+        counters = policy.getCounters()
+        self.assertEqual(counters['Retries'], 10)
+        self.assertEqual(counters['BudgetExhausted'], 0)
+
+    def test_not_retryable(self):
+        policy = RetryPolicy(baseSecs=0.001, capSecs=0.01)
+        setRetryPolicy(policy)
+        httpStub = HttpStub([_AccessDenied])
+        with self.assertRaises(RdqError):
+            KmsClient(_profile(httpStub)).describe_key('alias/k1')
+        self.assertEqual(httpStub.sendCount, 1)
+        quotaStub = HttpStub([_QuotaExceeded])
+        with self.assertRaises(RdqError):
+            KmsClient(_profile(quotaStub)).describe_key('alias/k1')
+        self.assertEqual(quotaStub.sendCount, 1)
+        self.assertEqual(policy.getCounters()['Retries'], 0)
+
+    def test_decorrelated_jitter(self):
+        policy = RetryPolicy(baseSecs=0.5, capSecs=4)
+        waitSecs = None
+        for i in range(50):
+            nextWaitSecs = policy.next_wait(waitSecs)
+            self.assertGreaterEqual(nextWaitSecs, 0.5)
+            self.assertLessEqual(nextWaitSecs, min(4, (waitSecs if waitSecs else 0.5) * 3))
+            waitSecs = nextWaitSecs
+
+
+if __name__ == '__main__':
+    initLogging(None, 'INFO')
+    loader = unittest.TestLoader()
+    loader.testMethodPrefix = "test_"
+    unittest.main(warnings='default', testLoader = loader)
@@ -0,0 +1,63 @@
+import unittest
+import logging
+from unittest import mock
+
+from lib.base import initLogging
+import cfg.rules as cfgRules
+from lib.lambdas.core.ruleconfig import getResolvedRuleConfig, clearResolvedRuleConfigs
+from lib.lambdas.core.filter import clearResourceIdFilters
+
+
+class TestRuleConfig(unittest.TestCase):
+    def setUp(self):
+        clearResolvedRuleConfigs()
+        clearResourceIdFilters()
+
+    def test_resolve(self):
+        rc = getResolvedRuleConfig('cloudwatch-log-group-encrypted', 'remediate', 'a1')
+        self.assertEqual(rc.codeFolder, 'EncryptCWL')
+        self.assertTrue(rc.actionEnabled)
+        self.assertFalse(rc.preview)
+        self.assertFalse(rc.resourceIdFilter.accept('/aws/lambda/aws-controltower-NotificationForwarder'))
+        self.assertEqual(rc.autoResourceTags['NZISM'], 'CID:3548+CID:3562+CID:4838')
+        self.assertEqual(rc.stackNamePattern, 'NZISM-AutoDeployed-{}')
+        rc.autoResourceTags['NZISM'] = 'changed'
+        rc.deploymentMethod['CreateStack'] = True
+        self.assertEqual(rc.autoResourceTags['NZISM'], 'CID:3548+CID:3562+CID:4838')
+        self.assertFalse(rc.deploymentMethod['CreateStack'])
+        with self.assertRaises(AttributeError):
+            rc.newAttribute = 1
+
+    def test_cached(self):
+        with mock.patch.object(cfgRules.ruleTable, 'lookup', wraps=cfgRules.ruleTable.lookup) as lookup:
+            rc1 = getResolvedRuleConfig('cloudwatch-log-group-encrypted', 'remediate', 'a1')
+            lookupCount = lookup.call_count
+            for i in range(100):
+                rc2 = getResolvedRuleConfig('cloudwatch-log-group-encrypted', 'remediate', 'a1')
+            self.assertIs(rc1, rc2)
+            self.assertEqual(lookup.call_count, lookupCount)
+            getResolvedRuleConfig('cloudwatch-log-group-encrypted', 'remediate', 'a2')
+            self.assertEqual(lookup.call_count, lookupCount * 2)
+
+    def test_warn_once(self):
+        with mock.patch.object(cfgRules, 'manualTagName', return_value=None):
+            with self.assertLogs(level='WARNING') as logs:
+                for i in range(5):
+                    rc = getResolvedRuleConfig('cloudwatch-log-group-encrypted', 'remediate', 'a1')
+            self.assertEqual(len(logs.records), 1)
+            self.assertEqual(rc.manualTagName, 'DoNotAutoRemediate')
+
+    def test_unimplemented(self):
+        with mock.patch.object(logging, 'warning') as warning:
+            rc = getResolvedRuleConfig('unknown-rule', 'remediate', 'a1')
+        self.assertEqual(warning.call_count, 0)
+        self.assertIsNone(rc.codeFolder)
+        self.assertFalse(rc.actionEnabled)
+        self.assertEqual(rc.autoResourceTags, {})
+
+
+if __name__ == '__main__':
+    initLogging(None, 'INFO')
+    loader = unittest.TestLoader()
+    loader.testMethodPrefix = "test_"
+    unittest.main(warnings='default', testLoader = loader)
@@ -0,0 +1,71 @@
+import unittest
+import time
+import threading
+
+from lib.base import initLogging, ConfigError
+from cmds.stepgraph import StepGraph, StatusOk, StatusFailed, StatusSkipped
+
+
+class _Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.order = []
+
+    def step(self, name, secs, result=None):
+        def action(*args):
+            time.sleep(secs)
+            with self._lock:
+                self.order.append(name)
+            return result if result else (name, args)
+        return action
+
+
+class TestStepGraph(unittest.TestCase):
+    def test_parallel(self):
+        recorder = _Recorder()
+        graph = StepGraph()
+        graph.add('a', recorder.step('a', 0.2, 'A'))
+        graph.add('b', recorder.step('b', 0.2, 'B'))
+        graph.add('c', recorder.step('c', 0.1), ['a', 'b'])
+        graph.add('d', recorder.step('d', 0.1), ['a'])
+        startedAt = time.time()
+        results = graph.run(4)
+        elapsedSecs = time.time() - startedAt
+        self.assertEqual(results['c'], ('c', ('A', 'B')))
+        self.assertEqual(set(recorder.order[0:2]), {'a', 'b'})
+        self.assertLess(elapsedSecs, 0.5)
+        self.assertAlmostEqual(graph.criticalPathSecs(), 0.3, delta=0.1)
+        self.assertTrue(all(s.status == StatusOk for s in graph.steps))
+        graph.report()
+
+    def test_failure(self):
+        def failing():
+            raise ConfigError('stub')
+        recorder = _Recorder()
+        graph = StepGraph()
+        graph.add('a', failing)
+        graph.add('b', recorder.step('b', 0.1))
+        graph.add('c', recorder.step('c', 0.0), ['a'])
+        with self.assertRaises(ConfigError):
+            graph.run(2)
+        statuses = {s.name: s.status for s in graph.steps}
+        self.assertEqual(statuses, {'a': StatusFailed, 'b': StatusOk, 'c': StatusSkipped})
+        graph.report()
+
+    def test_invalid(self):
+        graph = StepGraph()
+        graph.add('a', lambda b: b, ['b'])
+        graph.add('b', lambda a: a, ['a'])
+        with self.assertRaises(ConfigError):
+            graph.run()
+        graph = StepGraph()
+        graph.add('a', lambda x: x, ['x'])
+        with self.assertRaises(ConfigError):
+            graph.run()
+
+
+if __name__ == '__main__':
+    initLogging(None, 'INFO')
+    loader = unittest.TestLoader()
+    loader.testMethodPrefix = "test_"
+    unittest.main(warnings='default', testLoader = loader)
@@ -0,0 +1,177 @@
+import unittest
+import os
+import time
+import logging
+import threading
+import tracemalloc
+
+from lib.base import initLogging, RK
+from lib.base.trace import getTracer
+from lib.rdq.emulator import AwsEmulator
+from lib.rdq.svcorg import OrganizationClient
+from lib.lambdas.core.directory import AccountDirectory
+from lib.lambdas.core.runtime import DispatcherRuntime
+
+import cfg.core as cfgCore
+import tests.util_synthetic as synthetic
+
+# Events per second measured for each batch size on the reference build; with RDQBENCHMARK set, a run fails if it is slower by more than the ratio
+_BaselineEventsPerSec = {
+    1: 220,
+    100: 2500,
+    1000: 2100
+}
+_RegressionRatio = 3.0
+_SweepBatchSizes = [1, 10, 100, 1000, 10000]
+_Stages = ['dispatch.parse', 'dispatch.resolve', 'dispatch.invoke']
+_RuleFolders = ['EncryptCWL', 'ApplyS3BPA']
+_RemediationRoleName = 'NZISM-Remediation'
+
+def _percentile(sortedValues, fraction):
+    if not sortedValues: return None
+    index = min(len(sortedValues) - 1, int(round(fraction * (len(sortedValues) - 1))))
+    return round(sortedValues[index], 3)
+
+def _stage_summary(durationsMs):
+    values = sorted(durationsMs)
+    return {'Count': len(values), 'P50Ms': _percentile(values, 0.5), 'P90Ms': _percentile(values, 0.9), 'P99Ms': _percentile(values, 0.99)}
+
+def _rule_handler(event, context):
+    return {'action': event['action'], 'major': 'Success', 'minor': 'Applied', 'message': 'synthetic'}
+
+
+class _SpanCollector:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.durations = {}
+
+    def export(self, span):
+        with self._lock:
+            self.durations.setdefault(span.name, []).append(span.durationMs)
+
+    def reset(self):
+        with self._lock:
+            self.durations = {}
+
+
+class DispatcherBenchmark:
+    def __init__(self, generator :synthetic.ComplianceEventGenerator, invokeLatencySecs=0.0):
+        self._generator = generator
+        self._emulator = AwsEmulator()
+        for accountId in generator.accountIds:
+            self._emulator.addAccount(accountId)
+        for ruleFolder in _RuleFolders:
+            self._emulator.registerFunction(cfgCore.ruleFunctionName(ruleFolder), _rule_handler)
+        if invokeLatencySecs > 0:
+            self._emulator.injectFaults('lambda', 'Invoke', latencySecs=invokeLatencySecs)
+        self._runtime = DispatcherRuntime(maxAgeSecs=3600, profileFactory=self.create_profile, accountDirectoryFactory=self.create_account_directory)
+        self._collector = _SpanCollector()
+
+    def create_profile(self):
+        return self._emulator.createProfile()
+
+    def create_account_directory(self, profile):
+        return AccountDirectory(OrganizationClient(profile))
+
+    def get_dispatcher(self):
+        return self._runtime.getDispatcher()
+
+    def dispatch(self, event):
+        return self.get_dispatcher().dispatch(event)
+
+    def measure(self, batchSize) -> dict:
+        event = self._generator.event(batchSize)
+        dispatcher = self.get_dispatcher()
+        tracer = getTracer()
+        self._collector.reset()
+        tracer.setExporter(self._collector)
+        try:
+            startedAt = time.perf_counter()
+            dispatcher.dispatch(event)
+            elapsedSecs = time.perf_counter() - startedAt
+        finally:
+            tracer.setExporter(None)
+        tracemalloc.start()
+        try:
+            dispatcher.dispatch(self._generator.event(batchSize))
+            peakBytes = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        durations = self._collector.durations
+        return {
+            'BatchSize': batchSize,
+            'ElapsedSecs': round(elapsedSecs, 4),
+            'EventsPerSec': round(batchSize / elapsedSecs, 1),
+            'Invocations': len(durations.get('dispatch.invoke', [])),
+            'Stages': {stage: _stage_summary(durations.get(stage, [])) for stage in _Stages},
+            'PeakKiB': round(peakBytes / 1024.0, 1),
+            'KiBPerEvent': round(peakBytes / 1024.0 / batchSize, 2)
+        }
+
+    def run(self, batchSizes) -> list:
+        self.dispatch(self._generator.event(1))
+        results = []
+        for batchSize in batchSizes:
+            results.append(self.measure(batchSize))
+        return results
+
+def runBenchmark(batchSizes, generator=None, invokeLatencySecs=0.0) -> list:
+    envName = cfgCore.environmentVariableNameRemediationRole()
+    exRoleName = os.environ.get(envName)
+    os.environ[envName] = _RemediationRoleName
+    logging.disable(logging.WARNING)
+    try:
+        benchmark = DispatcherBenchmark(generator if generator else synthetic.ComplianceEventGenerator(), invokeLatencySecs)
+        return benchmark.run(batchSizes)
+    finally:
+        logging.disable(logging.NOTSET)
+        if exRoleName is None:
+            del os.environ[envName]
+        else:
+            os.environ[envName] = exRoleName
+
+def report(results :list):
+    for result in results:
+        logging.info({RK.Synopsis: 'DispatcherThroughput', 'Result': result})
+
+
+class TestThroughput(unittest.TestCase):
+    def test_generator(self):
+        generator = synthetic.ComplianceEventGenerator(complianceMix={'NON_COMPLIANT': 1.0}, seed=7)
+        event = generator.event(50)
+        self.assertEqual(len(event['Records']), 50)
+        self.assertEqual(synthetic.ComplianceEventGenerator(complianceMix={'NON_COMPLIANT': 1.0}, seed=7).event(50), event)
+        mixPath = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'installer', 'logs.csv')
+        mix = synthetic.loadMix(mixPath)
+        self.assertEqual(sum(mix['Compliance'].values()), sum(mix['Rules'].values()))
+        self.assertIn('cloudwatch-log-group-encrypted', mix['Rules'])
+
+    def test_baseline(self):
+        results = runBenchmark(sorted(_BaselineEventsPerSec.keys()))
+        report(results)
+        for result in results:
+            self.assertGreater(result['Invocations'], 0)
+            self.assertEqual(result['Stages']['dispatch.parse']['Count'], result['BatchSize'])
+
+    @unittest.skipUnless(os.environ.get('RDQBENCHMARK'), "Set RDQBENCHMARK to compare throughput with the reference build")
+    def test_regression(self):
+        results = runBenchmark(sorted(_BaselineEventsPerSec.keys()))
+        report(results)
+        regressions = []
+        for result in results:
+            batchSize = result['BatchSize']
+            baseline = _BaselineEventsPerSec[batchSize]
+            if result['EventsPerSec'] * _RegressionRatio < baseline:
+                regressions.append("Batch {} at {} events/sec < {} / {}".format(batchSize, result['EventsPerSec'], baseline, _RegressionRatio))
+        self.assertEqual(regressions, [])
+
+    @unittest.skipUnless(os.environ.get('RDQBENCHMARK') == 'sweep', "Set RDQBENCHMARK=sweep to run batch sizes up to 10000")
+    def test_sweep(self):
+        report(runBenchmark(_SweepBatchSizes))
+
+
+if __name__ == '__main__':
+    initLogging(None, 'INFO')
+    loader = unittest.TestLoader()
+    loader.testMethodPrefix = "test_"
+    unittest.main(warnings='default', testLoader = loader)
@@ -0,0 +1,108 @@
+import unittest
+import os
+import io
+import json
+import tempfile
+
+from lib.base import initLogging
+from lib.base.trace import Tracer, JsonLinesExporter, OtlpFileExporter, getTracer, initTracing
+from lib.lambdas.core.dispatcher import Dispatcher
+
+import cfg.core as cfgCore
+import cfg.roles as cfgRoles
+
+from tests.test_dispatcher import _LambdaStub, _ProfileStub, _record
+
+
+class _ListExporter:
+    def __init__(self):
+        self.spans = []
+
+    def export(self, span):
+        self.spans.append(span)
+
+
+class TestTrace(unittest.TestCase):
+    def tearDown(self):
+        getTracer().setExporter(None)
+
+    def test_nesting(self):
+        exporter = _ListExporter()
+        tracer = Tracer(exporter)
+        with tracer.span('outer', 't1', 'p1', k='v') as outer:
+            with tracer.span('inner') as inner:
+                self.assertIs(tracer.currentSpan(), inner)
+            with self.assertRaises(ValueError):
+                with tracer.span('failed'):
+                    raise ValueError('x')
+        self.assertEqual([s.name for s in exporter.spans], ['inner', 'failed', 'outer'])
+        self.assertEqual(inner.traceId, 't1')
+        self.assertEqual(inner.parentSpanId, outer.spanId)
+        self.assertEqual(outer.parentSpanId, 'p1')
+        self.assertEqual(outer.attributes, {'k': 'v'})
+        self.assertEqual(exporter.spans[1].status, 'ERROR')
+        self.assertIsNone(tracer.currentSpan())
+
+    def test_disabled(self):
+        tracer = Tracer()
+        with tracer.span('s1') as span:
+            self.assertIsNone(span)
+        tracer.endSpan(None)
+
+    def test_jsonl(self):
+        stream = io.StringIO()
+        tracer = Tracer(JsonLinesExporter(stream))
+        with tracer.span('s1', 't1'): pass
+        line = json.loads(stream.getvalue().splitlines()[0])
+        self.assertEqual(line['Synopsis'], 'TraceSpan')
+        self.assertEqual(line['Span']['traceId'], 't1')
+        self.assertGreaterEqual(line['Span']['durationMs'], 0)
+
+    def test_otlp(self):
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, 'spans.jsonl')
+            os.environ['RDQTRACE'] = "otlp:{}".format(path)
+            try:
+                initTracing('RDQTRACE', 'unittest')
+            finally:
+                del os.environ['RDQTRACE']
+            with getTracer().span('s1', 't1', count=2, ok=True): pass
+            with open(path) as f:
+                doc = json.loads(f.readline())
+        resourceSpans = doc['resourceSpans'][0]
+        self.assertEqual(resourceSpans['resource']['attributes'][0]['value'], {'stringValue': 'unittest'})
+        span = resourceSpans['scopeSpans'][0]['spans'][0]
+        self.assertEqual(span['traceId'], 't1')
+        self.assertNotIn('parentSpanId', span)
+        self.assertIn({'key': 'count', 'value': {'intValue': '2'}}, span['attributes'])
+        self.assertIn({'key': 'ok', 'value': {'boolValue': True}}, span['attributes'])
+
+    def test_dispatch_propagation(self):
+        exporter = _ListExporter()
+        getTracer().setExporter(exporter)
+        os.environ[cfgCore.environmentVariableNameRemediationRole()] = cfgRoles.standaloneRoles()['Remediation']
+        payloads = []
+        lambdaStub = _LambdaStub(invokeSecs=0.01)
+        invoke = lambdaStub.invoke
+        def recordingInvoke(FunctionName, InvocationType, Payload):
+            payloads.append(json.loads(Payload))
+            return invoke(FunctionName, InvocationType, Payload)
+        lambdaStub.invoke = recordingInvoke
+        dispatcher = Dispatcher(_ProfileStub(lambdaStub))
+        dispatcher.dispatch({'Records': [_record('m1', '/aws/lambda/app1')]})
+        spans = {s.name: s for s in exporter.spans}
+        parse = spans['dispatch.parse']
+        self.assertEqual(spans['dispatch.resolve'].traceId, parse.traceId)
+        invoke = spans['dispatch.invoke']
+        self.assertEqual(invoke.traceId, parse.traceId)
+        self.assertEqual(invoke.attributes['messageId'], 'm1')
+        self.assertTrue(invoke.attributes['success'])
+        self.assertEqual(len(payloads), 1)
+        self.assertEqual(payloads[0]['trace'], {'traceId': parse.traceId, 'messageId': 'm1', 'parentSpanId': invoke.spanId})
+
+
+if __name__ == '__main__':
+    initLogging(None, 'INFO')
+    loader = unittest.TestLoader()
+    loader.testMethodPrefix = "test_"
+    unittest.main(warnings='default', testLoader = loader)
@@ -0,0 +1,38 @@
+import json
+import boto3
+import botocore.awsrequest
+
+from lib.rdq import Profile
+
+def stubIdentity():
+    return {'UserId': 'AIDSTUB', 'Account': '111111111111', 'Arn': 'arn:aws:iam::111111111111:user/stub'}
+
+def throttlingResponse():
+    return (400, {'__type': 'ThrottlingException', 'message': 'Rate exceeded'})
+
+def describeKeyResponse():
+    return (200, {'KeyMetadata': {'KeyId': 'k1', 'AWSAccountId': '111111111111'}})
+
+class RawStub:
+    def __init__(self, body :bytes):
+        self._body = body
+
+    def stream(self, **kwargs):
+        yield self._body
+
+class HttpStub:
+    def __init__(self, responses):
+        self._responses = list(responses)
+        self.sendCount = 0
+
+    def before_send(self, request, **kwargs):
+        self.sendCount += 1
+        (statusCode, body) = self._responses.pop(0) if len(self._responses) > 1 else self._responses[0]
+        headers = {'x-amzn-RequestId': 'stub', 'Content-Type': 'application/x-amz-json-1.1'}
+        return botocore.awsrequest.AWSResponse(request.url, statusCode, headers, RawStub(json.dumps(body).encode('utf-8')))
+
+def stubProfile(httpStub :HttpStub, serviceName, apiStats=None):
+    session = boto3.Session(region_name='ap-southeast-2', aws_access_key_id='AKIASTUB', aws_secret_access_key='secret')
+    profile = Profile(session, identity=stubIdentity(), apiStats=apiStats)
+    profile.getClient(serviceName).meta.events.register('before-send', httpStub.before_send)
+    return profile
@@ -0,0 +1,131 @@
+import csv
+import json
+import random
+import datetime
+
+_ConformancePackSuffix = 'nwtjifomw'
+
+# Resource type and resource id pattern for rules that appear in the synthetic mix
+_RuleResources = {
+    'cloudwatch-log-group-encrypted': ('AWS::Logs::LogGroup', '/aws/lambda/app-{}'),
+    's3-account-level-public-access-blocks-periodic': ('AWS::::Account', None),
+    'iam-policy-no-statements-with-admin-access': ('AWS::IAM::Policy', 'ANPASYNTHETIC{:08d}'),
+    'cw-loggroup-retention-period-check': ('AWS::Logs::LogGroup', '/aws/lambda/app-{}')
+}
+_DefaultRuleResource = ('AWS::::Account', None)
+
+def defaultAccountMix():
+    return {'729538891993': 1.0}
+
+def defaultRuleMix():
+    return {
+        'cloudwatch-log-group-encrypted': 0.6,
+        's3-account-level-public-access-blocks-periodic': 0.2,
+        'iam-policy-no-statements-with-admin-access': 0.2
+    }
+
+def defaultComplianceMix():
+    return {'NON_COMPLIANT': 0.8, 'COMPLIANT': 0.2}
+
+def _base_rule_name(qualifiedName):
+    spos = qualifiedName.find("-conformance-pack-")
+    return qualifiedName[0:spos] if spos > 0 else qualifiedName
+
+def _counts(values) -> dict:
+    counts = {}
+    for value in values:
+        counts[value] = counts.get(value, 0) + 1
+    return counts
+
+def loadMix(csvPath):
+    with open(csvPath, newline='') as f:
+        rows = list(csv.DictReader(f))
+    return {
+        'Accounts': _counts([row['detail.awsAccountId'] for row in rows]),
+        'Rules': _counts([_base_rule_name(row['detail.configRuleName']) for row in rows]),
+        'Compliance': _counts([row['detail.newEvaluationResult.complianceType'] for row in rows])
+    }
+
+def _weighted(mix :dict):
+    keys = sorted(mix.keys())
+    return (keys, [mix[k] for k in keys])
+
+
+class ComplianceEventGenerator:
+    def __init__(self, accountMix=None, ruleMix=None, complianceMix=None, regions=['ap-southeast-2'], resourceCount=1000, seed=0):
+        self._accounts = _weighted(accountMix if accountMix else defaultAccountMix())
+        self._rules = _weighted(ruleMix if ruleMix else defaultRuleMix())
+        self._compliance = _weighted(complianceMix if complianceMix else defaultComplianceMix())
+        self._regions = list(regions)
+        self._resourceCount = resourceCount
+        self._random = random.Random(seed)
+        self._sequence = 0
+        self._recordedAt = datetime.datetime(2021, 11, 23, 11, 5, 4)
+
+    @property
+    def accountIds(self):
+        return list(self._accounts[0])
+
+    def choose(self, weighted):
+        (keys, weights) = weighted
+        return self._random.choices(keys, weights)[0]
+
+    def body(self):
+        self._sequence += 1
+        accountId = self.choose(self._accounts)
+        ruleName = self.choose(self._rules)
+        complianceType = self.choose(self._compliance)
+        regionName = self._random.choice(self._regions)
+        (resourceType, resourcePattern) = _RuleResources.get(ruleName, _DefaultRuleResource)
+        resourceId = resourcePattern.format(self._random.randrange(self._resourceCount)) if resourcePattern else accountId
+        qualifiedName = "{}-conformance-pack-{}".format(ruleName, _ConformancePackSuffix)
+        recordedAt = (self._recordedAt + datetime.timedelta(milliseconds=self._sequence)).isoformat() + 'Z'
+        return {
+            "version": "0",
+            "id": "00000000-0000-4000-8000-{:012d}".format(self._sequence),
+            "detail-type": "Config Rules Compliance Change",
+            "source": "aws.config",
+            "account": accountId,
+            "time": recordedAt,
+            "region": regionName,
+            "resources": [],
+            "detail": {
+                "resourceId": resourceId,
+                "awsRegion": regionName,
+                "awsAccountId": accountId,
+                "configRuleName": qualifiedName,
+                "recordVersion": "1.0",
+                "configRuleARN": "arn:aws:config:{}:{}:config-rule/aws-service-rule/config-conforms.amazonaws.com/config-rule-synth".format(regionName, accountId),
+                "messageType": "ComplianceChangeNotification",
+                "newEvaluationResult": {
+                    "evaluationResultIdentifier": {
+                        "evaluationResultQualifier": {
+                            "configRuleName": qualifiedName,
+                            "resourceType": resourceType,
+                            "resourceId": resourceId
+                        },
+                        "orderingTimestamp": recordedAt
+                    },
+                    "complianceType": complianceType,
+                    "resultRecordedTime": recordedAt,
+                    "configRuleInvokedTime": recordedAt
+                },
+                "notificationCreationTime": recordedAt,
+                "resourceType": resourceType
+            }
+        }
+
+    def record(self):
+        body = self.body()
+        return {
+            "messageId": "synthetic-{}".format(self._sequence),
+            "receiptHandle": "synthetic-{}".format(self._sequence),
+            "body": json.dumps(body),
+            "attributes": {"ApproximateReceiveCount": "1"},
+            "messageAttributes": {},
+            "eventSource": "aws:sqs",
+            "awsRegion": body['region']
+        }
+
+    def event(self, batchSize):
+        return {'Records': [self.record() for i in range(batchSize)]}